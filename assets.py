@@ -0,0 +1,93 @@
+import hashlib
+import os
+
+import pygame
+
+from simulation import CELL_WIDTH, LANE_HEIGHT
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+CACHE_DIR = os.path.join(ASSET_DIR, ".cache")  # Pre-scaled variants, safe to delete
+
+PLANT_SIZE = (CELL_WIDTH - 10, LANE_HEIGHT - 10)
+ZOMBIE_SIZE = (CELL_WIDTH - 30, LANE_HEIGHT - 20)
+BULLET_SIZE = (50, 50)
+
+# Sprite name -> (source file, on-screen size)
+SPRITES = {
+    "plant": ("plant.png", PLANT_SIZE),
+    "freezing_plant": ("freezing_plant.png", PLANT_SIZE),
+    "repeater": ("repeater.png", PLANT_SIZE),
+    "wallnut": ("wallnut.png", PLANT_SIZE),
+    "cherry_bomb": ("cherry_bomb.png", PLANT_SIZE),
+    "shovel": ("shovel.png", PLANT_SIZE),
+    "zombie": ("zombie.png", ZOMBIE_SIZE),
+    "zombie_2": ("zombie_2.png", ZOMBIE_SIZE),
+    "zombie_3": ("zombie_3.png", ZOMBIE_SIZE),
+    "freezed_zombie": ("freezed_zombie.png", ZOMBIE_SIZE),
+    "gargantuar": ("gargantuar.png", (CELL_WIDTH + 50, LANE_HEIGHT + 50)),
+    "bullet": ("bullet.png", BULLET_SIZE),
+    "ice_bullet": ("ice_bullet.png", BULLET_SIZE),
+    "repeater_bullet": ("repeater_bullet.png", BULLET_SIZE),
+}
+
+ATLAS_WIDTH = 1024
+ATLAS_PADDING = 1  # Keeps neighbouring sprites from bleeding into each other
+
+
+# Asset Manager
+# Nothing is read until the first sprite is requested. Scaled variants are
+# cached on disk under a key of (source hash, target size), and all sprites
+# are then packed into one display-format atlas; the surfaces handed out are
+# subsurfaces of it.
+class AssetManager:
+    def __init__(self, sprites=SPRITES, asset_dir=ASSET_DIR, cache_dir=CACHE_DIR):
+        self.sprites = sprites
+        self.asset_dir = asset_dir
+        self.cache_dir = cache_dir
+        self.atlas = None
+        self.regions = {}  # Sprite name -> Rect inside the atlas
+        self.images = {}
+
+    def get(self, name):
+        if self.atlas is None:
+            self.build_atlas()
+        return self.images[name]
+
+    def load_scaled(self, name):
+        filename, size = self.sprites[name]
+        source_path = os.path.join(self.asset_dir, filename)
+        with open(source_path, "rb") as source:
+            digest = hashlib.sha1(source.read()).hexdigest()[:16]
+
+        stem = os.path.splitext(filename)[0]
+        cache_path = os.path.join(self.cache_dir, f"{stem}-{size[0]}x{size[1]}-{digest}.png")
+        if os.path.exists(cache_path):
+            return pygame.image.load(cache_path)
+
+        image = pygame.transform.scale(pygame.image.load(source_path), size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            pygame.image.save(image, cache_path)
+        except OSError:
+            pass  # A read-only install just rescales on every start
+        return image
+
+    def build_atlas(self):
+        scaled = {name: self.load_scaled(name) for name in self.sprites}
+
+        # Shelf packing: tallest sprites first, left to right, new row when full
+        x = y = shelf_height = 0
+        for name in sorted(scaled, key=lambda name: scaled[name].get_height(), reverse=True):
+            width, height = scaled[name].get_size()
+            if x + width > ATLAS_WIDTH:
+                x, y = 0, y + shelf_height + ATLAS_PADDING
+                shelf_height = 0
+            self.regions[name] = pygame.Rect(x, y, width, height)
+            x += width + ATLAS_PADDING
+            shelf_height = max(shelf_height, height)
+
+        atlas = pygame.Surface((ATLAS_WIDTH, y + shelf_height), pygame.SRCALPHA)
+        for name, image in scaled.items():
+            atlas.blit(image, self.regions[name], special_flags=pygame.BLEND_RGBA_MAX)  # Copy pixels and alpha as-is
+        self.atlas = atlas.convert_alpha()  # Match the display format once, not on every blit
+        self.images = {name: self.atlas.subsurface(rect) for name, rect in self.regions.items()}
@@ -0,0 +1,249 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from simulation import (
+    ENGINES,
+    EXACT_ENGINES,
+    LANE_COUNT,
+    PLACE,
+    TICK_RATE,
+    new_game,
+    plant_costs,
+    run,
+    wave_size,
+    waves,
+)
+
+# Batch balance runs: every combination of wave set, price list and scripted
+# strategy is played headlessly over a range of seeds, spread across all
+# cores, and summarised as win rate, ticks survived, coins earned and zombies
+# left undefeated. Each finished game is cached on disk under a hash of everything that
+# decides its outcome, so a re-run only simulates the games that changed.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".balance_cache")
+# Everything that decides a game's outcome: the engines, the unit table, wave
+# generation and the scripted strategies below. Editing these invalidates the cache.
+ENGINE_SOURCES = ("simulation.py", "vector_engine.py", "projectiles.py", "units.py", "endless.py", "balance.py")
+
+MAX_TICKS = 10 * 60 * TICK_RATE  # Games still running after 10 minutes count as not won
+DECISION_INTERVAL = TICK_RATE // 2  # Scripted strategies act twice a second
+
+
+def _lanes(plant_type, col):
+    return [(plant_type, lane, col) for lane in range(LANE_COUNT)]
+
+
+# Build orders: (plant_type, lane, col) in priority order
+STRATEGIES = {
+    "idle": [],
+    "shooters": [spot for col in range(4) for spot in _lanes("normal_plant", col)],
+    "repeaters": _lanes("normal_plant", 0) + [spot for col in range(1, 4) for spot in _lanes("repeater", col)],
+    "freeze_and_wall": (
+        _lanes("normal_plant", 0)
+        + _lanes("freezing_plant", 1)
+        + _lanes("repeater", 2)
+        + _lanes("repeater", 3)
+        + _lanes("wallnut", 5)
+    ),
+}
+
+
+# Scripted Strategy
+# Works through a build order, placing each plant once it is affordable and
+# its cell is free, and rebuilding plants that get eaten. It never skips
+# ahead of an unaffordable plant, so the order is also a saving plan.
+class ScriptedStrategy:
+    def __init__(self, build_order, interval=DECISION_INTERVAL):
+        self.build_order = [tuple(spot) for spot in build_order]
+        self.interval = interval
+
+    def __call__(self, state):
+        if state.tick % self.interval:
+            return ()
+        coins = state.coins
+        inputs = []
+        for plant_type, lane, col in self.build_order:
+            if state.plants[lane][col]:
+                continue
+            cost = state.plant_costs[plant_type]
+            if cost > coins:
+                break
+            inputs.append((PLACE, plant_type, lane, col))
+            coins -= cost
+        return inputs
+
+
+def engine_fingerprint():
+    digest = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in ENGINE_SOURCES:
+        with open(os.path.join(base, name), "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def job_key(job, fingerprint):
+    # Engines that play identical games share cache entries
+    outcome = {name: job[name] for name in ("waves", "plant_costs", "build_order", "coins", "max_ticks", "seed")}
+    outcome["engine"] = "exact" if job["engine"] in EXACT_ENGINES else job["engine"]
+    canonical = json.dumps([fingerprint, outcome], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def make_jobs(wave_sets, cost_sets, strategies, seeds, coins=10000, max_ticks=MAX_TICKS, engine="objects"):
+    # wave_sets, cost_sets and strategies map a label to a config (strategies
+    # to a build order); one job per combination and seed
+    jobs = []
+    for (waves_name, wave_config), (costs_name, costs), (strategy_name, build_order) in itertools.product(
+        wave_sets.items(), cost_sets.items(), strategies.items()
+    ):
+        for seed in seeds:
+            jobs.append({
+                "label": (waves_name, costs_name, strategy_name),
+                "waves": wave_config,
+                "plant_costs": costs,
+                "build_order": [list(spot) for spot in build_order],
+                "coins": coins,
+                "max_ticks": max_ticks,
+                "seed": seed,
+                "engine": engine,
+            })
+    return jobs
+
+
+# Play one job to the end; runs in a worker process
+def play(job):
+    state = new_game(
+        job["engine"], seed=job["seed"], wave_config=job["waves"], coins=job["coins"], costs=job["plant_costs"]
+    )
+    run(state, max_ticks=job["max_ticks"], strategy=ScriptedStrategy(job["build_order"]))
+    return {
+        "result": state.result,
+        "ticks": state.tick,
+        "wave": state.current_wave,
+        "coins_earned": state.coins_earned,
+        # Zombies on the board or still to spawn, this wave and later ones, when
+        # it ended: how far a lost or timed-out game was from a win (a loss ends
+        # at the first zombie to reach the house, so counting those would only
+        # repeat the result)
+        "zombies_left": state.zombies_left() + sum(map(wave_size, state.waves[state.current_wave + 1:])),
+    }
+
+
+def _load_cached(cache_dir, key):
+    try:
+        with open(os.path.join(cache_dir, f"{key}.json")) as cached:
+            return json.load(cached)
+    except (OSError, ValueError):
+        return None
+
+
+def _store_cached(cache_dir, key, outcome):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"{key}.json")
+        with open(path + ".tmp", "w") as cached:
+            json.dump(outcome, cached)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass  # An unwritable cache only costs a re-simulation next time
+
+
+# Play every job, taking finished games from the cache. Returns one outcome
+# per job, in job order, and the number of games actually simulated.
+def evaluate(jobs, workers=None, cache_dir=CACHE_DIR):
+    fingerprint = engine_fingerprint()
+    keys = [job_key(job, fingerprint) for job in jobs]
+    outcomes = [_load_cached(cache_dir, key) if cache_dir else None for key in keys]
+    missing = [i for i, outcome in enumerate(outcomes) if outcome is None]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(missing) <= 1:
+        played = map(play, [jobs[i] for i in missing])
+        for i, outcome in zip(missing, played):
+            outcomes[i] = outcome
+    else:
+        chunksize = max(1, len(missing) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i, outcome in zip(missing, pool.map(play, [jobs[i] for i in missing], chunksize=chunksize)):
+                outcomes[i] = outcome
+
+    if cache_dir:
+        for i in missing:
+            _store_cached(cache_dir, keys[i], outcomes[i])
+    return outcomes, len(missing)
+
+
+# Aggregate outcomes per (waves, costs, strategy) label
+def summarize(jobs, outcomes):
+    groups = {}
+    for job, outcome in zip(jobs, outcomes):
+        groups.setdefault(tuple(job["label"]), []).append(outcome)
+    rows = []
+    for (waves_name, costs_name, strategy_name), games in groups.items():
+        count = len(games)
+        rows.append({
+            "waves": waves_name,
+            "costs": costs_name,
+            "strategy": strategy_name,
+            "games": count,
+            "win_rate": sum(game["result"] == "win" for game in games) / count,
+            "ticks_survived": sum(game["ticks"] for game in games) / count,
+            "coins_earned": sum(game["coins_earned"] for game in games) / count,
+            "zombies_left": sum(game["zombies_left"] for game in games) / count,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Play many headless games and summarise balance")
+    parser.add_argument("--config", help="JSON file with optional 'waves', 'plant_costs' and 'strategies' maps "
+                                         "(label -> wave list / price dict / build order or built-in name)")
+    parser.add_argument("--games", type=int, default=20, help="games (seeds) per combination")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--coins", type=int, default=10000, help="starting coins")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--engine", choices=ENGINES, default="objects")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+    strategies = {
+        name: STRATEGIES[order] if isinstance(order, str) else order
+        for name, order in config.get("strategies", STRATEGIES).items()
+    }
+    jobs = make_jobs(
+        config.get("waves", {"default": waves}),
+        config.get("plant_costs", {"default": plant_costs}),
+        strategies,
+        range(args.seed, args.seed + args.games),
+        coins=args.coins,
+        max_ticks=args.max_ticks,
+        engine=args.engine,
+    )
+
+    start = time.perf_counter()
+    outcomes, simulated = evaluate(jobs, workers=args.workers, cache_dir=None if args.no_cache else CACHE_DIR)
+    elapsed = time.perf_counter() - start
+    rows = summarize(jobs, outcomes)
+
+    print(f"{'waves':<12}{'costs':<12}{'strategy':<18}{'games':>6}{'win':>7}{'ticks':>9}{'coins':>9}{'left':>8}")
+    for row in rows:
+        print(f"{row['waves']:<12}{row['costs']:<12}{row['strategy']:<18}{row['games']:>6}"
+              f"{row['win_rate']:>7.0%}{row['ticks_survived']:>9.0f}{row['coins_earned']:>9.0f}"
+              f"{row['zombies_left']:>8.1f}")
+    print(f"{len(jobs)} games, {simulated} simulated, {len(jobs) - simulated} cached ({elapsed:.1f} s)")
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(rows, out, indent=2)
@@ -0,0 +1,386 @@
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from simulation import (
+    CELL_WIDTH,
+    ENGINES,
+    GRID_COLUMNS,
+    LANE_COUNT,
+    PLACE,
+    TICK_RATE,
+    Gargantuar,
+    Zombie,
+    Zombie2,
+    Zombie3,
+    apply_input,
+    new_game,
+    step,
+)
+
+# Benchmark suite: scripted stress scenarios timed headlessly (ticks/sec per
+# engine) and with rendering against the dummy SDL video driver (frame-time
+# percentiles), plus the memory each engine holds per live entity. Results
+# are written as JSON, and a stored result can be used as a baseline that
+# later runs are compared against.
+
+HEADLESS_TICKS = 600  # 10 s of game time per headless run
+RENDER_FRAMES = 300   # One tick and one frame each, like the game at 1x
+REPEATS = 3           # Headless runs take the best of this many
+TOLERANCE = 0.10      # Slowdown beyond this fraction of the baseline is a regression
+STARTUP_RUNS = 5      # Fresh interpreters per startup measurement; the median is kept
+
+NO_SPAWNS = [{"Zombie": 0, "speed_multiplier": 1.0}]  # The scenario places every zombie itself
+RICH = 10 ** 9
+HORDE_WAVE = 24  # First endless wave at the full spawn rate (8 per tick)
+LARGE_BOARD = (60, 300)  # Lanes x columns: 225 standard boards
+
+
+def _queue_zombies(state, zombie_class, count, spacing):
+    # Zombies enter lane by lane, `spacing` pixels apart, from the right edge
+    for i in range(count):
+        zombie = zombie_class(i % state.lane_count)
+        zombie.x = state.width + (i // state.lane_count) * spacing
+        zombie.col = int(zombie.x // CELL_WIDTH)
+        state.add_zombie(zombie)
+
+
+def _fill(state, plant_type, cols):
+    for lane in range(state.lane_count):
+        for col in cols:
+            apply_input(state, (PLACE, plant_type, lane, col))
+
+
+# Scenarios: engine -> (fresh state, optional strategy(state) -> inputs)
+def repeater_grid(engine):
+    # Full 5x16 grid of Repeaters against 1,000 Zombie2
+    state = new_game(engine, seed=1, wave_config=NO_SPAWNS, coins=RICH)
+    _fill(state, "repeater", range(GRID_COLUMNS))
+    _queue_zombies(state, Zombie2, 1000, 8)
+    return state, None
+
+
+def gargantuar_wallnuts(engine):
+    # Boss wave with a crowd of Gargantuars chewing through Wallnut rows
+    boss_wave = [{"Zombie": 50, "Zombie2": 20, "Zombie3": 10, "Gargantuar": 100, "speed_multiplier": 1}]
+    state = new_game(engine, seed=2, wave_config=boss_wave, coins=RICH)
+    _fill(state, "repeater", range(3))
+    _fill(state, "wallnut", range(6, GRID_COLUMNS))
+    _queue_zombies(state, Gargantuar, 250, 20)
+    return state, None
+
+
+def cherry_bombs(engine):
+    # CherryBombs refilled across the whole board every second into a stream of Zombie3
+    state = new_game(engine, seed=3, wave_config=NO_SPAWNS, coins=RICH)
+    _queue_zombies(state, Zombie3, 2000, 6)
+
+    def replant(state):
+        if state.tick % 60:
+            return ()
+        return [
+            (PLACE, "cherry_bomb", lane, col)
+            for lane in range(LANE_COUNT)
+            for col in range(GRID_COLUMNS)
+            if not state.plants[lane][col]
+        ]
+
+    return state, replant
+
+
+def endless_horde(engine):
+    # Endless mode at full spawn rate on top of a 10,000 zombie horde, with
+    # Wallnut walls rebuilt every second so the horde piles up on them
+    state = new_game(engine, seed=5, coins=RICH, endless=True)
+    state.endless.skip_to(state, HORDE_WAVE)
+    _fill(state, "repeater", range(3))
+    _fill(state, "freezing_plant", [3])
+    for zombie_class in (Zombie, Zombie2, Zombie3, Zombie2):
+        _queue_zombies(state, zombie_class, 2500, 1)
+
+    def rebuild(state):
+        if state.tick % TICK_RATE:
+            return ()
+        return [(PLACE, "wallnut", lane, col) for lane in range(LANE_COUNT) for col in (8, 12)]
+
+    return state, rebuild
+
+
+def large_board(engine):
+    # Endless game on a 60x300 board: 18,000 plants and a 30,000 zombie horde,
+    # of which the camera only ever shows the top-left corner
+    lanes, columns = LARGE_BOARD
+    state = new_game(engine, seed=6, coins=RICH, endless=True, lanes=lanes, columns=columns)
+    _fill(state, "repeater", range(0, columns, 3))
+    _fill(state, "wallnut", range(1, columns, 3))
+    _queue_zombies(state, Zombie2, 30000, 20)
+    return state, None
+
+
+SCENARIOS = {
+    "repeater_grid": repeater_grid,
+    "gargantuar_wallnuts": gargantuar_wallnuts,
+    "cherry_bombs": cherry_bombs,
+    "endless_horde": endless_horde,
+    "large_board": large_board,
+}
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def time_headless(scenario, engine, ticks=HEADLESS_TICKS, repeats=REPEATS):
+    best = None
+    for _ in range(repeats):
+        state, strategy = scenario(engine)
+        start = time.perf_counter()
+        while state.tick < ticks and not state.result:
+            step(state, strategy(state) if strategy else ())
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed / state.tick < best[0] / best[1]:
+            best = (elapsed, state.tick, state.zombie_count())
+    elapsed, ran, zombies = best
+    return {"ticks": ran, "ticks_per_sec": ran / elapsed, "zombies": zombies}
+
+
+def time_rendered(scenario, engine, frames=RENDER_FRAMES):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import game
+
+    game.dirty_rects = []  # Start every scenario from a full redraw
+    game.hud_values = None
+    state, strategy = scenario(engine)
+    frame_times = []
+    while len(frame_times) < frames and not state.result:
+        start = time.perf_counter()
+        step(state, strategy(state) if strategy else ())
+        game.render_frame(state)
+        frame_times.append(time.perf_counter() - start)
+    frame_times.sort()
+    return {
+        "engine": engine,
+        "frames": len(frame_times),
+        "p50_ms": percentile(frame_times, 0.50) * 1000,
+        "p90_ms": percentile(frame_times, 0.90) * 1000,
+        "p99_ms": percentile(frame_times, 0.99) * 1000,
+        "max_ms": frame_times[-1] * 1000,
+    }
+
+
+# Memory after a headless run: bytes per live entity (zombies, bullets and
+# plants), measured as what forking the state allocates, which copies every
+# entity and the containers indexing them; and the garbage collections that
+# ran during the run, with their total pause.
+def measure_memory(scenario, engine, ticks=HEADLESS_TICKS):
+    state, strategy = scenario(engine)
+    pauses = []
+    started = [0.0]
+
+    def on_collection(phase, info):
+        if phase == "start":
+            started[0] = time.perf_counter()
+        else:
+            pauses.append(time.perf_counter() - started[0])
+
+    gc.callbacks.append(on_collection)
+    try:
+        while state.tick < ticks and not state.result:
+            step(state, strategy(state) if strategy else ())
+    finally:
+        gc.callbacks.remove(on_collection)
+    plants = sum(plant is not None for row in state.plants for plant in row)
+    entities = state.zombie_count() + state.bullet_count() + plants
+    tracemalloc.start()
+    try:
+        clone = state.fork()
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del clone
+    return {
+        "entities": entities,
+        "bytes_per_entity": allocated / max(entities, 1),
+        "gc_collections": len(pauses),
+        "gc_pause_ms": sum(pauses) * 1000,
+    }
+
+
+# Startup, timed in a fresh interpreter: importing game.py, then opening the
+# window and drawing the first frame of a new game. The probe also reports
+# whether the import alone started the display, which it must not.
+STARTUP_PROBE = """
+import json, time
+start = time.perf_counter()
+import game
+imported = time.perf_counter()
+import pygame
+display_at_import = pygame.display.get_init()
+from simulation import new_game
+game.init_display()
+game.render_frame(new_game())
+shown = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_frame_ms": (shown - start) * 1000,
+                  "display_at_import": display_at_import}))
+"""
+
+
+def time_startup(runs=STARTUP_RUNS):
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env.setdefault("SDL_AUDIODRIVER", "dummy")
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        probe = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE], cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            capture_output=True, text=True, check=True,
+        )
+        sample = json.loads(probe.stdout.splitlines()[-1])
+        sample["process_ms"] = (time.perf_counter() - start) * 1000  # Interpreter launch to exit
+        samples.append(sample)
+    result = {"runs": runs, "display_at_import": any(sample["display_at_import"] for sample in samples)}
+    for metric in ("import_ms", "first_frame_ms", "process_ms"):
+        result[metric] = sorted(sample[metric] for sample in samples)[runs // 2]
+    return result
+
+
+def run_suite(
+    scenarios, engines=ENGINES, render=True, ticks=HEADLESS_TICKS, frames=RENDER_FRAMES, startup=True, memory=True,
+):
+    results = {}
+    for name in scenarios:
+        scenario = SCENARIOS[name]
+        result = results[name] = {"headless": {}}
+        for engine in engines:
+            result["headless"][engine] = time_headless(scenario, engine, ticks)
+        if memory:
+            result["memory"] = {engine: measure_memory(scenario, engine, ticks) for engine in engines}
+        if render:
+            result["render"] = time_rendered(scenario, engines[0], frames)
+    report = {"environment": environment(), "results": results}
+    if startup:
+        report["startup"] = time_startup()
+    return report
+
+
+def environment():
+    info = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+    for module in ("numpy", "pygame"):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            info[module] = None
+    return info
+
+
+# Regressions of `current` against `baseline`: (metric, baseline, current)
+# for every ticks/sec that dropped, or frame time or bytes per entity that
+# grew, by more than `tolerance`. Metrics missing from either side are skipped.
+def compare(baseline, current, tolerance=TOLERANCE):
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        for engine, timing in result["headless"].items():
+            old = base["headless"].get(engine)
+            if old and timing["ticks_per_sec"] < old["ticks_per_sec"] * (1 - tolerance):
+                regressions.append((f"{name}.headless.{engine}.ticks_per_sec", old["ticks_per_sec"], timing["ticks_per_sec"]))
+        if "render" in result and base.get("render", {}).get("engine") == result["render"]["engine"]:
+            for metric in ("p50_ms", "p99_ms"):
+                if result["render"][metric] > base["render"][metric] * (1 + tolerance):
+                    regressions.append((f"{name}.render.{metric}", base["render"][metric], result["render"][metric]))
+        for engine, memory in result.get("memory", {}).items():
+            old = base.get("memory", {}).get(engine)
+            if old and memory["bytes_per_entity"] > old["bytes_per_entity"] * (1 + tolerance):
+                regressions.append(
+                    (f"{name}.memory.{engine}.bytes_per_entity", old["bytes_per_entity"], memory["bytes_per_entity"])
+                )
+    if "startup" in current and "startup" in baseline:
+        for metric in ("import_ms", "first_frame_ms"):
+            if current["startup"][metric] > baseline["startup"][metric] * (1 + tolerance):
+                regressions.append((f"startup.{metric}", baseline["startup"][metric], current["startup"][metric]))
+    return regressions
+
+
+def print_report(report):
+    slow = False
+    for name, result in report["results"].items():
+        line = f"{name:<22}"
+        for engine, timing in result["headless"].items():
+            line += f"  {engine} {timing['ticks_per_sec']:>8.0f} ticks/s"
+            if timing["ticks_per_sec"] < TICK_RATE:
+                line += "*"
+                slow = True
+        zombies = max(timing.get("zombies", 0) for timing in result["headless"].values())
+        line += f"  {zombies:>6} zombies at the end"
+        if "render" in result:
+            render = result["render"]
+            line += f"  frames p50 {render['p50_ms']:.2f} ms p99 {render['p99_ms']:.2f} ms"
+        print(line)
+        if "memory" in result:
+            print(f"{'':<22}" + "".join(
+                f"  {engine} {memory['bytes_per_entity']:>6.0f} B/entity, {memory['gc_collections']} gc"
+                f" ({memory['gc_pause_ms']:.1f} ms)"
+                for engine, memory in result["memory"].items()
+            ))
+    if slow:
+        print(f"* slower than real time ({TICK_RATE} ticks/s)")
+    if "startup" in report:
+        startup = report["startup"]
+        print(f"{'startup':<22}  import {startup['import_ms']:.1f} ms  first frame {startup['first_frame_ms']:.1f} ms"
+              f"  process {startup['process_ms']:.1f} ms (median of {startup['runs']})")
+        if startup["display_at_import"]:
+            print("importing game.py started the display")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time stress scenarios headless and rendered")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--engine", action="append", choices=ENGINES, help="headless engines (default: all)")
+    parser.add_argument("--ticks", type=int, default=HEADLESS_TICKS)
+    parser.add_argument("--frames", type=int, default=RENDER_FRAMES)
+    parser.add_argument("--no-render", action="store_true", help="skip the rendered frame-time runs")
+    parser.add_argument("--no-startup", action="store_true", help="skip the import and first-frame timings")
+    parser.add_argument("--no-memory", action="store_true", help="skip the bytes per entity and gc measurements")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored result")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    report = run_suite(
+        args.scenarios or list(SCENARIOS),
+        engines=tuple(args.engine or ENGINES),
+        render=not args.no_render,
+        ticks=args.ticks,
+        frames=args.frames,
+        startup=not args.no_startup,
+        memory=not args.no_memory,
+    )
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(baseline, report, args.tolerance)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old:.2f} -> {new:.2f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
@@ -0,0 +1,90 @@
+import math
+
+from simulation import CELL_WIDTH, LANE_HEIGHT
+
+# Camera over the board. The renderer shows a fixed-size viewport onto boards
+# of any size: board coordinates (simulation pixels) are scrolled by the
+# camera position and scaled by its zoom. Everything here is plain arithmetic
+# so tools and tests can use it without a display.
+
+ZOOM_LEVELS = (1.0, 0.5, 0.25)  # Sprites and background chunks are cached per level
+SPRITE_MARGIN = 150  # Widest sprite (Gargantuar): how far one can reach past its position
+
+
+# Camera
+class Camera:
+    def __init__(self, view_width, view_height, lane_count, columns):
+        self.view_width = view_width    # Viewport size in screen pixels
+        self.view_height = view_height
+        self.board_width = columns * CELL_WIDTH
+        self.board_height = lane_count * LANE_HEIGHT
+        self.lane_count = lane_count
+        self.columns = columns
+        self.x = self.y = 0.0  # Board point shown at the viewport's top-left corner
+        self.zoom = ZOOM_LEVELS[0]
+
+    def fits(self, lane_count, columns):
+        return (self.lane_count, self.columns) == (lane_count, columns)
+
+    # Keep the viewport on the board (pinned to the top-left when the board is smaller)
+    def clamp(self):
+        self.x = max(0.0, min(self.x, self.board_width - self.view_width / self.zoom))
+        self.y = max(0.0, min(self.y, self.board_height - self.view_height / self.zoom))
+
+    # Move by a distance in screen pixels
+    def scroll(self, dx, dy):
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    # Step through ZOOM_LEVELS (+1 zooms out), keeping the board point under
+    # the screen position (sx, sy) in place
+    def zoom_by(self, steps, sx, sy):
+        level = ZOOM_LEVELS.index(self.zoom) + steps
+        level = max(0, min(level, len(ZOOM_LEVELS) - 1))
+        x, y = self.to_board(sx, sy)
+        self.zoom = ZOOM_LEVELS[level]
+        self.x = x - sx / self.zoom
+        self.y = y - sy / self.zoom
+        self.clamp()
+
+    # Whole-pixel screen offset of the board origin; everything drawn rounds the same way
+    def offset(self):
+        return round(self.x * self.zoom), round(self.y * self.zoom)
+
+    # Changes whenever the background under the viewport must be redrawn
+    def view_key(self):
+        return self.offset() + (self.zoom,)
+
+    def to_screen(self, x, y):
+        ox, oy = self.offset()
+        return x * self.zoom - ox, y * self.zoom - oy
+
+    def to_board(self, sx, sy):
+        ox, oy = self.offset()
+        return (sx + ox) / self.zoom, (sy + oy) / self.zoom
+
+    # (lane, col) under a point of the viewport; may lie off the board
+    def cell_at(self, sx, sy):
+        x, y = self.to_board(sx, sy)
+        return int(y // LANE_HEIGHT), int(x // CELL_WIDTH)
+
+    # Board rectangle (left, top, right, bottom) under the viewport
+    def visible_rect(self):
+        return self.to_board(0, 0) + self.to_board(self.view_width, self.view_height)
+
+    # (first lane, end lane, left, right) of the board that can appear in the
+    # viewport, widened up and left by SPRITE_MARGIN for sprites that overhang
+    # their position. This is the `area` the engines' view methods take.
+    def visible_area(self):
+        left, top, right, bottom = self.visible_rect()
+        first = max(0, int((top - SPRITE_MARGIN) // LANE_HEIGHT))
+        end = min(self.lane_count, math.ceil(bottom / LANE_HEIGHT))
+        return first, end, left - SPRITE_MARGIN, right
+
+    # Grid cells intersecting the viewport: (first lane, end lane, first col, end col)
+    def visible_cells(self):
+        left, top, right, bottom = self.visible_rect()
+        first = max(0, int(top // LANE_HEIGHT))
+        end = min(self.lane_count, math.ceil(bottom / LANE_HEIGHT))
+        return first, end, max(0, int(left // CELL_WIDTH)), min(self.columns, math.ceil(right / CELL_WIDTH))
@@ -0,0 +1,90 @@
+import random
+
+from simulation import LANE_COUNT, TICK_RATE, zombie_classes
+from units import ZOMBIE_ENDLESS_WEIGHT
+
+# Endless mode: instead of the fixed wave list, a seeded generator streams one
+# wave after another with no end. Each wave is compiled in one go into a
+# schedule of (tick offset, lane, zombie kind) sorted by tick, from the game
+# seed and the wave number alone, so any wave can be built (or rebuilt after a
+# snapshot) without replaying the ones before it. Waves last WAVE_TICKS; the
+# next one starts on time whether or not the last is cleared, and each spawns
+# faster, with tougher zombies, than the one before.
+
+WAVE_TICKS = 20 * TICK_RATE  # Each wave lasts 20 seconds
+
+BASE_RATE = 1.0                # Zombies per second in the first wave (per LANE_COUNT lanes)
+RATE_GROWTH = 1.3              # Spawn rate multiplies by this every wave
+MAX_RATE = 8 * TICK_RATE       # Capped at 8 spawns per tick (from wave 24)
+MULTIPLIER_STEP = 0.025        # Speed multiplier gained per wave...
+MAX_MULTIPLIER = 1.5           # ...up to this
+
+ZOMBIE_KINDS = tuple(zombie_classes.values())  # Type id -> class
+
+
+def wave_rate(wave):
+    return min(BASE_RATE * RATE_GROWTH ** wave, MAX_RATE)
+
+
+def wave_multiplier(wave):
+    return min(1.0 + MULTIPLIER_STEP * wave, MAX_MULTIPLIER)
+
+
+# Spawn weight of each zombie type id (units.ZOMBIE_STATS "endless_weight")
+def wave_weights(wave):
+    return [start + growth * wave for start, growth in ZOMBIE_ENDLESS_WEIGHT]
+
+
+# Spawn schedule of one wave: (tick offset, lane, index into ZOMBIE_KINDS).
+# Larger boards get proportionally more zombies.
+def compile_wave(seed, wave, lane_count=LANE_COUNT):
+    rng = random.Random(f"endless:{seed}:{wave}")
+    count = round(wave_rate(wave) * WAVE_TICKS / TICK_RATE * lane_count / LANE_COUNT)
+    offsets = sorted(rng.randrange(WAVE_TICKS) for _ in range(count))
+    lanes = [rng.randrange(lane_count) for _ in range(count)]
+    kinds = rng.choices(range(len(ZOMBIE_KINDS)), weights=wave_weights(wave), k=count)
+    return list(zip(offsets, lanes, kinds))
+
+
+# Endless Waves
+# Replaces spawn_zombies() and check_wave_completion() for a game created with
+# endless=True. Only the current wave's schedule is held in memory.
+class EndlessWaves:
+    def __init__(self, seed):
+        self.seed = seed
+        self.wave = 0
+        self.wave_start = 0  # Tick the current wave began
+        self.schedule = []
+        self.position = 0    # Next schedule entry to spawn
+
+    # Make `wave` the current wave, starting on this tick
+    def load(self, state, wave, wave_start=None, position=0):
+        self.wave = wave
+        self.wave_start = state.tick if wave_start is None else wave_start
+        self.schedule = compile_wave(self.seed, wave, state.lane_count)
+        self.position = position
+        state.current_wave = wave
+        state.speed_multiplier = wave_multiplier(wave)
+        state.wave_zombies_remaining = len(self.schedule) - position
+
+    # Jump straight to a later wave (benchmarks, testing)
+    def skip_to(self, state, wave):
+        self.load(state, wave)
+        state.update_zombie_speeds()
+
+    def update(self, state):
+        elapsed = state.tick - self.wave_start
+        if elapsed >= WAVE_TICKS:
+            self.skip_to(state, self.wave + 1)
+            state.events.append(("wave", self.wave))
+            state.telemetry.wave(self.wave)
+            elapsed = 0
+
+        schedule = self.schedule
+        position = self.position
+        while position < len(schedule) and schedule[position][0] <= elapsed:
+            _, lane, kind = schedule[position]
+            state.spawn_zombie(ZOMBIE_KINDS[kind], lane)
+            position += 1
+        self.position = position
+        state.wave_zombies_remaining = len(schedule) - position
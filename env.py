@@ -0,0 +1,197 @@
+import random
+
+import numpy as np
+
+from simulation import (
+    CELL_WIDTH,
+    ENGINES,
+    GRID_COLUMNS,
+    LANE_COUNT,
+    PLACE,
+    SHOVEL,
+    TICK_RATE,
+    new_game,
+    plant_code,
+    plant_costs,
+    step,
+)
+
+# Reinforcement learning environments with the gymnasium API (reset() ->
+# (observation, info), step(action) -> (observation, reward, terminated,
+# truncated, info)), without depending on gymnasium itself. BoardEnv plays one
+# headless game; VectorEnv steps N independent boards in lockstep. Every
+# observation is written into arrays allocated once up front: step() returns
+# the same arrays each time, so copy them if they must outlive the next step.
+
+ACTION_TICKS = TICK_RATE // 4          # Simulation ticks per agent decision
+MAX_EPISODE_TICKS = 10 * 60 * TICK_RATE  # Episodes still running after 10 minutes are truncated
+WIN_REWARD = 1000                        # On top of the coins earned from kills
+LOSE_REWARD = -1000
+
+# Actions are ints. 0 does nothing; 1 + (tool * lanes + lane) * columns + col
+# uses TOOLS[tool] on (lane, col).
+TOOLS = tuple(plant_costs) + (SHOVEL,)
+NOOP = 0
+
+def action_count(lanes=LANE_COUNT, columns=GRID_COLUMNS):
+    return 1 + len(TOOLS) * lanes * columns
+
+
+def encode_action(tool, lane, col, lanes=LANE_COUNT, columns=GRID_COLUMNS):
+    return 1 + (TOOLS.index(tool) * lanes + lane) * columns + col
+
+
+# The step() input for an action, or None for NOOP
+def decode_action(action, lanes=LANE_COUNT, columns=GRID_COLUMNS):
+    if action == NOOP:
+        return None
+    tool_lane, col = divmod(action - 1, columns)
+    tool, lane = divmod(tool_lane, lanes)
+    if TOOLS[tool] == SHOVEL:
+        return SHOVEL, lane, col
+    return PLACE, TOOLS[tool], lane, col
+
+
+# Zeroed observation arrays, with `batch` leading dimensions:
+#   plants  (lanes, columns) int8   simulation.plant_code of each cell
+#   zombies (lanes, columns) int32  zombies standing in each cell (those still
+#                                   off the right edge count in the last column)
+#   coins, wave                     current coins and wave number
+def observation_arrays(lanes=LANE_COUNT, columns=GRID_COLUMNS, batch=()):
+    return {
+        "plants": np.zeros(batch + (lanes, columns), dtype=np.int8),
+        "zombies": np.zeros(batch + (lanes, columns), dtype=np.int32),
+        "coins": np.zeros(batch, dtype=np.int64),
+        "wave": np.zeros(batch, dtype=np.int32),
+    }
+
+
+# Lane and x of every zombie, as arrays
+def zombie_positions(state):
+    if state.engine == "numpy":
+        z = state.zombie_arrays
+        return z.lane[:z.n], z.x[:z.n]
+    zombies = state.zombies
+    return (
+        np.fromiter((zombie.lane for zombie in zombies), dtype=np.int64, count=len(zombies)),
+        np.fromiter((zombie.x for zombie in zombies), dtype=np.float64, count=len(zombies)),
+    )
+
+
+# Board Environment
+class BoardEnv:
+    def __init__(
+        self, engine="objects", seed=None, action_ticks=ACTION_TICKS, max_ticks=MAX_EPISODE_TICKS, observation=None,
+        **game_kwargs,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        self.engine = engine
+        self.action_ticks = action_ticks
+        self.max_ticks = max_ticks
+        self.game_kwargs = game_kwargs  # Passed on to new_game(): wave_config, coins, endless, lanes, ...
+        self.lanes = game_kwargs.get("lanes", LANE_COUNT)
+        self.columns = game_kwargs.get("columns", GRID_COLUMNS)
+        self.action_count = action_count(self.lanes, self.columns)
+        self.seeds = random.Random(seed)  # Draws the game seed of each episode
+        # Arrays the observation is written into; VectorEnv passes views of its batch arrays
+        self.observation = observation or observation_arrays(self.lanes, self.columns)
+        self.state = None
+
+    def reset(self, seed=None):
+        if seed is None:
+            seed = self.seeds.getrandbits(32)
+        self.state = new_game(self.engine, seed=seed, **self.game_kwargs)
+        self.observe()
+        return self.observation, {"seed": seed}
+
+    def step(self, action):
+        state = self.state
+        earned = state.coins_earned
+        inputs = () if action == NOOP else (decode_action(action, self.lanes, self.columns),)
+        end = state.tick + self.action_ticks
+        while state.tick < end and not state.result:
+            step(state, inputs)
+            inputs = ()
+        reward = state.coins_earned - earned
+        if state.result == "win":
+            reward += WIN_REWARD
+        elif state.result == "lose":
+            reward += LOSE_REWARD
+        terminated = state.result is not None
+        truncated = not terminated and state.tick >= self.max_ticks
+        self.observe()
+        return self.observation, reward, terminated, truncated, {"result": state.result, "tick": state.tick}
+
+    def observe(self):
+        state, observation = self.state, self.observation
+        observation["plants"][...] = [[plant_code(plant) for plant in row] for row in state.plants]
+        lanes, xs = zombie_positions(state)
+        cells = lanes * self.columns + np.clip(xs // CELL_WIDTH, 0, self.columns - 1).astype(np.int64)
+        observation["zombies"].reshape(-1)[...] = np.bincount(cells, minlength=self.lanes * self.columns)
+        observation["coins"][...] = state.coins
+        observation["wave"][...] = state.current_wave
+
+
+# Vectorized Environment
+# N boards stepped one after another behind a batched API. Each board writes
+# its observation straight into its row of the batch arrays. A board whose
+# episode ends is reset on the spot: its row then holds the first
+# observation of the next episode, and the finished episode's info is
+# returned in infos[i]["final"].
+class VectorEnv:
+    def __init__(self, count, engine="objects", seed=None, **env_kwargs):
+        self.count = count
+        lanes = env_kwargs.get("lanes", LANE_COUNT)
+        columns = env_kwargs.get("columns", GRID_COLUMNS)
+        self.observation = observation_arrays(lanes, columns, (count,))
+        self.rewards = np.zeros(count, dtype=np.float64)
+        self.terminated = np.zeros(count, dtype=bool)
+        self.truncated = np.zeros(count, dtype=bool)
+        seeds = random.Random(seed)
+        self.envs = [
+            BoardEnv(
+                engine,
+                seed=seeds.getrandbits(32),
+                observation={name: array[i, ...] for name, array in self.observation.items()},  # Views, not copies
+                **env_kwargs,
+            )
+            for i in range(count)
+        ]
+        self.action_count = self.envs[0].action_count
+
+    def reset(self):
+        infos = [env.reset()[1] for env in self.envs]
+        return self.observation, infos
+
+    # `actions` holds one action per board (any sequence of ints)
+    def step(self, actions):
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            _, reward, terminated, truncated, info = env.step(int(action))
+            self.rewards[i] = reward
+            self.terminated[i] = terminated
+            self.truncated[i] = truncated
+            if terminated or truncated:
+                info = {"final": info, "seed": env.reset()[1]["seed"]}
+            infos.append(info)
+        return self.observation, self.rewards, self.terminated, self.truncated, infos
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # Environment steps per second under uniformly random actions
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    engine = sys.argv[2] if len(sys.argv) > 2 else "objects"
+    steps = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    envs = VectorEnv(count, engine, seed=0)
+    envs.reset()
+    actions = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        envs.step(actions.integers(0, envs.action_count, count))
+    elapsed = time.perf_counter() - start
+    print(f"{count} boards x {steps} steps: {count * steps / elapsed:.0f} env steps/sec "
+          f"({count * steps * envs.envs[0].action_ticks / elapsed:.0f} ticks/sec)")
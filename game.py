@@ -1,17 +1,32 @@
+import argparse
 import pygame
-import sys
 import random
-
-# Initialize Pygame
-pygame.init()
+import sys
+import time
+
+from simulation import (
+    CELL_WIDTH,
+    ENGINES,
+    GRID_COLUMNS,
+    LANE_COUNT,
+    LANE_HEIGHT,
+    PLACE,
+    SCREEN_WIDTH,
+    SHOVEL,
+    TICK_RATE,
+    new_game,
+    plant_costs,
+    step,
+)
+from assets import AssetManager
+from camera import Camera
+from profiler import Profiler
+from replay import ReplayRecorder
+from text_cache import TextCache
+from units import BULLET_SPRITE, PLANT_SPRITE, PLANT_STATS, ZOMBIE_FROZEN_SPRITE, ZOMBIE_SPRITE
 
 # Screen dimensions
-SCREEN_WIDTH = 1600
 SCREEN_HEIGHT = 900  # Increased height for the plant pool
-LANE_COUNT = 5
-LANE_HEIGHT = 100
-CELL_WIDTH = 100  # Grid cell width
-GRID_COLUMNS = SCREEN_WIDTH // CELL_WIDTH
 PLANT_POOL_HEIGHT = 100  # Height of the plant pool menu
 
 # Colors
@@ -21,620 +36,498 @@ DARK_GREEN = (34, 139, 34)
 BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 
-# Set up the screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Plants Vs Monsters")
-
-# Game Clock
-clock = pygame.time.Clock()
-
-# Load Sprites
-plant_image = pygame.image.load("assets/plant.png")
-plant_image = pygame.transform.scale(plant_image, (CELL_WIDTH - 10, LANE_HEIGHT - 10))
-
-freezing_plant_image = pygame.image.load("assets/freezing_plant.png")
-freezing_plant_image = pygame.transform.scale(freezing_plant_image, (CELL_WIDTH - 10, LANE_HEIGHT - 10))
-
-repeater_image = pygame.image.load("assets/repeater.png")
-repeater_image = pygame.transform.scale(repeater_image, (CELL_WIDTH - 10, LANE_HEIGHT - 10))
-
-zombie_image = pygame.image.load("assets/zombie.png")
-zombie_image = pygame.transform.scale(zombie_image, (CELL_WIDTH - 30, LANE_HEIGHT - 20))
+# Window and frame clock, created by init_display(). Importing this module
+# has no side effects: nothing touches SDL until a frame is drawn.
+screen = None
+clock = None
 
-zombie_2_image = pygame.image.load("assets/zombie_2.png")
-zombie_2_image = pygame.transform.scale(zombie_2_image, (CELL_WIDTH - 30, LANE_HEIGHT - 20))
+# Fonts and rendered labels, shared by every draw function
+text_cache = TextCache()
 
-zombie_3_image = pygame.image.load("assets/zombie_3.png")
-zombie_3_image = pygame.transform.scale(zombie_3_image, (CELL_WIDTH - 30, LANE_HEIGHT - 20))
+# Sprites, read and converted on first use by the asset manager
+assets = AssetManager()
 
-gargantuar_image = pygame.image.load("assets/gargantuar.png")
-gargantuar_image = pygame.transform.scale(gargantuar_image, (CELL_WIDTH + 50, LANE_HEIGHT + 50))
+# Phase timings for the profiling overlay (F3) and --trace
+profiler = Profiler()
 
-freezed_zombie_image = pygame.image.load("assets/freezed_zombie.png")
-freezed_zombie_image = pygame.transform.scale(freezed_zombie_image, (CELL_WIDTH - 30, LANE_HEIGHT - 20))
+# Sprites shown in the plant pool and while dragging
+pool_sprites = dict(zip(PLANT_STATS, PLANT_SPRITE), shovel="shovel")
 
-bullet_image = pygame.image.load("assets/bullet.png")
-bullet_image = pygame.transform.scale(bullet_image, (50, 50))
+# Surfaces for the sprites of units.py (by type id) and the pool, filled in
+# by load_sprites()
+plant_images = []
+zombie_images = []
+frozen_zombie_images = []
+bullet_images = []
+pool_images = {}
 
-ice_bullet_image = pygame.image.load("assets/ice_bullet.png")
-ice_bullet_image = pygame.transform.scale(ice_bullet_image, (50, 50))
 
-repeater_bullet_image = pygame.image.load("assets/repeater_bullet.png")
-repeater_bullet_image = pygame.transform.scale(repeater_bullet_image, (50, 50))
+def load_sprites():
+    plant_images[:] = map(assets.get, PLANT_SPRITE)
+    zombie_images[:] = map(assets.get, ZOMBIE_SPRITE)
+    frozen_zombie_images[:] = map(assets.get, ZOMBIE_FROZEN_SPRITE)
+    bullet_images[:] = map(assets.get, BULLET_SPRITE)
+    pool_images.update((plant_type, assets.get(name)) for plant_type, name in pool_sprites.items())
 
-wallnut_image = pygame.image.load("assets/wallnut.png")
-wallnut_image = pygame.transform.scale(wallnut_image, (CELL_WIDTH - 10, LANE_HEIGHT - 10))
 
-cherry_bomb_image = pygame.image.load("assets/cherry_bomb.png")
-cherry_bomb_image = pygame.transform.scale(cherry_bomb_image, (CELL_WIDTH - 10, LANE_HEIGHT - 10))
+# Fixed timestep: the simulation always advances in TICK_RATE ticks per game
+# second; rendering runs at whatever rate the machine manages in between
+TICK_SECONDS = 1 / TICK_RATE
+MAX_FRAME_SECONDS = 0.25  # Catch-up cap: wall time beyond this per frame is dropped
+MAX_TICKS_PER_FRAME = 64  # Catch-up cap for scaled time
+RENDER_FPS = 60
 
-shovel_image = pygame.image.load("assets/shovel.png")
-shovel_image = pygame.transform.scale(shovel_image, (CELL_WIDTH - 10, LANE_HEIGHT - 10))
-
-
-# Game objects
-shooter_plants = [[None for _ in range(GRID_COLUMNS)] for _ in range(LANE_COUNT)]
-zombies = []
-bullets = []
-coins = 10000
+# Runtime time scales (keys 1-4); None runs as many ticks as fit in a frame
+TIME_SCALES = (1, 4, 16, None)
+time_scale = 1
 
 # Drag-and-drop mechanics
 dragging_plant = False
 dragged_plant_pos = None
 plant_type_dragged = None
 
-plant_costs = {
-    "normal_plant": 10,
-    "freezing_plant": 30,
-    "repeater": 100,
-    "wallnut": 25,
-    "cherry_bomb": 50,
-}
-
-
-# Shooter Plant Class
-class ShooterPlant:
-    def __init__(self, lane, col,health=5,attack_power=1):
-        self.lane = lane
-        self.col = col
-        self.x = col * CELL_WIDTH
-        self.y = lane * LANE_HEIGHT + 5
-        self.shoot_timer = 0
-        self.health = health
-        self.attack_power = attack_power
-    def auto_shoot(self):
-        self.shoot_timer += 1
-        if self.shoot_timer >= 90:  # Shoot every 1.5 seconds
-            for zombie in zombies:
-                if zombie.lane == self.lane:
-                    bullets.append(Bullet(self.x + CELL_WIDTH, self.y + LANE_HEIGHT // 2 - 5, damage=self.attack_power))
-                    self.shoot_timer = 0
-                    break
-    def take_damage(self, damage):
-        self.health -= damage
-        if self.health <= 0:
-            shooter_plants[self.lane][self.col] = None
-
-    def draw(self):
-        screen.blit(plant_image, (self.x + 5, self.y))
-
-
-# Freezing Plant Class
-class FreezingPlant(ShooterPlant):
-    def auto_shoot(self):
-        self.shoot_timer += 1
-        if self.shoot_timer >= 120:  # Shoot every 2 seconds
-            for zombie in zombies:
-                if zombie.lane == self.lane:
-                    bullets.append(IceBullet(self.x + CELL_WIDTH, self.y + LANE_HEIGHT // 2 - 5))
-                    self.shoot_timer = 0
-                    break
-
-    def draw(self):
-        screen.blit(freezing_plant_image, (self.x + 5, self.y))
-
-
-# Repeater Class
-class Repeater(ShooterPlant):
-    def auto_shoot(self):
-        self.shoot_timer += 1
-        if self.shoot_timer >= 60:  # Shoot every 1 second
-            for zombie in zombies:
-                if zombie.lane == self.lane:
-                    # Shoots two bullets in quick succession
-                    bullets.append(SmallBullet(self.x + CELL_WIDTH, self.y + LANE_HEIGHT // 2 - 5))
-                    bullets.append(SmallBullet(self.x + CELL_WIDTH + 20, self.y + LANE_HEIGHT // 2 - 5))
-                    self.shoot_timer = 0
-                    break
-
-    def draw(self):
-        screen.blit(repeater_image, (self.x + 5, self.y))
-
-# Wallnut Plant Class
-class Wallnut(ShooterPlant):
-    def __init__(self, lane, col):
-        super().__init__(lane, col, health=100
-        )  # High health value
-        self.x = col * CELL_WIDTH
-        self.y = lane * LANE_HEIGHT + 5
-
-    def auto_shoot(self):
-        # Wallnut doesn't shoot, so this method does nothing
-        pass
-
-    def draw(self):
-        # Use a specific sprite for the Wallnut
-        screen.blit(wallnut_image, (self.x + 5, self.y))
-
-# CherryBomb Plant Class
-class CherryBomb(ShooterPlant):
-    def __init__(self, lane, col):
-        super().__init__(lane, col, health=1)  # Minimal health as it explodes quickly
-        self.explode_timer = 60  # Explodes after 1 second (60 frames at 60 FPS)
-        self.damage = 30  # Amount of damage dealt by the explosion
-
-    def auto_shoot(self):
-        # Countdown to explosion
-        self.explode_timer -= 1
-        if self.explode_timer <= 0:
-            self.explode()  # Trigger the explosion
-
-    def explode(self):
-        # Apply damage to all zombies in a 1-grid radius
-        for zombie in zombies[:]:
-            zombie_col = int(zombie.x // CELL_WIDTH)
-            zombie_lane = zombie.lane
-
-            # Check if the zombie is within 1-grid range (including diagonals)
-            if abs(zombie_col - self.col) <= 1 and abs(zombie_lane - self.lane) <= 1:
-                zombie.health -= self.damage  # Reduce zombie's health
-                if zombie.health <= 0:  # Remove zombie if its health drops to 0 or below
-                    zombies.remove(zombie)
-
-        # Remove the CherryBomb plant after explosion
-        shooter_plants[self.lane][self.col] = None
-
-    def draw(self):
-        # Use a specific sprite for the CherryBomb
-        screen.blit(cherry_bomb_image, (self.x + 5, self.y))
-
-
-
-# Bullet Class
-# Bullet Class
-class Bullet:
-    def __init__(self, x, y, damage=1):  # Default damage is 1
-        self.x = x
-        self.y = y
-        self.speed = 10
-        self.damage = damage  # Store damage for the bullet
-
-    def move(self):
-        self.x += self.speed
-
-    def draw(self):
-        screen.blit(bullet_image, (self.x, self.y))
-
-
-# Ice Bullet Class
-class IceBullet(Bullet):
-    def __init__(self, x, y):
-        super().__init__(x, y, damage=1)  # IceBullet deals 1 damage by default
-
-    def draw(self):
-        screen.blit(ice_bullet_image, (self.x, self.y))
-
-# Small Bullet Class (used by Repeater)
-class SmallBullet(Bullet):
-    def __init__(self, x, y):
-        super().__init__(x, y, damage=2)  # SmallBullet deals 2 damage
-
-    def draw(self):
-        screen.blit(repeater_bullet_image, (self.x, self.y))
-
-
-
-
-speed_multiplier = 1.0
-
-# Zombie Class
-class Zombie:
-    def __init__(self, lane):
-        self.lane = lane
-        self.x = SCREEN_WIDTH
-        self.y = lane * LANE_HEIGHT + 10
-        self.health = 5
-        self.base_speed = 1  # Even slower base speed
-        self.speed = self.base_speed * speed_multiplier
-        self.frozen = False
-        self.frozen_timer = 0
-        self.eating_plant = None
-        self.reward = 10  # Default reward
-
-    def move(self):
-        if self.eating_plant:  # Stop moving if eating a plant
-            self.eating_plant.take_damage(0.1)  # Slowly damage the plant
-            if self.eating_plant.health <= 0:  # Once the plant is destroyed
-                self.eating_plant = None  # Stop eating
-        elif not self.frozen:  # If not frozen or eating, continue moving
-            self.x -= self.speed * speed_multiplier  # Apply speed multiplier
-        else:  # Handle frozen timer
-            self.frozen_timer += 1
-            if self.frozen_timer >= 300:  # 5 seconds freeze (60 FPS * 5)
-                self.frozen = False
-                self.frozen_timer = 0
-
-    def detect_plant(self):
-    # Check for plants in front of the zombie
-        col = int(self.x // CELL_WIDTH)  # Ensure column index is an integer
-        if 0 <= col < GRID_COLUMNS:
-            plant = shooter_plants[self.lane][col]
-            if plant:  # If there's a plant in the zombie's lane and column
-                self.eating_plant = plant  # Start eating this plant
-
-    def draw(self):
-        if self.frozen:
-            screen.blit(freezed_zombie_image, (self.x, self.y))
-        else:
-            screen.blit(zombie_image, (self.x, self.y))
-
-
-# Zombie Type 2 Class
-class Zombie2(Zombie):
-    def __init__(self, lane):
-        super().__init__(lane)
-        self.health = 10  # Increased health
-        self.base_speed = 1  # Even slower base speed
-        self.speed = self.base_speed * speed_multiplier
-        self.reward = 20  # Higher reward
-
-
-    def draw(self):
-        if self.frozen:
-            screen.blit(freezed_zombie_image, (self.x, self.y))
-        else:
-            screen.blit(zombie_2_image, (self.x, self.y))
-
-
-# Zombie Type 3 Class
-class Zombie3(Zombie):
-    def __init__(self, lane):
-        super().__init__(lane)
-        self.health = 15  # Increased health
-        self.base_speed = 1  # Even slower base speed
-        self.speed = self.base_speed * speed_multiplier
-        self.reward = 30  # Highest reward
-
-    def draw(self):
-        if self.frozen:
-            screen.blit(freezed_zombie_image, (self.x, self.y))
-        else:
-            screen.blit(zombie_3_image, (self.x, self.y))
+# Board viewport. Boards bigger than it scroll (arrow keys) and zoom out (mouse
+# wheel); only what the camera shows is looked up and drawn.
+BOARD_VIEW = pygame.Rect(0, 0, SCREEN_WIDTH, LANE_COUNT * LANE_HEIGHT)
+SCROLL_SPEED = 1500  # Screen pixels per second
+camera = None
 
+# The board background is drawn in square chunks of CHUNK_CELLS cells, cached
+# per zoom level, so only the chunks under the viewport are ever drawn
+CHUNK_CELLS = 8
+chunk_cache = {}
 
-# Gargantuar Zombie Class
-# Gargantuar Zombie Class
-class Gargantuar(Zombie):
-    def __init__(self, lane):
-        super().__init__(lane)
-        self.health = 300  # Massive health
-        self.base_speed = 0.5  # Very slow speed
-        self.speed = self.base_speed * speed_multiplier
-        self.reward = 50  # High reward for defeating
+# Sprites scaled to the zoom level, keyed by (sprite, zoom)
+scaled_images = {}
 
-    def move(self):
-        if self.eating_plant:  # Stop moving if eating a plant
-            self.eating_plant.take_damage(0.2)  # Deal more damage to plants
-            if self.eating_plant.health <= 0:  # Once the plant is destroyed
-                self.eating_plant = None  # Stop eating
-        else:  # Move normally, ignoring freezing
-            self.x -= self.speed * speed_multiplier
+# Static layer: board view and plant pool are drawn once, then copied under
+# whatever moved each frame instead of being redrawn. The board part is
+# redrawn from chunks whenever the camera moves.
+static_layer = None
+static_view = None
+plant_pool_positions = {}
 
-    def draw(self):
-        # Use the correct sprite for the Gargantuar
-        screen.blit(gargantuar_image, (self.x, self.y))  # Replace with Gargantuar sprite
+# Screen areas drawn over during the previous frame
+dirty_rects = []
 
+# Above this many changed areas a single full-screen update is cheaper
+MAX_DIRTY_RECTS = 300
 
-# Check for losing condition
-def check_loss():
-    for zombie in zombies:
-        if zombie.x <= 0:
-            return True
-    return False
+# Profiling overlay, re-rendered this often from the rolling timings
+PROFILE_REFRESH_FRAMES = 30
+profile_panel = None
+profile_frames = 0
 
 
-# Draw the grid
-def draw_background():
-    screen.fill(GREEN)  # Fill the entire screen with the game background color
+# Draw one chunk of the grid: lanes and columns from (first_lane, first_col),
+# clipped to the board edges
+def draw_chunk(first_lane, first_col, lane_count, columns, zoom):
+    lanes = min(CHUNK_CELLS, lane_count - first_lane)
+    cols = min(CHUNK_CELLS, columns - first_col)
+    width, height = round(cols * CELL_WIDTH * zoom), round(lanes * LANE_HEIGHT * zoom)
+    chunk = pygame.Surface((width, height)).convert()
 
     # Draw the grid lanes
-    for i in range(LANE_COUNT):
-        lane_color = DARK_GREEN if i % 2 == 0 else GREEN
-        pygame.draw.rect(screen, lane_color, (0, i * LANE_HEIGHT, SCREEN_WIDTH, LANE_HEIGHT))
-        pygame.draw.line(screen, BLACK, (0, i * LANE_HEIGHT), (SCREEN_WIDTH, i * LANE_HEIGHT), 2)
-        for j in range(GRID_COLUMNS):
-            pygame.draw.line(screen, BLACK, (j * CELL_WIDTH, 0), (j * CELL_WIDTH, LANE_HEIGHT * LANE_COUNT), 2)
-
-    # Fill the plant pool area
-    pygame.draw.rect(screen, WHITE, (0, LANE_COUNT * LANE_HEIGHT, SCREEN_WIDTH, PLANT_POOL_HEIGHT))
+    for i in range(lanes):
+        y = round(i * LANE_HEIGHT * zoom)
+        lane_color = DARK_GREEN if (first_lane + i) % 2 == 0 else GREEN
+        pygame.draw.rect(chunk, lane_color, (0, y, width, round(LANE_HEIGHT * zoom)))
+        pygame.draw.line(chunk, BLACK, (0, y), (width, y), 2)
+    for j in range(cols):
+        x = round(j * CELL_WIDTH * zoom)
+        pygame.draw.line(chunk, BLACK, (x, 0), (x, height), 2)
+    return chunk
+
+
+# Draw the part of the grid under the camera into the board viewport
+def draw_background(surface, lane_count, columns):
+    surface.fill(GREEN, BOARD_VIEW)  # Beyond the board edges
+    first, end, first_col, end_col = camera.visible_cells()
+    ox, oy = camera.offset()
+    clip = surface.get_clip()
+    surface.set_clip(BOARD_VIEW)
+    for chunk_lane in range(first - first % CHUNK_CELLS, end, CHUNK_CELLS):
+        for chunk_col in range(first_col - first_col % CHUNK_CELLS, end_col, CHUNK_CELLS):
+            key = (chunk_lane, chunk_col, lane_count, columns, camera.zoom)
+            if key not in chunk_cache:
+                chunk_cache[key] = draw_chunk(chunk_lane, chunk_col, lane_count, columns, camera.zoom)
+            x, y = round(chunk_col * CELL_WIDTH * camera.zoom), round(chunk_lane * LANE_HEIGHT * camera.zoom)
+            surface.blit(chunk_cache[key], (x - ox, y - oy))
+    surface.set_clip(clip)
+
+
+# Sprite at the camera's zoom level
+def scaled(image):
+    if camera.zoom == 1.0:
+        return image
+    key = (image, camera.zoom)
+    if key not in scaled_images:
+        width, height = image.get_size()
+        scaled_images[key] = pygame.transform.smoothscale(image, (round(width * camera.zoom), round(height * camera.zoom)))
+    return scaled_images[key]
 
 
 # Draw the plant pool
-def draw_plant_pool():
+def draw_plant_pool(surface):
     pool_y = LANE_COUNT * LANE_HEIGHT
-    screen.fill(WHITE, rect=(0, pool_y, SCREEN_WIDTH, PLANT_POOL_HEIGHT))
+    surface.fill(WHITE, rect=(0, pool_y, SCREEN_WIDTH, PLANT_POOL_HEIGHT))
 
-    font = pygame.font.Font(None, 24)  # Font for the cost text
     plant_positions = {}
 
-    # Normal plant
-    x, y = CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
-    screen.blit(plant_image, (x, y))
-    pygame.draw.rect(screen, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
-    cost_text = font.render(f"{plant_costs['normal_plant']}", True, BLACK)
-    screen.blit(cost_text, (x + 5, y + LANE_HEIGHT - 20))
-    plant_positions["normal_plant"] = (x, y, CELL_WIDTH, LANE_HEIGHT)
-
-    # Freezing plant
-    x, y = 3 * CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
-    screen.blit(freezing_plant_image, (x, y))
-    pygame.draw.rect(screen, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
-    cost_text = font.render(f"{plant_costs['freezing_plant']}", True, BLACK)
-    screen.blit(cost_text, (x + 5, y + LANE_HEIGHT - 20))
-    plant_positions["freezing_plant"] = (x, y, CELL_WIDTH, LANE_HEIGHT)
-
-    # Repeater
-    x, y = 5 * CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
-    screen.blit(repeater_image, (x, y))
-    pygame.draw.rect(screen, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
-    cost_text = font.render(f"{plant_costs['repeater']}", True, BLACK)
-    screen.blit(cost_text, (x + 5, y + LANE_HEIGHT - 20))
-    plant_positions["repeater"] = (x, y, CELL_WIDTH, LANE_HEIGHT)
-
-    # Wallnut
-    x, y = 7 * CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
-    screen.blit(wallnut_image, (x, y))
-    pygame.draw.rect(screen, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
-    cost_text = font.render(f"{plant_costs['wallnut']}", True, BLACK)
-    screen.blit(cost_text, (x + 5, y + LANE_HEIGHT - 20))
-    plant_positions["wallnut"] = (x, y, CELL_WIDTH, LANE_HEIGHT)
-
-    # Cherry Bomb
-    x, y = 9 * CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
-    screen.blit(cherry_bomb_image, (x, y))
-    pygame.draw.rect(screen, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
-    cost_text = font.render(f"{plant_costs['cherry_bomb']}", True, BLACK)
-    screen.blit(cost_text, (x + 5, y + LANE_HEIGHT - 20))
-    plant_positions["cherry_bomb"] = (x, y, CELL_WIDTH, LANE_HEIGHT)
-
-    # Shovel (no cost required)
-    x, y = 11 * CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
-    screen.blit(shovel_image, (x, y))
-    pygame.draw.rect(screen, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
-    plant_positions["shovel"] = (x, y, CELL_WIDTH, LANE_HEIGHT)
+    for slot, (plant_type, image) in enumerate(pool_images.items()):
+        x, y = (2 * slot + 1) * CELL_WIDTH // 2, pool_y + (PLANT_POOL_HEIGHT - LANE_HEIGHT) // 2
+        surface.blit(image, (x, y))
+        pygame.draw.rect(surface, BLACK, (x, y, CELL_WIDTH, LANE_HEIGHT), 2)
+        if plant_type in plant_costs:  # Shovel (no cost required)
+            cost_text = text_cache.render("cost", f"{plant_costs[plant_type]}", BLACK)
+            surface.blit(cost_text, (x + 5, y + LANE_HEIGHT - 20))
+        plant_positions[plant_type] = (x, y, CELL_WIDTH, LANE_HEIGHT)
 
     return plant_positions
 
 
-# Waves Configuration
-waves = [
-    {"Zombie": 5, "Zombie2": 5, "Zombie3": 10, "speed_multiplier": 1.0},  # Wave 1
-    {"Zombie": 40, "Zombie2": 20, "Zombie3": 10, "speed_multiplier": 2},  # Wave 2
-    {"Zombie": 20, "Zombie2": 50, "Zombie3": 10, "speed_multiplier": 2.5},  # Wave 3
-    {"Zombie": 50, "Zombie2": 20, "Zombie3": 10, "Gargantuar": 5, "speed_multiplier": 1},  # Boss Fight
-]
-
-
-current_wave = 0
-wave_zombies_remaining = sum(value for key, value in waves[current_wave].items() if key != "speed_multiplier")
-
-spawn_timer = 0
-SPAWN_INTERVAL = 30  # Spawn a zombie every 1 second (60 FPS)
-
-# Spawn zombies based on wave configuration
-def spawn_zombies():
-    global wave_zombies_remaining, current_wave, spawn_timer, speed_multiplier
-    spawn_timer += 1
-    if spawn_timer >= SPAWN_INTERVAL and wave_zombies_remaining > 0:
-        zombie_type = random.choices(
-            ["Zombie", "Zombie2", "Zombie3", "Gargantuar"],
-            weights=[
-                waves[current_wave].get("Zombie", 0),
-                waves[current_wave].get("Zombie2", 0),
-                waves[current_wave].get("Zombie3", 0),
-                waves[current_wave].get("Gargantuar", 0),
-            ],
-            k=1,
-        )[0]
-        if waves[current_wave][zombie_type] > 0:
-            lane = random.randint(0, LANE_COUNT - 1)
-            if zombie_type == "Zombie":
-                zombies.append(Zombie(lane))
-            elif zombie_type == "Zombie2":
-                zombies.append(Zombie2(lane))
-            elif zombie_type == "Zombie3":
-                zombies.append(Zombie3(lane))
-            elif zombie_type == "Gargantuar":
-                zombies.append(Gargantuar(lane))
-            waves[current_wave][zombie_type] -= 1
-            wave_zombies_remaining -= 1
-            spawn_timer = 0  # Reset timer after spawning
-
-
-# Update zombie speeds when transitioning waves
-def update_zombie_speeds():
-    for zombie in zombies:
-        zombie.speed = zombie.base_speed * speed_multiplier
-
-
-# Check wave completion and transition
-
-def check_wave_completion():
-    global current_wave, wave_zombies_remaining, speed_multiplier
-    if wave_zombies_remaining == 0 and not zombies:
-        current_wave += 1
-        if current_wave < len(waves):
-            wave_zombies_remaining = sum(
-                value for key, value in waves[current_wave].items() if key != "speed_multiplier"
-            )
-            speed_multiplier = waves[current_wave]["speed_multiplier"]  # Use fixed multiplier
-            update_zombie_speeds()
-        else:
-            print("You Win!")
-            pygame.quit()
-            sys.exit()
+# Open the window. Only the display and font subsystems are started;
+# pygame.init() would also bring up audio and joysticks, which the game never uses.
+def init_display():
+    global screen, clock
+    if screen is not None:
+        return
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Plants Vs Monsters")
+    clock = pygame.time.Clock()
 
 
+def build_static_layers():
+    global static_layer, static_view, plant_pool_positions
+    init_display()
+    load_sprites()
+    static_layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+    static_layer.fill(GREEN)
+    static_view = None
+    plant_pool_positions = draw_plant_pool(static_layer)
+
+
+# Point the camera at a new board, keeping it when the size is unchanged
+def ensure_camera(state):
+    global camera
+    if camera is None or not camera.fits(state.lane_count, state.columns):
+        camera = Camera(BOARD_VIEW.width, BOARD_VIEW.height, state.lane_count, state.columns)
+
+
+# HUD values shown last frame and the label blits rendered for them
+hud_values = None
+hud_blits = []
+
 
 # Draw wave and zombie information
-def draw_wave_info():
-    font = pygame.font.Font(None, 36)
-    wave_text = font.render(f"Wave: {current_wave + 1}", True, BLACK)
-    zombies_text = font.render(f"Zombies Left: {len(zombies) + wave_zombies_remaining}", True, BLACK)
-    coins_text = font.render(f"Coins: {coins}", True, BLACK)  # Display coins
-    speed_text = font.render(f"Speed Multiplier: {speed_multiplier:.1f}x", True, BLACK)  # Display multiplier
-    screen.blit(wave_text, (10, SCREEN_HEIGHT - 80))
-    screen.blit(zombies_text, (200, SCREEN_HEIGHT - 80))
-    screen.blit(coins_text, (500, SCREEN_HEIGHT - 80))
-    screen.blit(speed_text, (700, SCREEN_HEIGHT - 80))
+def draw_wave_info(state):
+    global hud_values, hud_blits
+    values = (state.current_wave, state.zombies_left(), state.coins, state.speed_multiplier)
+    if values != hud_values:  # Only re-render labels when a value changed
+        hud_values = values
+        wave, zombies_left, coins, speed_multiplier = values
+        hud_blits = [
+            (text_cache.render("hud", f"Wave: {wave + 1}", BLACK), (10, SCREEN_HEIGHT - 80)),
+            (text_cache.render("hud", f"Zombies Left: {zombies_left}", BLACK), (200, SCREEN_HEIGHT - 80)),
+            (text_cache.render("hud", f"Coins: {coins}", BLACK), (500, SCREEN_HEIGHT - 80)),  # Display coins
+            (text_cache.render("hud", f"Speed Multiplier: {speed_multiplier:.1f}x", BLACK), (700, SCREEN_HEIGHT - 80)),  # Display multiplier
+        ]
+    return screen.blits(hud_blits)
+
+
+# (sprite, position) pairs for the plants, bullets and zombies the camera can
+# see, drawn in one blits() call. With `previous` (uid -> x one tick earlier)
+# moving entities are drawn `alpha` of the way from their previous to their
+# current position.
+def entity_blits(state, previous=None, alpha=1.0):
+    previous = previous or {}
+    to_screen = camera.to_screen
+    blits = []
+    first, end, first_col, end_col = camera.visible_cells()
+    for lane in state.plants[first:end]:
+        for plant in lane[first_col:end_col]:
+            if plant:
+                blits.append((scaled(plant_images[plant.type_id]), to_screen(plant.x + 5, plant.y)))
+
+    area = camera.visible_area()
+    for bullet_type, uid, x, y in state.bullet_views(area):
+        if uid in previous:
+            x = previous[uid] + (x - previous[uid]) * alpha
+        blits.append((scaled(bullet_images[bullet_type.type_id]), to_screen(x, y)))
+
+    for zombie_type, uid, x, y, frozen in state.zombie_views(area):
+        if uid in previous:
+            x = previous[uid] + (x - previous[uid]) * alpha
+        images = frozen_zombie_images if frozen else zombie_images
+        blits.append((scaled(images[zombie_type.type_id]), to_screen(x, y)))
+    return blits
+
+
+# Positions to interpolate from, for what the camera can see
+def visible_positions(state):
+    return state.entity_positions(camera.visible_area())
+
+
+# Panel with p50/p99 per phase and entity counts, refreshed every few frames
+def draw_profile_overlay():
+    global profile_panel, profile_frames
+    profile_frames += 1
+    if profile_panel is None or profile_frames >= PROFILE_REFRESH_FRAMES:
+        profile_frames = 0
+        font = text_cache.font("cost")  # Values change constantly, so they bypass the label cache
+        rows = [("phase", "p50 ms", "p99 ms")]
+        for name, (p50, p99) in profiler.stats().items():
+            rows.append((name, f"{p50 * 1000:.2f}", f"{p99 * 1000:.2f}"))
+        counts = "  ".join(f"{name} {count}" for name, count in profiler.counts.items())
+        line_height = font.get_linesize()
+        profile_panel = pygame.Surface((300, line_height * (len(rows) + 1) + 10))
+        profile_panel.fill(WHITE)
+        for i, (name, p50, p99) in enumerate(rows):
+            y = 5 + i * line_height
+            profile_panel.blit(font.render(name, True, BLACK), (5, y))
+            for text, right in ((p50, 210), (p99, 290)):  # Right-aligned number columns
+                label = font.render(text, True, BLACK)
+                profile_panel.blit(label, (right - label.get_width(), y))
+        profile_panel.blit(font.render(counts, True, BLACK), (5, 5 + len(rows) * line_height))
+    return profile_panel, (SCREEN_WIDTH - profile_panel.get_width() - 10, 10)
+
+
+# Draw one frame and push only the areas that changed since the last one
+def render_frame(state, overlays=(), previous=None, alpha=1.0):
+    global dirty_rects, static_view
+    if static_layer is None:
+        build_static_layers()
+    ensure_camera(state)
+    profiler.resume()
+    view = camera.view_key() + (state.lane_count, state.columns)
+    if view != static_view:  # The camera moved: redraw the board part and repaint everything
+        draw_background(static_layer, state.lane_count, state.columns)
+        static_view = view
+        dirty_rects = []
+    if not dirty_rects:
+        screen.blit(static_layer, (0, 0))
+        dirty_rects = [screen.get_rect()]
+
+    # Restore the static layer wherever something was drawn last frame
+    for rect in dirty_rects:
+        screen.blit(static_layer, rect, rect)
+    profiler.lap("background")
+
+    screen.set_clip(BOARD_VIEW)  # Sprites near the bottom edge must not spill onto the pool
+    drawn = screen.blits(entity_blits(state, previous, alpha))
+    screen.set_clip(None)
+    profiler.lap("entities")
+    drawn += draw_wave_info(state)
+    profiler.lap("hud")
+    drawn += screen.blits(overlays)
+    if profiler.enabled:
+        drawn.append(screen.blit(*draw_profile_overlay()))
+    profiler.lap("overlays")
+
+    if len(dirty_rects) + len(drawn) > MAX_DIRTY_RECTS:
+        pygame.display.update()
+    else:
+        pygame.display.update(dirty_rects + drawn)
+    dirty_rects = drawn
+    profiler.lap("flip")
+
+
+# Camera and drag-and-drop input on the board. Dropped plants and tools are
+# appended to `inputs` as step() actions.
+def handle_board_event(event, inputs):
+    global dragging_plant, dragged_plant_pos, plant_type_dragged
+
+    # Zoom the board in or out around the cursor
+    if event.type == pygame.MOUSEWHEEL:
+        mx, my = pygame.mouse.get_pos()
+        if BOARD_VIEW.collidepoint(mx, my):
+            camera.zoom_by(-event.y, mx, my)
+
+    # Start dragging a plant or tool (wheel turns also arrive as buttons 4 and 5)
+    if event.type == pygame.MOUSEBUTTONDOWN and event.button not in (4, 5):
+        mx, my = pygame.mouse.get_pos()
+
+        # Check which plant/tool is being dragged
+        for plant_type, (x, y, w, h) in plant_pool_positions.items():
+            if x <= mx <= x + w and y <= my <= y + h:
+                dragging_plant = True
+                dragged_plant_pos = (mx, my)
+                plant_type_dragged = plant_type
+
+    # Drop the plant/tool onto the grid
+    if event.type == pygame.MOUSEBUTTONUP and event.button not in (4, 5) and dragging_plant:
+        mx, my = pygame.mouse.get_pos()
+        if BOARD_VIEW.collidepoint(mx, my):
+            lane, col = camera.cell_at(mx, my)
+            if plant_type_dragged == "shovel":
+                inputs.append((SHOVEL, lane, col))
+            elif plant_type_dragged in plant_costs:  # Ensure it's a plant, not a shovel
+                inputs.append((PLACE, plant_type_dragged, lane, col))
+
+        # Reset dragging state
+        dragging_plant = False
+        plant_type_dragged = None
+
+
+# Scroll the board with the arrow keys
+def scroll_camera(frame_seconds):
+    keys = pygame.key.get_pressed()
+    scroll_x = keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]
+    scroll_y = keys[pygame.K_DOWN] - keys[pygame.K_UP]
+    if scroll_x or scroll_y:
+        distance = SCROLL_SPEED * frame_seconds
+        camera.scroll(scroll_x * distance, scroll_y * distance)
+
+
+# The dragged plant/tool following the mouse cursor
+def drag_overlays():
+    if not dragging_plant:
+        return []
+    mx, my = pygame.mouse.get_pos()
+    return [(pool_images[plant_type_dragged], (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))]
 
 
 # Main game loop
-def main():
-    global dragging_plant, dragged_plant_pos, plant_type_dragged, coins
+def main(
+    engine="objects", seed=None, record=None, profile=False, trace=None, endless=False, lanes=LANE_COUNT,
+    columns=GRID_COLUMNS, telemetry=None,
+):
+    global time_scale
+
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    state = new_game(engine, seed=seed, endless=endless, lanes=lanes, columns=columns)
+    state.profiler = profiler
+    recorder = ReplayRecorder(record, state) if record else None
+    init_display()
+    build_static_layers()
+    ensure_camera(state)
+    if trace:
+        profiler.start_trace()
+    elif profile:
+        profiler.set_enabled(True)
+    if telemetry:
+        state.telemetry.start(telemetry)
+
+    def quit_game():
+        if recorder and not state.result:
+            recorder.close(state)
+        if trace:
+            profiler.write_trace(trace)
+        state.telemetry.stop()
+        pygame.quit()
+        sys.exit()
+
+    # One simulation tick, recorded when a replay is being written
+    def advance(inputs):
+        if recorder:
+            recorder.record(state, inputs)
+        tick_events = step(state, inputs)
+        if recorder and state.result:
+            recorder.close(state)
+        return tick_events
+
+    inputs = []  # Player actions waiting for the next simulation tick
+    accumulator = 0.0
+    previous = None
+    last_time = time.perf_counter()
 
     while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-
-            # Start dragging a plant or tool
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = pygame.mouse.get_pos()
-                plant_pool_positions = draw_plant_pool()
-
-                # Check which plant/tool is being dragged
-                for plant_type, (x, y, w, h) in plant_pool_positions.items():
-                    if x <= mx <= x + w and y <= my <= y + h:
-                        dragging_plant = True
-                        dragged_plant_pos = (mx, my)
-                        plant_type_dragged = plant_type
-
-            # Drop the plant/tool onto the grid
-            if event.type == pygame.MOUSEBUTTONUP and dragging_plant:
-                mx, my = pygame.mouse.get_pos()
-                lane = my // LANE_HEIGHT
-                col = mx // CELL_WIDTH
-
-                if plant_type_dragged == "shovel":
-                    # Remove plant if shovel is used
-                    if 0 <= lane < LANE_COUNT and 0 <= col < GRID_COLUMNS and shooter_plants[lane][col]:
-                        shooter_plants[lane][col] = None
-                elif plant_type_dragged in plant_costs:  # Ensure it's a plant, not a shovel
-                    if coins >= plant_costs[plant_type_dragged]:  # Check if player has enough coins
-                        if 0 <= lane < LANE_COUNT and 0 <= col < GRID_COLUMNS and not shooter_plants[lane][col]:
-                            if plant_type_dragged == "normal_plant":
-                                shooter_plants[lane][col] = ShooterPlant(lane, col)
-                            elif plant_type_dragged == "freezing_plant":
-                                shooter_plants[lane][col] = FreezingPlant(lane, col)
-                            elif plant_type_dragged == "repeater":
-                                shooter_plants[lane][col] = Repeater(lane, col)
-                            elif plant_type_dragged == "wallnut":
-                                shooter_plants[lane][col] = Wallnut(lane, col)
-                            elif plant_type_dragged == "cherry_bomb":
-                                shooter_plants[lane][col] = CherryBomb(lane, col)
-
-                            # Deduct coins
-                            coins -= plant_costs[plant_type_dragged]
-                    else:
-                        font = pygame.font.Font(None, 36)
-                        warning_text = font.render("Not enough coins!", True, RED)
-                        screen.blit(warning_text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 50))
-
-                # Reset dragging state
-                dragging_plant = False
-                plant_type_dragged = None
-
-        # Draw the game elements
-        draw_background()
-
-        # Draw plant pool
-        draw_plant_pool()
-
-        # Draw wave, zombie, and coin information
-        draw_wave_info()
-
-        # Draw the dragged plant/tool following the mouse cursor
-        if dragging_plant:
-            mx, my = pygame.mouse.get_pos()
-            if plant_type_dragged == "normal_plant":
-                screen.blit(plant_image, (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))
-            elif plant_type_dragged == "freezing_plant":
-                screen.blit(freezing_plant_image, (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))
-            elif plant_type_dragged == "repeater":
-                screen.blit(repeater_image, (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))
-            elif plant_type_dragged == "wallnut":
-                screen.blit(wallnut_image, (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))
-            elif plant_type_dragged == "cherry_bomb":
-                screen.blit(cherry_bomb_image, (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))
-            elif plant_type_dragged == "shovel":
-                screen.blit(shovel_image, (mx - CELL_WIDTH // 2, my - LANE_HEIGHT // 2))
-
-        # Update and draw shooter plants
-        for lane in shooter_plants:
-            for plant in lane:
-                if plant:
-                    plant.auto_shoot()
-                    plant.draw()
-
-        # Update and draw bullets
-        for bullet in bullets[:]:
-            bullet.move()
-            bullet.draw()
-            if bullet.x > SCREEN_WIDTH:
-                bullets.remove(bullet)
-
-        # Update and draw zombies
-        for zombie in zombies[:]:
-            zombie.detect_plant()  # Check if there's a plant in front
-            zombie.move()          # Move or eat plant
-            zombie.draw()
-
-            # Check for collisions with bullets
-            for bullet in bullets[:]:
-                if zombie.x < bullet.x < zombie.x + CELL_WIDTH - 30 and zombie.y < bullet.y < zombie.y + LANE_HEIGHT - 20:
-                    if isinstance(bullet, IceBullet):
-                        zombie.frozen = True
-                        zombie.frozen_timer = 0
-                    else:
-                        zombie.health -= getattr(bullet, 'damage', 1)  # Default damage is 1
-                    bullets.remove(bullet)
-                    if zombie.health <= 0:
-                        coins += zombie.reward  # Add coins based on zombie reward
-                        zombies.remove(zombie)
-                        break
-
-        # Spawn new zombies
-        spawn_zombies()
-
-        # Check for wave completion
-        check_wave_completion()
+                quit_game()
+
+            # Toggle the profiling overlay
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.set_enabled(not profiler.enabled)
+
+            # Change the time scale
+            if event.type == pygame.KEYDOWN and pygame.K_1 <= event.key < pygame.K_1 + len(TIME_SCALES):
+                time_scale = TIME_SCALES[event.key - pygame.K_1]
+
+            handle_board_event(event, inputs)
+        profiler.lap("events")
+
+        # Advance the simulation by however many ticks are due
+        now = time.perf_counter()
+        frame_seconds = min(now - last_time, MAX_FRAME_SECONDS)
+        last_time = now
+
+        scroll_camera(frame_seconds)
+
+        events = []
+        ticks = 0
+        if time_scale is None:
+            # Uncapped: simulate until this frame's time budget is spent
+            deadline = now + 1 / RENDER_FPS
+            while not state.result and (ticks == 0 or time.perf_counter() < deadline):
+                events += advance(inputs)
+                inputs = []
+                ticks += 1
+            accumulator = 0.0
+            previous = None  # Many ticks per frame: draw the latest positions
+        else:
+            accumulator += frame_seconds * time_scale
+            while accumulator >= TICK_SECONDS and ticks < MAX_TICKS_PER_FRAME and not state.result:
+                previous = visible_positions(state)
+                events += advance(inputs)
+                inputs = []
+                accumulator -= TICK_SECONDS
+                ticks += 1
+            if ticks == MAX_TICKS_PER_FRAME:
+                accumulator = min(accumulator, TICK_SECONDS)  # Too far behind: drop the backlog
+        alpha = min(accumulator / TICK_SECONDS, 1.0)
+
+        # Sprites and text drawn on top of the board this frame
+        overlays = []
+
+        overlays += drag_overlays()
+
+        scale_label = "Uncapped" if time_scale is None else f"{time_scale}x"
+        overlays.append((text_cache.render("hud", f"Time: {scale_label}", BLACK), (1000, SCREEN_HEIGHT - 80)))
+
+        for event in events:
+            if event[0] == "not_enough_coins":
+                warning_text = text_cache.render("hud", "Not enough coins!", RED)
+                overlays.append((warning_text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 50)))
+
+        if state.result == "win":
+            print("You Win!")
+            quit_game()
 
         # Check for losing condition
-        if check_loss():
-            font = pygame.font.Font(None, 72)
-            text = font.render("You Lose!", True, RED)
-            screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 - 50))
-            pygame.display.flip()
+        if state.result == "lose":
+            text = text_cache.render("banner", "You Lose!", RED)
+            overlays.append((text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 - 50)))
+            render_frame(state, overlays)
             pygame.time.delay(3000)
-            pygame.quit()
-            sys.exit()
+            quit_game()
 
-        # Update the display
-        pygame.display.flip()
-        clock.tick(60)
+        # Draw the game elements and update the display
+        render_frame(state, overlays, previous, alpha)
+        clock.tick(RENDER_FPS)
+        profiler.lap("sleep")
+        if profiler.enabled:
+            plants = sum(1 for lane in state.plants for plant in lane if plant)
+            profiler.end_frame(zombies=state.zombie_count(), bullets=state.bullet_count(), plants=plants)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Plants Vs Monsters")
+    parser.add_argument("--engine", choices=ENGINES, default="objects",
+                        help="entity storage for the simulation (numpy needs NumPy installed)")
+    parser.add_argument("--seed", type=int, help="seed for zombie spawns (random if omitted)")
+    parser.add_argument("--endless", action="store_true", help="never-ending waves that keep getting harder")
+    parser.add_argument("--lanes", type=int, default=LANE_COUNT, help="board height in lanes")
+    parser.add_argument("--columns", type=int, default=GRID_COLUMNS, help="board width in columns")
+    parser.add_argument("--record", metavar="PATH", help="write a replay of this game to PATH")
+    parser.add_argument("--profile", action="store_true", help="start with the profiling overlay on (toggle with F3)")
+    parser.add_argument("--trace", metavar="PATH", help="profile the session and write a Chrome trace to PATH on exit")
+    parser.add_argument("--telemetry", metavar="PATH", help="write gameplay events (gzipped JSON lines) to PATH")
+    args = parser.parse_args()
+    main(
+        args.engine, args.seed, args.record, args.profile, args.trace, args.endless, args.lanes, args.columns,
+        args.telemetry,
+    )
@@ -0,0 +1,264 @@
+import base64
+import gzip
+import hashlib
+import json
+from collections import Counter
+
+import benchmark
+from balance import STRATEGIES, ScriptedStrategy
+from simulation import ENGINES, new_game, step
+from snapshot import BULLET_KINDS, PLANT_KINDS, ZOMBIE_KINDS, read_tables, restore_snapshot, take_snapshot
+from telemetry import COINS, EVENTS
+
+# Golden traces: a seeded scenario is played on the reference engine (the
+# object engine, which keeps the rules of the original game loop) and every
+# tick's state hash and events are recorded along with the inputs it got.
+# Any other engine, or the reference itself after a change, then replays the
+# same inputs and is checked tick by tick; the first tick that differs is
+# reported with the entities and events that differ on it.
+#
+# A tick's state is everything a snapshot holds about the game and its
+# entities, but not the order they are stored in: plants are keyed by cell,
+# zombies and bullets by uid. Its events are the step() events and the
+# telemetry events (shots, hits, freezes, kills, plants eaten, coins), each
+# sorted, as engines may resolve the hits of one tick in another order.
+#
+#   trace file  gzipped JSON lines: a header {"format", "scenario", "seed",
+#               "strategy", "ticks"}, then per tick {"tick", "inputs",
+#               "hash", "events"}, plus "keyframe" (a base64 compressed
+#               snapshot from before the tick's inputs) every KEYFRAME_TICKS
+#
+# The keyframes let the reference state of any tick be rebuilt for the diff
+# without replaying the whole game.
+
+FORMAT = 1
+REFERENCE = "objects"
+TRACE_TICKS = 6000  # 100 s of game time
+KEYFRAME_TICKS = 300
+MAX_DIFFS = 40  # Entity and event differences listed per divergence
+
+# Played with a scripted strategy from balance.py; the benchmark scenarios
+# bring their own setup and strategy, and a fixed seed
+GAME_SCENARIOS = ("waves", "endless")
+SCENARIOS = GAME_SCENARIOS + tuple(benchmark.SCENARIOS)
+EVENT_NAMES = tuple(EVENTS)
+
+
+def start_scenario(name, engine, seed=0, strategy="freeze_and_wall"):
+    if name in benchmark.SCENARIOS:
+        return benchmark.SCENARIOS[name](engine)
+    if name not in GAME_SCENARIOS:
+        raise ValueError(f"Unknown scenario {name!r}, expected one of {SCENARIOS}")
+    state = new_game(engine, seed=seed, endless=name == "endless")
+    return state, ScriptedStrategy(STRATEGIES[strategy])
+
+
+# Engine-independent view of a game: scalars, plants by cell ("lane,col";
+# plants off the grid that zombies are still eating get a "~n" suffix),
+# zombies and bullets by uid
+def state_view(state):
+    scalars, plants, zombies, bullets = read_tables(take_snapshot(state))
+    view = {"scalars": scalars, "plants": {}, "zombies": {}, "bullets": {}}
+    cells = []
+    for i, (kind, lane, col) in enumerate(zip(plants["kind"], plants["lane"], plants["col"])):
+        on_grid = plants["on_grid"][i]
+        cell = f"{lane},{col}" if on_grid else f"{lane},{col}~{i}"
+        cells.append(cell)
+        view["plants"][cell] = {
+            "kind": PLANT_KINDS[kind].__name__, "health": plants["health"][i], "ready_tick": plants["ready_tick"][i],
+        }
+    for i, uid in enumerate(zombies["uid"]):
+        zombie = {name: column[i] for name, column in zombies.items() if name not in ("kind", "uid", "eating")}
+        zombie["kind"] = ZOMBIE_KINDS[zombies["kind"][i]].__name__
+        zombie["eating"] = cells[zombies["eating"][i]] if zombies["eating"][i] >= 0 else None
+        view["zombies"][str(uid)] = zombie
+    for i, uid in enumerate(bullets["uid"]):
+        bullet = {name: column[i] for name, column in bullets.items() if name not in ("kind", "uid")}
+        bullet["kind"] = BULLET_KINDS[bullets["kind"][i]].__name__
+        view["bullets"][str(uid)] = bullet
+    return view
+
+
+def state_hash(view):
+    return hashlib.sha1(json.dumps(view, sort_keys=True).encode()).hexdigest()
+
+
+# step() events, then the telemetry events of the tick, each in sorted order.
+# A coin event's running balance depends on the order the tick's kills were
+# resolved in, so only its delta is kept (the balance after the tick is part
+# of the state).
+def tick_events(state, step_events):
+    events = sorted([list(event) for event in step_events], key=repr)
+    captured = []
+    for _, events_of_tick in state.telemetry.take():
+        for code, *fields in events_of_tick:
+            if code == COINS:
+                fields = fields[:1]
+            captured.append([EVENT_NAMES[code], *fields])
+    return events + sorted(captured, key=repr)
+
+
+# Golden Trace
+# The header and per-tick records of a reference run, in memory
+class GoldenTrace:
+    def __init__(self, header, ticks=None):
+        self.header = header
+        self.ticks = ticks or []  # Dicts as in the trace file
+
+    def save(self, path):
+        with gzip.open(path, "wt") as out:
+            out.write(json.dumps(self.header) + "\n")
+            for record in self.ticks:
+                out.write(json.dumps(record) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt") as lines:
+            header = json.loads(next(lines))
+            if header.get("format") != FORMAT:
+                raise ValueError(f"Unsupported trace format {header.get('format')}")
+            return cls(header, [json.loads(line) for line in lines])
+
+    def start(self, engine):
+        header = self.header
+        return start_scenario(header["scenario"], engine, header["seed"], header["strategy"])
+
+
+def record_trace(scenario, seed=0, strategy="freeze_and_wall", ticks=TRACE_TICKS, engine=REFERENCE):
+    trace = GoldenTrace({"format": FORMAT, "scenario": scenario, "seed": seed, "strategy": strategy, "ticks": ticks})
+    state, decide = trace.start(engine)
+    state.telemetry.capture()
+    while state.tick < ticks and not state.result:
+        record = {"tick": state.tick}
+        if state.tick % KEYFRAME_TICKS == 0 or not trace.ticks:
+            record["keyframe"] = base64.b64encode(take_snapshot(state, compress=True)).decode()
+        record["inputs"] = [list(action) for action in (decide(state) if decide else ())]
+        step_events = step(state, [tuple(action) for action in record["inputs"]])
+        record["hash"] = state_hash(state_view(state))
+        record["events"] = tick_events(state, step_events)
+        trace.ticks.append(record)
+    return trace
+
+
+# Replay the trace's inputs on `engine`. Returns None when every tick
+# matches, otherwise the first divergence as a dict: "tick", "state" (lines
+# describing the entity differences), "missing" and "extra" (events only the
+# reference or only the engine had), and "reference_changed" when the
+# reference rebuilt for the diff no longer matches the trace either.
+def check_trace(trace, engine):
+    state, _ = trace.start(engine)
+    state.telemetry.capture()
+    for index, record in enumerate(trace.ticks):
+        step_events = step(state, [tuple(action) for action in record["inputs"]])
+        view = state_view(state)
+        events = tick_events(state, step_events)
+        if state_hash(view) != record["hash"] or events != record["events"]:
+            return _divergence(trace, index, view, events)
+    return None
+
+
+def _divergence(trace, index, view, events):
+    record = trace.ticks[index]
+    first = max(i for i in range(index + 1) if "keyframe" in trace.ticks[i])
+    reference = restore_snapshot(base64.b64decode(trace.ticks[first]["keyframe"]), REFERENCE)
+    for replayed in trace.ticks[first:index + 1]:
+        step(reference, [tuple(action) for action in replayed["inputs"]])
+    reference_view = state_view(reference)
+    recorded, got = Counter(map(repr, record["events"])), Counter(map(repr, events))
+    return {
+        "tick": record["tick"],
+        "state": diff_views(reference_view, view),
+        "missing": sorted((recorded - got).elements()),
+        "extra": sorted((got - recorded).elements()),
+        "reference_changed": state_hash(reference_view) != record["hash"],
+    }
+
+
+# Lines describing how `view` differs from `reference`, as "what: reference != view"
+def diff_views(reference, view):
+    lines = [
+        f"{name}: {value!r} != {view['scalars'][name]!r}"
+        for name, value in reference["scalars"].items()
+        if view["scalars"][name] != value
+    ]
+    for group in ("plants", "zombies", "bullets"):
+        expected, actual = reference[group], view[group]
+        for key in sorted(expected.keys() | actual.keys(), key=_entity_order):
+            name = f"{group[:-1]} {key}"
+            if key not in actual:
+                lines.append(f"{name} ({expected[key]['kind']}): only in reference {expected[key]}")
+            elif key not in expected:
+                lines.append(f"{name} ({actual[key]['kind']}): only in engine {actual[key]}")
+            else:
+                lines.extend(
+                    f"{name} ({expected[key]['kind']}) {field}: {value!r} != {actual[key][field]!r}"
+                    for field, value in expected[key].items()
+                    if actual[key][field] != value
+                )
+    return lines
+
+
+def _entity_order(key):
+    # uids numerically, cells by lane and column
+    return [int(part) for part in key.replace("~", ",").split(",")]
+
+
+def print_divergence(engine, divergence):
+    print(f"{engine}: diverges at tick {divergence['tick']}")
+    if divergence["reference_changed"]:
+        print("  (the reference engine no longer reproduces the trace either; diff is against its current state)")
+    for line in divergence["state"][:MAX_DIFFS]:
+        print(f"  {line}")
+    for label in ("missing", "extra"):
+        for event in divergence[label][:MAX_DIFFS]:
+            print(f"  {label} event {event}")
+    hidden = sum(max(len(divergence[key]) - MAX_DIFFS, 0) for key in ("state", "missing", "extra"))
+    if hidden:
+        print(f"  ... and {hidden} more")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Record golden traces on the reference engine and check engines against them"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="play a scenario on the reference engine and save its trace")
+    record.add_argument("path")
+    check = commands.add_parser("check", help="replay a trace (or a fresh reference run) on other engines")
+    check.add_argument("path", nargs="?", help="stored trace (default: record one now with the options below)")
+    check.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to check (default: all but the reference, or all of them for a stored trace)")
+    for command in (record, check):
+        command.add_argument("--scenario", choices=SCENARIOS, default="waves")
+        command.add_argument("--seed", type=int, default=0, help="seed of the waves and endless scenarios")
+        command.add_argument("--strategy", choices=STRATEGIES, default="freeze_and_wall")
+        command.add_argument("--ticks", type=int, default=TRACE_TICKS)
+    args = parser.parse_args()
+
+    if args.command == "record" or not args.path:
+        start = time.perf_counter()
+        trace = record_trace(args.scenario, args.seed, args.strategy, args.ticks)
+        elapsed = time.perf_counter() - start
+        print(f"recorded {len(trace.ticks)} ticks of {args.scenario} on {REFERENCE} ({elapsed:.1f} s)")
+        if args.command == "record":
+            trace.save(args.path)
+            sys.exit()
+        engines = args.engine or [engine for engine in ENGINES if engine != REFERENCE]
+    else:
+        trace = GoldenTrace.load(args.path)
+        engines = args.engine or list(ENGINES)
+
+    diverged = False
+    for engine in engines:
+        start = time.perf_counter()
+        divergence = check_trace(trace, engine)
+        if divergence is None:
+            print(f"{engine}: identical over {len(trace.ticks)} ticks ({time.perf_counter() - start:.1f} s)")
+        else:
+            print_divergence(engine, divergence)
+            diverged = True
+    sys.exit(1 if diverged else 0)
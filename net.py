@@ -0,0 +1,548 @@
+import asyncio
+import json
+import struct
+import time
+from array import array
+
+from simulation import (
+    CELL_WIDTH,
+    ENGINES,
+    LANE_HEIGHT,
+    PLACE,
+    RESULTS,
+    SHOVEL,
+    TICK_RATE,
+    bullet_classes,
+    new_game,
+    plant_classes,
+    plant_code,
+    step,
+    zombie_classes,
+)
+from replay import PLANT_TYPES
+
+# Network play: a GameServer runs the simulation authoritatively and streams
+# every tick to any number of TCP clients, which mirror it in a RemoteGame
+# that the renderer can draw like a local game.
+#
+# Frames are a u32 length, then a u8 type and the body:
+#   HELLO   server -> client, JSON {"version", "lanes", "columns", "role"}
+#   STATE   server -> client, one tick of changes (below)
+#   ACTION  client -> server, u8 code, u16 lane, u16 col (codes as in replay.py);
+#           only accepted from players. Any other or malformed frame from a
+#           client closes its connection.
+#
+# STATE bodies are deltas. Zombies and bullets are dead-reckoned: client and
+# server both move every entity by its last known velocity each tick, and an
+# entity is only sent when it spawns or drifts more than TOLERANCE pixels
+# from that prediction (it stopped to eat, froze, or walked on again):
+#   scalars   tick, coins, current_wave, zombies left, speed_multiplier, result
+#   plants    u32 count, then columns lane u16, col u16, kind u8 (0 = empty,
+#             1 + type id) for the cells that changed
+#   zombies   u32 count, then columns uid, kind (type id), x, y, velocity, frozen
+#   bullets   u32 count, then columns uid, kind (type id), x, y, velocity
+#   gone      u32 count, then uid column of zombies and bullets that left
+# A client joining mid-game gets one STATE with everything as spawned.
+
+VERSION = 1
+PORT = 8765
+
+HELLO = 1
+STATE = 2
+ACTION = 3
+
+TOLERANCE = 0.01  # Pixels a dead-reckoned position may be off before it is corrected
+MAX_CLIENT_BUFFER = 1 << 20  # Clients more than this many unsent bytes behind are dropped
+MAX_LAG_SECONDS = 0.25  # Server ticks further behind than this are skipped, not caught up
+MAX_FRAME_LENGTH = 1 << 26  # Longest frame a client accepts from the server
+
+FRAME = struct.Struct("<IB")
+SCALARS = struct.Struct("<qqiqdB")
+ACTION_FORMAT = struct.Struct("<BHH")
+ACTION_FRAME_LENGTH = 1 + ACTION_FORMAT.size  # The only frame a server accepts
+
+# Kinds on the wire: plant codes (simulation.plant_code), zombie and bullet type ids
+PLANT_KINDS = (type(None),) + tuple(plant_classes.values())
+ZOMBIE_KINDS = tuple(zombie_classes.values())
+BULLET_KINDS = tuple(bullet_classes.values())
+
+PLANT_COLUMNS = "HHB"
+ZOMBIE_COLUMNS = "qBdddB"
+BULLET_COLUMNS = "qBddd"
+GONE_COLUMNS = "q"
+
+
+def frame(frame_type, body=b""):
+    return FRAME.pack(len(body) + 1, frame_type) + body
+
+
+# The length is checked before the body is read, so a bad header cannot make
+# the reader buffer more than max_length bytes
+async def read_frame(reader, max_length=MAX_FRAME_LENGTH):
+    length, frame_type = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if not 1 <= length <= max_length:
+        raise ValueError(f"Frame length {length} outside 1..{max_length}")
+    return frame_type, await reader.readexactly(length - 1)
+
+
+def encode_action(action):
+    if action[0] == SHOVEL:
+        return ACTION_FORMAT.pack(0, action[1], action[2])
+    return ACTION_FORMAT.pack(1 + PLANT_TYPES.index(action[1]), action[2], action[3])
+
+
+def decode_action(body):
+    if len(body) != ACTION_FORMAT.size:
+        raise ValueError(f"Action body of {len(body)} bytes, expected {ACTION_FORMAT.size}")
+    code, lane, col = ACTION_FORMAT.unpack(body)
+    if code > len(PLANT_TYPES):
+        raise ValueError(f"Unknown action code {code}")
+    if code == 0:
+        return SHOVEL, lane, col
+    return PLACE, PLANT_TYPES[code - 1], lane, col
+
+
+def _pack_rows(out, typecodes, rows):
+    out.append(struct.pack("<I", len(rows)))
+    for typecode, column in zip(typecodes, zip(*rows)):
+        out.append(array(typecode, column).tobytes())
+
+
+def _unpack_rows(data, pos, typecodes):
+    (count,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    columns = []
+    for typecode in typecodes:
+        column = array(typecode)
+        end = pos + count * column.itemsize
+        column.frombytes(data[pos:end])
+        columns.append(column)
+        pos = end
+    return list(zip(*columns)) if count else [], pos
+
+
+# Delta Encoder
+# Holds what every client currently believes: plant kinds per cell and
+# [kind, x, y, velocity, frozen, actual x] per zombie and bullet uid.
+class DeltaEncoder:
+    def __init__(self, state):
+        self.plants = [[0] * state.columns for _ in range(state.lane_count)]
+        self.zombies = {}
+        self.bullets = {}
+        self.scalars = self._scalars(state)
+
+    def _scalars(self, state):
+        return SCALARS.pack(
+            state.tick, state.coins, state.current_wave, state.zombies_left(), state.speed_multiplier,
+            RESULTS.index(state.result),
+        )
+
+    # Changes since the last call, as a STATE body
+    def encode(self, state):
+        self.scalars = self._scalars(state)
+        body = [self.scalars]
+
+        plants = []
+        for lane, (row, known) in enumerate(zip(state.plants, self.plants)):
+            for col, plant in enumerate(row):
+                kind = plant_code(plant)
+                if kind != known[col]:
+                    known[col] = kind
+                    plants.append((lane, col, kind))
+        _pack_rows(body, PLANT_COLUMNS, plants)
+
+        gone = []
+        zombies = self._track(
+            self.zombies, ((cls.type_id, uid, x, y, bool(frozen)) for cls, uid, x, y, frozen in state.zombie_views()), gone
+        )
+        bullets = self._track(
+            self.bullets, ((cls.type_id, uid, x, y, False) for cls, uid, x, y in state.bullet_views()), gone
+        )
+        _pack_rows(body, ZOMBIE_COLUMNS, zombies)
+        _pack_rows(body, BULLET_COLUMNS, [row[:5] for row in bullets])
+        _pack_rows(body, GONE_COLUMNS, [(uid,) for uid in gone])
+        return b"".join(body)
+
+    # Advance the dead-reckoned entities and return the rows that must be
+    # sent; uids no longer in `views` are added to `gone`
+    def _track(self, known, views, gone):
+        rows = []
+        seen = set()
+        for kind, uid, x, y, frozen in views:
+            seen.add(uid)
+            entry = known.get(uid)
+            if entry is None:
+                entry = known[uid] = [kind, x, y, 0.0, frozen, x]
+                rows.append((uid, kind, x, y, 0.0, frozen))
+                continue
+            predicted = entry[1] + entry[3]
+            if abs(predicted - x) > TOLERANCE or frozen != entry[4]:
+                entry[1], entry[3], entry[4] = x, x - entry[5], frozen
+                rows.append((uid, kind, x, y, entry[3], frozen))
+            else:
+                entry[1] = predicted
+            entry[5] = x
+        if len(seen) < len(known):
+            for uid in [uid for uid in known if uid not in seen]:
+                del known[uid]
+                gone.append(uid)
+        return rows
+
+    # Everything clients believe right now, as a STATE body for a client that just joined
+    def full(self):
+        body = [self.scalars]
+        plants = [
+            (lane, col, kind) for lane, row in enumerate(self.plants) for col, kind in enumerate(row) if kind
+        ]
+        _pack_rows(body, PLANT_COLUMNS, plants)
+        _pack_rows(body, ZOMBIE_COLUMNS, [(uid, kind, x, y, vx, frozen) for uid, (kind, x, y, vx, frozen, _) in self.zombies.items()])
+        _pack_rows(body, BULLET_COLUMNS, [(uid, kind, x, y, vx) for uid, (kind, x, y, vx, _, _) in self.bullets.items()])
+        _pack_rows(body, GONE_COLUMNS, [])
+        return b"".join(body)
+
+
+# Remote Game
+# Client-side mirror of a served game. It has the read-only part of the
+# GameState API that the renderer uses, so game.render_frame() draws it.
+class RemoteGame:
+    engine = "remote"
+
+    def __init__(self, lane_count, columns):
+        self.lane_count = lane_count
+        self.columns = columns
+        self.width = columns * CELL_WIDTH
+        self.plants = [[None] * columns for _ in range(lane_count)]
+        self.zombies = {}  # uid -> [class, x, y, velocity, frozen], in spawn order
+        self.bullets = {}  # uid -> [class, x, y, velocity]
+        self.tick = 0
+        self.coins = 0
+        self.current_wave = 0
+        self.remaining = 0
+        self.speed_multiplier = 1.0
+        self.result = None
+
+    def apply(self, body):
+        (self.tick, self.coins, self.current_wave, self.remaining, self.speed_multiplier,
+         result) = SCALARS.unpack_from(body, 0)
+        self.result = RESULTS[result]
+        for entity in self.zombies.values():
+            entity[1] += entity[3]
+        for entity in self.bullets.values():
+            entity[1] += entity[3]
+
+        plants, pos = _unpack_rows(body, SCALARS.size, PLANT_COLUMNS)
+        for lane, col, kind in plants:
+            self.plants[lane][col] = PLANT_KINDS[kind](lane, col) if kind else None
+        zombies, pos = _unpack_rows(body, pos, ZOMBIE_COLUMNS)
+        for uid, kind, x, y, vx, frozen in zombies:
+            self.zombies[uid] = [ZOMBIE_KINDS[kind], x, y, vx, bool(frozen)]
+        bullets, pos = _unpack_rows(body, pos, BULLET_COLUMNS)
+        for uid, kind, x, y, vx in bullets:
+            self.bullets[uid] = [BULLET_KINDS[kind], x, y, vx]
+        gone, pos = _unpack_rows(body, pos, GONE_COLUMNS)
+        for (uid,) in gone:
+            if self.zombies.pop(uid, None) is None:
+                del self.bullets[uid]
+
+    def zombies_left(self):
+        return self.remaining
+
+    def zombie_count(self):
+        return len(self.zombies)
+
+    def bullet_count(self):
+        return len(self.bullets)
+
+    def _in(self, entities, area):
+        if area is None:
+            return entities.items()
+        first, end, left, right = area
+        top, bottom = first * LANE_HEIGHT, end * LANE_HEIGHT
+        return [
+            (uid, entity) for uid, entity in entities.items()
+            if top <= entity[2] < bottom and left <= entity[1] < right
+        ]
+
+    def zombie_views(self, area=None):
+        for uid, (cls, x, y, _, frozen) in self._in(self.zombies, area):
+            yield cls, uid, x, y, frozen
+
+    def bullet_views(self, area=None):
+        for uid, (cls, x, y, _) in self._in(self.bullets, area):
+            yield cls, uid, x, y
+
+    def entity_positions(self, area=None):
+        positions = {uid: entity[1] for uid, entity in self._in(self.zombies, area)}
+        positions.update((uid, entity[1]) for uid, entity in self._in(self.bullets, area))
+        return positions
+
+
+class _Client:
+    def __init__(self, writer, role):
+        self.writer = writer
+        self.role = role
+
+
+# Game Server
+# One tick loop steps the game at TICK_RATE, encodes the tick once and writes
+# the same bytes to every client without waiting for any of them. A client
+# whose unsent backlog passes max_buffer is disconnected rather than allowed
+# to slow the loop. The first `players` clients may send actions.
+class GameServer:
+    def __init__(self, state, players=0, max_buffer=MAX_CLIENT_BUFFER):
+        self.state = state
+        self.players = players
+        self.max_buffer = max_buffer
+        self.encoder = DeltaEncoder(state)
+        self.clients = []
+        self.inputs = []  # Player actions for the next tick
+        self.server = None
+        self.dropped = 0       # Clients disconnected for falling behind
+        self.late_ticks = 0    # Ticks that started after their due time
+        self.busiest = 0.0     # Longest step + encode + broadcast, in seconds
+        self.bytes_sent = 0    # Per client, for a client connected from the start
+
+    async def start(self, host="127.0.0.1", port=PORT):
+        self.server = await asyncio.start_server(self._serve_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _serve_client(self, reader, writer):
+        players = sum(1 for client in self.clients if client.role == "player")
+        client = _Client(writer, "player" if players < self.players else "spectator")
+        hello = {"version": VERSION, "lanes": self.state.lane_count, "columns": self.state.columns, "role": client.role}
+        writer.write(frame(HELLO, json.dumps(hello).encode()))
+        writer.write(frame(STATE, self.encoder.full()))
+        self.clients.append(client)
+        try:
+            while True:
+                frame_type, body = await read_frame(reader, ACTION_FRAME_LENGTH)
+                if frame_type != ACTION:
+                    raise ValueError(f"Unexpected frame type {frame_type} from a client")
+                action = decode_action(body)
+                if client.role == "player":
+                    self.inputs.append(action)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Disconnected, or sent a malformed frame: the connection is closed below
+        finally:
+            self._disconnect(client)
+
+    def _disconnect(self, client, abort=False):
+        if client in self.clients:
+            self.clients.remove(client)
+            if abort:
+                client.writer.transport.abort()
+            else:
+                client.writer.close()
+
+    def broadcast(self, data):
+        self.bytes_sent += len(data)
+        for client in list(self.clients):
+            if client.writer.is_closing():
+                self._disconnect(client)
+                continue
+            client.writer.write(data)
+            if client.writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.dropped += 1
+                self._disconnect(client, abort=True)
+
+    # Play until the game ends or `ticks` ticks have run
+    async def run(self, ticks=None):
+        loop = asyncio.get_running_loop()
+        state = self.state
+        due = loop.time()
+        while not state.result and (ticks is None or state.tick < ticks):
+            start = time.perf_counter()
+            inputs, self.inputs = self.inputs, []
+            step(state, inputs)
+            self.broadcast(frame(STATE, self.encoder.encode(state)))
+            self.busiest = max(self.busiest, time.perf_counter() - start)
+
+            due += 1 / TICK_RATE
+            delay = due - loop.time()
+            if delay < 0:
+                self.late_ticks += 1
+                if delay < -MAX_LAG_SECONDS:
+                    due = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    async def close(self):
+        for client in list(self.clients):
+            self._disconnect(client)
+        self.server.close()
+        await self.server.wait_closed()
+
+
+# Connect to a server; returns (reader, writer, hello, mirror)
+async def connect(host, port=PORT):
+    reader, writer = await asyncio.open_connection(host, port)
+    frame_type, body = await read_frame(reader)
+    if frame_type != HELLO:
+        raise ConnectionError("Not a game server")
+    hello = json.loads(body)
+    if hello["version"] != VERSION:
+        raise ConnectionError(f"Unsupported protocol version {hello['version']}")
+    return reader, writer, hello, RemoteGame(hello["lanes"], hello["columns"])
+
+
+# Keep `remote` up to date until the server closes the connection
+async def follow(reader, remote):
+    try:
+        while True:
+            frame_type, body = await read_frame(reader)
+            if frame_type == STATE:
+                remote.apply(body)
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+
+
+# Thin client: draws the served game with the local renderer. Players drag
+# plants onto the board as usual and their drops are sent to the server.
+async def watch(host, port=PORT):
+    import pygame
+
+    import game
+
+    reader, writer, hello, remote = await connect(host, port)
+    receiving = asyncio.create_task(follow(reader, remote))
+    game.init_display()
+    game.build_static_layers()
+    game.ensure_camera(remote)
+    last_time = time.perf_counter()
+    while not receiving.done():
+        inputs = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                receiving.cancel()
+            game.handle_board_event(event, inputs)
+        if hello["role"] == "player":
+            for action in inputs:
+                writer.write(frame(ACTION, encode_action(action)))
+
+        now = time.perf_counter()
+        game.scroll_camera(now - last_time)
+        last_time = now
+        overlays = game.drag_overlays()
+        label = f"{hello['role'].capitalize()}, tick {remote.tick}"
+        overlays.append((game.text_cache.render("hud", label, game.BLACK), (1000, game.SCREEN_HEIGHT - 80)))
+        if remote.result:
+            banner = game.text_cache.render("banner", f"You {remote.result.capitalize()}!", game.RED)
+            overlays.append((banner, (game.SCREEN_WIDTH // 2 - 100, game.SCREEN_HEIGHT // 2 - 50)))
+        game.render_frame(remote, overlays)
+        await asyncio.sleep(1 / game.RENDER_FPS)
+    writer.close()
+    pygame.quit()
+
+
+# Differences between a mirror and the served game; empty when they match
+def mirror_errors(remote, state):
+    errors = []
+    for lane, (row, remote_row) in enumerate(zip(state.plants, remote.plants)):
+        for col, (plant, remote_plant) in enumerate(zip(row, remote_row)):
+            if type(plant) is not type(remote_plant):
+                errors.append(f"plant at ({lane}, {col}): {type(remote_plant).__name__}, served {type(plant).__name__}")
+    for name, served, mirrored in (
+        ("zombie", state.zombie_views(), remote.zombie_views()),
+        ("bullet", state.bullet_views(), remote.bullet_views()),
+    ):
+        served = {view[1]: view for view in served}
+        mirrored = {view[1]: view for view in mirrored}
+        if served.keys() != mirrored.keys():
+            errors.append(f"{name} uids differ: {len(served.keys() - mirrored.keys())} missing, "
+                          f"{len(mirrored.keys() - served.keys())} extra")
+        for uid in served.keys() & mirrored.keys():
+            (cls, _, x, y, *frozen), (remote_cls, _, remote_x, remote_y, *remote_frozen) = served[uid], mirrored[uid]
+            if cls is not remote_cls or abs(x - remote_x) > TOLERANCE or y != remote_y or frozen != remote_frozen:
+                errors.append(f"{name} {uid}: {mirrored[uid]}, served {served[uid]}")
+    served = (state.tick, state.coins, state.current_wave, state.zombies_left(), state.result)
+    mirrored = (remote.tick, remote.coins, remote.current_wave, remote.zombies_left(), remote.result)
+    if served != mirrored:
+        errors.append(f"scalars {mirrored}, served {served}")
+    return errors
+
+
+# Serve a game on loopback to `spectators` clients for `seconds`. Up to
+# `mirrors` of them decode the stream and are compared with the game at the
+# end; the rest only read it.
+async def loopback(engine="objects", seed=0, spectators=100, mirrors=2, seconds=10.0, endless=False):
+    state = new_game(engine, seed=seed, endless=endless)
+    server = GameServer(state)
+    port = await server.start(port=0)
+
+    async def drain(reader):
+        try:
+            while True:
+                await read_frame(reader)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+
+    remotes, tasks, writers = [], [], []  # Writers are kept: dropping one closes its connection
+    for i in range(spectators):
+        reader, writer, _, remote = await connect("127.0.0.1", port)
+        writers.append(writer)
+        if i < mirrors:
+            remotes.append(remote)
+            tasks.append(asyncio.create_task(follow(reader, remote)))
+        else:
+            tasks.append(asyncio.create_task(drain(reader)))
+
+    start = time.perf_counter()
+    await server.run(ticks=state.tick + int(seconds * TICK_RATE))
+    elapsed = time.perf_counter() - start
+    await server.close()
+    await asyncio.gather(*tasks)
+    return {
+        "ticks": state.tick,
+        "ticks_per_sec": state.tick / elapsed,
+        "late_ticks": server.late_ticks,
+        "busiest_ms": server.busiest * 1000,
+        "bytes_per_tick": server.bytes_sent / max(state.tick, 1),
+        "dropped": server.dropped,
+        "zombies": state.zombie_count(),
+        "errors": [error for remote in remotes for error in mirror_errors(remote, state)],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve, watch or loopback-test networked games")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run a game and stream it to clients")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=PORT)
+    serve.add_argument("--engine", choices=ENGINES, default="objects")
+    serve.add_argument("--seed", type=int)
+    serve.add_argument("--endless", action="store_true")
+    serve.add_argument("--players", type=int, default=1, help="clients (first come) allowed to place plants")
+    client = commands.add_parser("watch", help="connect to a server and draw its game")
+    client.add_argument("host")
+    client.add_argument("--port", type=int, default=PORT)
+    test = commands.add_parser("loopback", help="serve to many local spectators and check the mirrors")
+    test.add_argument("--engine", choices=ENGINES, default="objects")
+    test.add_argument("--seed", type=int, default=0)
+    test.add_argument("--spectators", type=int, default=100)
+    test.add_argument("--mirrors", type=int, default=2, help="spectators that decode the stream")
+    test.add_argument("--seconds", type=float, default=10.0)
+    test.add_argument("--endless", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        async def serve_game():
+            server = GameServer(new_game(args.engine, seed=args.seed, endless=args.endless), players=args.players)
+            port = await server.start(args.host, args.port)
+            print(f"Serving on port {port}")
+            await server.run()
+            await server.close()
+        asyncio.run(serve_game())
+    elif args.command == "watch":
+        asyncio.run(watch(args.host, args.port))
+    else:
+        report = asyncio.run(loopback(
+            args.engine, args.seed, args.spectators, args.mirrors, args.seconds, args.endless
+        ))
+        print(f"{report['ticks']} ticks at {report['ticks_per_sec']:.1f}/s to {args.spectators} spectators: "
+              f"{report['late_ticks']} late, busiest {report['busiest_ms']:.2f} ms, "
+              f"{report['bytes_per_tick']:.0f} B/tick, {report['dropped']} dropped, {report['zombies']} zombies")
+        for error in report["errors"][:20]:
+            print("  mismatch:", error)
+        print("mirrors match" if not report["errors"] else f"{len(report['errors'])} mismatches")
@@ -0,0 +1,135 @@
+import random
+import time
+
+from simulation import CELL_WIDTH, LANE_HEIGHT, PLACE, TICK_RATE, plant_classes, step
+
+# Monte Carlo lookahead bot. Every decision it lists a handful of candidate
+# moves (do nothing, or one placement), forks the game once per candidate and
+# rollout, plays each fork ahead HORIZON_TICKS with no further moves, and
+# makes the move whose forks end up with the best average value. Each rollout
+# round reseeds the spawn RNG of all its forks the same way, so candidates are
+# compared on the same futures. Rounds continue until the time budget is
+# spent; the first round always completes.
+
+DECISION_INTERVAL = TICK_RATE // 2  # Decide twice a second, like the scripted strategies
+HORIZON_TICKS = 5 * TICK_RATE       # How far each rollout looks ahead
+BUDGET_SECONDS = 0.1                # Thinking time per decision
+
+LOSE_PENALTY = 100000  # Value of a lost game (less the ticks it lasted)
+WIN_BONUS = 100000
+THREAT = 50            # Value lost per zombie, scaled by how far it has walked in
+
+SHOOTERS = ("normal_plant", "freezing_plant", "repeater")
+PLANT_NAMES = tuple(plant_classes)  # Type id -> name
+
+
+# Value of a game position: coins in hand and on the board (plants at cost),
+# minus the zombies walking in
+def evaluate(state):
+    if state.result == "lose":
+        return -LOSE_PENALTY + state.tick
+    value = state.coins
+    if state.result == "win":
+        value += WIN_BONUS
+    for row in state.plants:
+        for plant in row:
+            if plant:
+                value += state.plant_costs[PLANT_NAMES[plant.type_id]]
+    for _, _, x, _, _ in state.zombie_views():
+        value -= THREAT * (1 - x / state.width)
+    return value
+
+
+# Moves worth trying: nothing; a shooter in each lane's first free column;
+# a Wallnut or CherryBomb just in front of each lane's leading zombie
+def candidate_moves(state):
+    moves = [()]
+    affordable = [name for name, cost in state.plant_costs.items() if cost <= state.coins]
+    leading = {}
+    for _, _, x, y, _ in state.zombie_views():
+        lane = int(y // LANE_HEIGHT)
+        leading[lane] = min(x, leading.get(lane, x))
+
+    for lane, row in enumerate(state.plants):
+        free = next((col for col, plant in enumerate(row) if not plant), None)
+        if free is not None:
+            moves += [((PLACE, name, lane, free),) for name in SHOOTERS if name in affordable]
+        if lane in leading:
+            col = min(int(leading[lane] // CELL_WIDTH) - 1, state.columns - 1)
+            if 0 <= col and not row[col]:
+                moves += [((PLACE, name, lane, col),) for name in ("wallnut", "cherry_bomb") if name in affordable]
+    return moves
+
+
+# Lookahead Bot
+# A strategy callable like balance.ScriptedStrategy: call it every tick with
+# the game and feed what it returns to step().
+class LookaheadBot:
+    def __init__(
+        self, budget=BUDGET_SECONDS, horizon=HORIZON_TICKS, interval=DECISION_INTERVAL, rounds=None, seed=None,
+    ):
+        self.budget = budget
+        self.horizon = horizon
+        self.interval = interval
+        self.rounds = rounds  # Fixed rollout rounds per decision instead of the time budget
+        self.rng = random.Random(seed)
+        self.decisions = 0
+        self.rollouts = 0
+
+    def __call__(self, state):
+        if state.tick % self.interval or state.result:
+            return ()
+        return self.decide(state)
+
+    def decide(self, state):
+        deadline = time.perf_counter() + self.budget
+        moves = candidate_moves(state)
+        self.decisions += 1
+        if len(moves) == 1:
+            return ()
+        totals = [0.0] * len(moves)
+        rounds = 0
+        while self.rounds is None or rounds < self.rounds:
+            seed = self.rng.getrandbits(64)
+            values = []
+            for move in moves:
+                if rounds and self.rounds is None and time.perf_counter() > deadline:
+                    break  # Out of time: this round is incomplete, so drop it
+                values.append(self.rollout(state, move, seed))
+            if len(values) < len(moves):
+                break
+            totals = [total + value for total, value in zip(totals, values)]
+            rounds += 1
+            if self.rounds is None and time.perf_counter() > deadline:
+                break
+        self.rollouts += rounds * len(moves)
+        best = max(range(len(moves)), key=totals.__getitem__)  # Ties go to the earlier move, doing nothing first
+        return list(moves[best])
+
+    def rollout(self, state, move, seed):
+        game = state.fork()
+        game.rng.seed(seed)
+        step(game, move)
+        end = game.tick + self.horizon
+        while game.tick < end and not game.result:
+            step(game)
+        return evaluate(game)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from simulation import new_game, run
+
+    # Play one game with the bot and report how it went
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    engine = sys.argv[2] if len(sys.argv) > 2 else "analytic"
+    budget = float(sys.argv[3]) if len(sys.argv) > 3 else BUDGET_SECONDS
+    state = new_game(engine, seed=seed)
+    bot = LookaheadBot(budget=budget, seed=seed)
+    start = time.perf_counter()
+    run(state, max_ticks=10 * 60 * TICK_RATE, strategy=bot)
+    elapsed = time.perf_counter() - start
+    plants = sum(1 for row in state.plants for plant in row if plant)
+    print(f"result={state.result} ticks={state.tick} wave={state.current_wave} coins={state.coins} plants={plants} "
+          f"({bot.decisions} decisions, {bot.rollouts / max(bot.decisions, 1):.0f} rollouts each, {elapsed:.0f} s)")
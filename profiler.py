@@ -0,0 +1,96 @@
+import json
+import os
+import time
+from collections import deque
+
+# Per-phase profiler. Code marks the end of each phase with lap(name); the time
+# since the previous lap (or resume()) is charged to that phase. While the
+# profiler is disabled a lap is a single attribute check, so the hooks stay in
+# place permanently and profiling is switched on and off at runtime.
+
+PHASE_WINDOW = 300  # Frames kept for the rolling percentiles (5 s at 60 FPS)
+MAX_TRACE_EVENTS = 1_000_000  # Trace recording stops here (about 100 MB of JSON)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+# Profiler
+class Profiler:
+    def __init__(self, window=PHASE_WINDOW):
+        self.enabled = False
+        self.window = window
+        self.history = {}  # Phase -> per-frame seconds, newest last
+        self.frame = {}    # Phase -> seconds spent so far this frame
+        self.counts = {}   # Entity counts reported with the last frame
+        self.last = self.frame_start = 0.0
+        self.trace = None  # Trace events while a Chrome trace is being recorded
+        self.origin = time.perf_counter()
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.frame = {}
+        self.last = self.frame_start = time.perf_counter()
+
+    def start_trace(self):
+        self.trace = []
+        self.set_enabled(True)
+
+    # Start timing from now; time since the last lap is not charged to anything
+    def resume(self):
+        if self.enabled:
+            self.last = time.perf_counter()
+
+    def lap(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        duration = now - self.last
+        self.frame[name] = self.frame.get(name, 0.0) + duration
+        if self.trace is not None and len(self.trace) < MAX_TRACE_EVENTS:
+            self.trace.append(("X", name, self.last, duration))
+        self.last = now
+
+    # Close the current frame: its phase totals join the rolling window
+    def end_frame(self, **counts):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame["frame"] = now - self.frame_start
+        for name in self.history.keys() - self.frame.keys():
+            self.frame[name] = 0.0  # Phase did not run this frame (e.g. no tick was due)
+        for name, seconds in self.frame.items():
+            history = self.history.get(name)
+            if history is None:
+                history = self.history[name] = deque(maxlen=self.window)
+            history.append(seconds)
+        if self.trace is not None and len(self.trace) < MAX_TRACE_EVENTS:
+            self.trace.append(("X", "frame", self.frame_start, now - self.frame_start))
+            if counts:
+                self.trace.append(("C", "entities", now, counts))
+        self.counts = counts
+        self.frame = {}
+        self.frame_start = self.last = now
+
+    # Phase -> (p50, p99) in seconds over the rolling window
+    def stats(self):
+        stats = {}
+        for name, history in self.history.items():
+            values = sorted(history)
+            stats[name] = (percentile(values, 0.50), percentile(values, 0.99))
+        return stats
+
+    # Write the recorded trace in Chrome trace-event format (chrome://tracing, Perfetto)
+    def write_trace(self, path):
+        pid = os.getpid()
+        events = []
+        for kind, name, start, value in self.trace or ():
+            event = {"name": name, "ph": kind, "ts": (start - self.origin) * 1e6, "pid": pid, "tid": 0}
+            if kind == "X":
+                event["dur"] = value * 1e6
+            else:
+                event["args"] = value
+            events.append(event)
+        with open(path, "w") as out:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, out)
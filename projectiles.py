@@ -0,0 +1,208 @@
+from bisect import bisect_left, bisect_right
+from heapq import heappop, heappush
+
+from simulation import CELL_WIDTH, GRID_COLUMNS, LANE_COUNT, GameState, fork_copy
+from units import BULLET_FREEZES
+
+# Analytic projectiles: a fired bullet is never stepped. Its position is a
+# function of the tick (x at firing + speed per tick), so when it is fired
+# the earliest tick it could reach any zombie in its lane is computed and
+# queued, and nothing happens for that bullet until then. At that tick the
+# real positions are checked: a zombie overlapping the bullet is hit exactly
+# as the stepped model would hit it; otherwise (the zombie stopped to eat,
+# froze, or died) the impact is re-resolved from where everything is now.
+#
+# Each bound assumes every zombie keeps walking at full speed, which nothing
+# can exceed, so an impact is never found late. The things that could make
+# a hit come earlier are handled when they happen: a new zombie entering the
+# lane re-resolves that lane's bullets, and a wave's speed change re-resolves
+# all of them.
+#
+# Tolerance: kills land on the same tick as the stepped model (bullets are
+# resolved after all zombies moved, which gives each zombie the same bullets
+# in the same order). The documented tolerance is +/- 1 tick per hit, to
+# cover float rounding in the bounds; the differential runs in the commit
+# that added this found no difference.
+
+HITBOX_WIDTH = CELL_WIDTH - 30  # A bullet hits when zombie.x < bullet.x < zombie.x + HITBOX_WIDTH
+EPSILON = 1e-6  # Rounds impact bounds down, never up
+
+
+def _zombie_x(zombie):
+    return zombie.x
+
+
+# Analytic Game State
+class AnalyticGameState(GameState):
+    engine = "analytic"
+
+    def __init__(
+        self, seed=None, wave_config=None, coins=10000, costs=None, endless=False, lanes=LANE_COUNT,
+        columns=GRID_COLUMNS,
+    ):
+        super().__init__(
+            seed=seed, wave_config=wave_config, coins=coins, costs=costs, endless=endless, lanes=lanes, columns=columns
+        )
+        self.bullets = None  # Replaced by the per-lane flights below
+        self.flights = [{} for _ in range(self.lane_count)]  # Per lane: uid -> bullet in flight, in firing order
+        self.impacts = []  # Heap of (tick, uid, bullet); stale when bullet.impact_tick moved on
+        self.max_speed = None  # Fastest zombie.speed in play, recomputed when unknown
+
+    def _fork_entities(self, clone, copies):
+        self._fork_zombies(clone, copies)
+        clone.flights = [{uid: fork_copy(bullet, copies) for uid, bullet in flights.items()} for flights in self.flights]
+        clone.impacts = [(tick, uid, fork_copy(bullet, copies)) for tick, uid, bullet in self.impacts]
+
+    # Where a bullet is after the bullet move of `tick`
+    def bullet_x(self, bullet, tick):
+        return bullet.fire_x + bullet.speed * (tick - bullet.fire_tick + 1)
+
+    # First tick the bullet has left the board (the stepped model drops it before hit-testing)
+    def _expiry_tick(self, bullet):
+        return bullet.fire_tick + int((self.width - bullet.fire_x) // bullet.speed)
+
+    def _walk_speed(self):
+        if self.max_speed is None:
+            self.max_speed = max((zombie.speed for zombie in self.zombies), default=0)
+        return self.max_speed * self.speed_multiplier
+
+    # Earliest tick after `base` the bullet could overlap `zombie`, taking the
+    # zombie's position after the moves of `base`; None if it never can
+    def _bound(self, bullet, zombie, base):
+        bullet_x = self.bullet_x(bullet, base)
+        if zombie.x + HITBOX_WIDTH <= bullet_x + bullet.speed:
+            return None  # Already behind the bullet, and the gap only grows
+        closing = bullet.speed + zombie.speed * self.speed_multiplier
+        return base + max(int((zombie.x - bullet_x - EPSILON) // closing) + 1, 1)
+
+    def _schedule(self, bullet, base):
+        best = self._expiry_tick(bullet)
+        bullet_x = self.bullet_x(bullet, base)
+        fastest = bullet.speed + self._walk_speed()
+        lane = self.lane_index.in_lane(bullet.lane)
+        for zombie in lane[bisect_right(lane, bullet_x + bullet.speed - HITBOX_WIDTH, key=_zombie_x):]:
+            if (zombie.x - bullet_x - EPSILON) / fastest >= best - base - 1:
+                break  # Zombies further right cannot be reached sooner
+            tick = self._bound(bullet, zombie, base)
+            if tick is not None and tick < best:
+                best = tick
+        self._queue(bullet, best)
+
+    def _queue(self, bullet, tick):
+        bullet.impact_tick = tick
+        heappush(self.impacts, (tick, bullet.uid, bullet))
+
+    # Start tracking a bullet that is at bullet.x before its move on `tick`
+    def _launch(self, bullet, tick):
+        bullet.fire_x = bullet.x
+        bullet.fire_tick = tick
+        self.flights[bullet.lane][bullet.uid] = bullet
+        self._schedule(bullet, tick - 1)
+
+    def add_bullet(self, bullet):
+        bullet.uid = self.new_uid()
+        self._launch(bullet, self.tick)
+
+    def restore_bullet(self, bullet):
+        self._launch(bullet, self.tick)
+
+    def add_zombie(self, zombie):
+        super().add_zombie(zombie)
+        if self.max_speed is not None:
+            self.max_speed = max(self.max_speed, zombie.speed)
+        # A newcomer can only bring a bullet's impact forward. Its position
+        # may already include this tick's move, so bound from the tick before.
+        for bullet in self.flights[zombie.lane].values():
+            tick = self._bound(bullet, zombie, self.tick - 1)
+            if tick is not None and tick < bullet.impact_tick:
+                self._queue(bullet, tick)
+
+    def update_zombie_speeds(self):
+        super().update_zombie_speeds()
+        self.max_speed = None
+        for flights in self.flights:
+            for bullet in flights.values():
+                self._schedule(bullet, self.tick - 1)
+
+    def bullet_count(self):
+        return sum(len(flights) for flights in self.flights)
+
+    def in_flight(self):
+        # Bullets in firing order with x brought up to date, for snapshots
+        bullets = sorted((bullet for flights in self.flights for bullet in flights.values()), key=_uid)
+        for bullet in bullets:
+            bullet.x = self.bullet_x(bullet, self.tick - 1)
+        return bullets
+
+    def _bullets_in(self, area):
+        if area is None:
+            return self.in_flight()
+        first, end, left, right = area
+        found = []
+        for flights in self.flights[first:end]:
+            for bullet in flights.values():
+                bullet.x = self.bullet_x(bullet, self.tick - 1)
+                if left <= bullet.x < right:
+                    found.append(bullet)
+        found.sort(key=_uid)
+        return found
+
+    def update_entities(self):
+        self.profiler.lap("bullets")  # Nothing to step
+
+        for zombie in self.zombies:
+            zombie.detect_plant(self)  # Check if there's a plant in front
+            zombie.move(self)          # Move or eat plant
+        self.profiler.lap("zombies")
+
+        self._resolve_impacts()
+        self.profiler.lap("collisions")
+
+        self.thaw_zombies()
+        self.profiler.lap("thaw")
+
+    # Spent bullets go back to the pool at once: a heap entry left behind for
+    # one names its old uid, which is in no lane's flights any more.
+    def _resolve_impacts(self):
+        tick = self.tick
+        impacts = self.impacts
+        killed = False
+        while impacts and impacts[0][0] <= tick:
+            due, uid, bullet = heappop(impacts)
+            flights = self.flights[bullet.lane]
+            if bullet.impact_tick != due or uid not in flights:
+                continue  # Re-queued since, or already spent
+            x = self.bullet_x(bullet, tick)
+            if x > self.width:
+                del flights[uid]
+                self.pool.give(bullet)
+                continue
+
+            # First zombie in list order overlapping the bullet, as in the stepped loop
+            lane = self.lane_index.in_lane(bullet.lane)
+            overlapping = lane[bisect_right(lane, x - HITBOX_WIDTH, key=_zombie_x):bisect_left(lane, x, key=_zombie_x)]
+            if not overlapping:
+                self._schedule(bullet, tick)
+                continue
+
+            zombie = min(overlapping, key=_uid)
+            del flights[uid]
+            if BULLET_FREEZES[bullet.type_id]:
+                self.freeze(zombie)
+                self.telemetry.freeze(bullet.source, zombie.uid)
+            else:
+                zombie.health -= bullet.damage
+                self.telemetry.hit(bullet.source, zombie.uid, bullet.damage)
+            if zombie.health <= 0:
+                self.coins += zombie.reward  # Add coins based on zombie reward
+                self.coins_earned += zombie.reward
+                self.remove_zombie(zombie)
+                self.telemetry.kill(bullet.source, zombie.uid, type(zombie), zombie.reward, self.coins)
+                killed = True
+            self.pool.give(bullet)
+        if killed:
+            self.compact_zombies()
+
+
+def _uid(entity):
+    return entity.uid
@@ -0,0 +1,244 @@
+import json
+import struct
+from bisect import bisect_right
+
+from simulation import ENGINES, GRID_COLUMNS, LANE_COUNT, PLACE, RESULTS, SHOVEL, new_game, plant_costs, step
+from snapshot import VERSION as SNAPSHOT_VERSION
+from snapshot import restore_snapshot, take_snapshot
+
+# Replay files
+#
+#   header   b"PVMR", u16 version, u16 snapshot version (of the keyframes),
+#            u8 engine, u64 seed,
+#            varint length + JSON {"coins", "waves", "plant_costs", "endless", "board"}
+#            (starting config; board is [lanes, columns])
+#   records  u8 type, varint tick delta, payload ...
+#              ACTIONS   varint count, then per action: u8 code, varint lane, varint col
+#                        (code 0 = shovel, 1 + i = place the i-th plant in plant_costs)
+#              KEYFRAME  varint length + compressed snapshot (snapshot.py) taken
+#                        before that tick's inputs
+#              END       u8 result (0 none, 1 win, 2 lose)
+#   index    varint count, then (varint tick, varint offset) per keyframe
+#   footer   u64 index offset, b"PVMX"
+#
+# A keyframe lets a player jump close to any tick and simulate only the rest.
+# VERSION goes up whenever this layout or the header JSON changes; a replay
+# is only read by the version that wrote it, with the snapshot format its
+# keyframes were taken in.
+
+MAGIC = b"PVMR"
+FOOTER_MAGIC = b"PVMX"
+VERSION = 3
+HEADER = struct.Struct("<HHBQ")
+
+ACTIONS = 1
+KEYFRAME = 2
+END = 3
+
+KEYFRAME_INTERVAL = 600  # Ticks between keyframes (10 s of game time)
+
+PLANT_TYPES = list(plant_costs)
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.write(bytes((value & 0x7F | 0x80,)))
+        value >>= 7
+    out.write(bytes((value,)))
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+# Replay Recorder
+# Call record() with each tick's inputs just before step(), then close().
+class ReplayRecorder:
+    def __init__(self, path, state, keyframe_interval=KEYFRAME_INTERVAL):
+        if state.seed is None or state.tick != 0:
+            raise ValueError("Recording needs a seeded game that has not started (new_game(seed=...))")
+        self.out = open(path, "wb")
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = []  # (tick, file offset)
+        self.last_tick = state.tick
+
+        config = {
+            "coins": state.coins,
+            "waves": state.waves,
+            "plant_costs": state.plant_costs,
+            "endless": state.endless is not None,
+            "board": [state.lane_count, state.columns],
+        }
+        config = json.dumps(config, separators=(",", ":")).encode()
+        self.out.write(MAGIC + HEADER.pack(VERSION, SNAPSHOT_VERSION, ENGINES.index(state.engine), state.seed))
+        write_varint(self.out, len(config))
+        self.out.write(config)
+
+    def _begin(self, record_type, tick):
+        self.out.write(bytes((record_type,)))
+        write_varint(self.out, tick - self.last_tick)
+        self.last_tick = tick
+
+    def record(self, state, inputs):
+        if state.tick % self.keyframe_interval == 0:
+            self.keyframes.append((state.tick, self.out.tell()))
+            blob = take_snapshot(state, compress=True)
+            self._begin(KEYFRAME, state.tick)
+            write_varint(self.out, len(blob))
+            self.out.write(blob)
+        if inputs:
+            self._begin(ACTIONS, state.tick)
+            write_varint(self.out, len(inputs))
+            for action in inputs:
+                if action[0] == SHOVEL:
+                    code, lane, col = 0, action[1], action[2]
+                else:
+                    code, lane, col = 1 + PLANT_TYPES.index(action[1]), action[2], action[3]
+                self.out.write(bytes((code,)))
+                write_varint(self.out, lane)
+                write_varint(self.out, col)
+
+    def close(self, state):
+        self._begin(END, state.tick)
+        self.out.write(bytes((RESULTS.index(state.result),)))
+        index_offset = self.out.tell()
+        write_varint(self.out, len(self.keyframes))
+        for tick, offset in self.keyframes:
+            write_varint(self.out, tick)
+            write_varint(self.out, offset)
+        self.out.write(struct.pack("<Q", index_offset) + FOOTER_MAGIC)
+        self.out.close()
+
+
+# Replay Player
+# Parses a replay and re-simulates it headlessly from its seed and inputs.
+class ReplayPlayer:
+    def __init__(self, source, engine=None):
+        if isinstance(source, (bytes, bytearray)):
+            data = bytes(source)
+        else:
+            with open(source, "rb") as replay_file:
+                data = replay_file.read()
+        if data[:4] != MAGIC:
+            raise ValueError("Not a replay file")
+        version, snapshot_version, engine_code, self.seed = HEADER.unpack_from(data, 4)
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay version {version}")
+        if snapshot_version != SNAPSHOT_VERSION:
+            raise ValueError(f"Replay keyframes use unsupported snapshot version {snapshot_version}")
+        self.engine = engine or ENGINES[engine_code]
+        length, pos = read_varint(data, 4 + HEADER.size)
+        self.config = json.loads(data[pos:pos + length])
+        self.data = data
+
+        self.actions = {}  # tick -> inputs
+        self.end_tick = None
+        self.result = None
+        self._scan(pos + length)
+
+        index_offset, magic = struct.unpack_from("<Q4s", data, len(data) - 12)
+        if magic != FOOTER_MAGIC:
+            raise ValueError("Replay is truncated (no keyframe index)")
+        count, pos = read_varint(data, index_offset)
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        for _ in range(count):
+            tick, pos = read_varint(data, pos)
+            offset, pos = read_varint(data, pos)
+            self.keyframe_ticks.append(tick)
+            self.keyframe_offsets.append(offset)
+
+    def _scan(self, pos):
+        tick = 0
+        while True:
+            record_type = self.data[pos]
+            delta, pos = read_varint(self.data, pos + 1)
+            tick += delta
+            if record_type == ACTIONS:
+                count, pos = read_varint(self.data, pos)
+                inputs = []
+                for _ in range(count):
+                    code = self.data[pos]
+                    lane, pos = read_varint(self.data, pos + 1)
+                    col, pos = read_varint(self.data, pos)
+                    if code == 0:
+                        inputs.append((SHOVEL, lane, col))
+                    else:
+                        inputs.append((PLACE, PLANT_TYPES[code - 1], lane, col))
+                self.actions[tick] = inputs
+            elif record_type == KEYFRAME:
+                length, pos = read_varint(self.data, pos)
+                pos += length
+            elif record_type == END:
+                self.end_tick = tick
+                self.result = RESULTS[self.data[pos]]
+                return
+            else:
+                raise ValueError(f"Corrupt replay: unknown record type {record_type}")
+
+    def new_state(self):
+        board = self.config.get("board", (LANE_COUNT, GRID_COLUMNS))
+        return new_game(
+            self.engine,
+            seed=self.seed,
+            wave_config=self.config["waves"],
+            coins=self.config["coins"],
+            costs=self.config.get("plant_costs"),
+            endless=self.config.get("endless", False),
+            lanes=board[0],
+            columns=board[1],
+        )
+
+    def keyframe(self, i):
+        pos = self.keyframe_offsets[i]
+        _, pos = read_varint(self.data, pos + 1)
+        length, pos = read_varint(self.data, pos)
+        return restore_snapshot(self.data[pos:pos + length], self.engine)
+
+    def advance(self, state, tick):
+        while state.tick < tick and not state.result:
+            step(state, self.actions.get(state.tick, ()))
+        return state
+
+    def seek(self, tick):
+        # State at the start of `tick`, restored from the nearest keyframe
+        i = bisect_right(self.keyframe_ticks, tick) - 1
+        state = self.keyframe(i) if i >= 0 else self.new_state()
+        return self.advance(state, tick)
+
+    def play(self):
+        state = self.advance(self.new_state(), self.end_tick)
+        if state.tick != self.end_tick or state.result != self.result:
+            raise RuntimeError(
+                f"Replay diverged: recorded {self.result} at tick {self.end_tick}, "
+                f"re-simulated {state.result} at tick {state.tick}"
+            )
+        return state
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Re-simulate a recorded game")
+    parser.add_argument("replay")
+    parser.add_argument("--seek", type=int, help="restore the state at this tick instead of playing through")
+    parser.add_argument("--engine", choices=ENGINES)
+    args = parser.parse_args()
+
+    player = ReplayPlayer(args.replay, engine=args.engine)
+    start = time.perf_counter()
+    if args.seek is not None:
+        state = player.seek(args.seek)
+    else:
+        state = player.play()
+    elapsed = time.perf_counter() - start
+    print(f"tick={state.tick} result={state.result} coins={state.coins} wave={state.current_wave + 1} "
+          f"zombies={state.zombie_count()} ({elapsed * 1000:.1f} ms)")
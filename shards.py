@@ -0,0 +1,374 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from simulation import (
+    PLACE,
+    SHOVEL,
+    GameState,
+    PlantRow,
+    check_wave_completion,
+    plant_classes,
+    plant_code,
+    spawn_zombies,
+    zombie_classes,
+)
+from snapshot import merge_snapshots, restore_snapshot, take_snapshot
+from units import PLANT_BLAST, PLANT_FIRE_INTERVAL
+
+# Lane-sharded simulation for very large boards. Lanes barely interact:
+# plants only shoot along their own lane, zombies only eat in theirs and
+# bullets never change lane. So the lanes are split into contiguous shards,
+# each simulated by a worker process as an ordinary game (of any engine)
+# that only holds the plants, zombies and bullets of its own lanes.
+#
+# What crosses lanes is settled at barriers once per tick, through arrays in
+# shared memory:
+#   - The coordinator (the parent process) owns the coins, the spawn RNG and
+#     the waves. It runs simulation.py's own wave rules on an entity-free
+#     CoordinatorState, checks player inputs against the shared plant grid
+#     and the coins, and hands the resulting spawns, speed changes,
+#     placements and shovels to the shards as commands.
+#   - A CherryBomb blast reaches one lane beyond its own. A bomb in a shard's
+#     edge lane is due on a tick the coordinator knows in advance (it saw the
+#     placement), so only on those ticks the shards stop after waking their
+#     plants and swap such blasts. A shard applies a blast from the lane
+#     above its own before its plants act and one from below after them,
+#     which is the grid order a single game wakes plants in.
+#   - Each shard reports its coin rewards, zombie and bullet counts and
+#     whether a zombie reached the house.
+#
+# The result is the same game as stepping it in one process, tick for tick
+# (plant health, zombies and bullets per lane, coins, waves, result); only
+# the uids differ, since each shard hands out every Nth one. gather() joins
+# the shards back into one game, through snapshots.
+
+MAX_COMMANDS = 4096    # Commands per tick: spawns, speed changes and player inputs
+BARRIER_TIMEOUT = 60   # Seconds the coordinator waits on a barrier before giving up on the workers
+
+# Values of control[0]
+RUN, GATHER, STOP = range(3)
+
+# Command rows: (op, argument, lane, col); lane -1 addresses every shard
+SPAWN, SPEED, PLACE_PLANT, SHOVEL_PLANT = range(4)
+
+ZOMBIE_KINDS = tuple(zombie_classes.values())  # Type id -> class
+PLANT_KINDS = tuple(plant_classes.values())  # Type id -> class
+
+
+# Split `lanes` lanes into `count` contiguous ranges of near equal size
+def shard_ranges(lanes, count):
+    return [range(lanes * i // count, lanes * (i + 1) // count) for i in range(count)]
+
+
+# Name -> (shape, dtype) of every array shared between coordinator and shards
+def shared_layout(shards, lanes, columns):
+    return {
+        "control": ((3,), np.int64),                  # Operation, command count, blast swap flag
+        "commands": ((MAX_COMMANDS, 4), np.float64),
+        "blasts": ((shards, 2 * columns, 3), np.int64),  # Per shard: (lane, col, damage) of its edge bombs
+        "blast_counts": ((shards,), np.int64),
+        "results": ((shards, 4), np.int64),           # Per shard: coins earned, zombies, bullets, reached house
+        "grid": ((lanes, columns), np.int8),          # simulation.plant_code of every cell
+    }
+
+
+# Shared Arrays
+# NumPy arrays laid out back to back in one shared memory block. The
+# coordinator creates the block; workers attach to it by name.
+class SharedArrays:
+    def __init__(self, layout, name=None):
+        # Bytes per array, rounded up to a multiple of 8 so every array stays aligned
+        sizes = {key: -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8 for key, (shape, dtype) in layout.items()}
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=max(sum(sizes.values()), 1))
+        self.names = list(layout)
+        offset = 0
+        for key, (shape, dtype) in layout.items():
+            setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset))
+            offset += sizes[key]
+
+    def close(self, unlink=False):
+        for key in self.names:
+            delattr(self, key)  # The block cannot close while arrays still point into it
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+# Coordinator State
+# The coordinator's copy of the game: coins, RNG and waves, but no entities.
+# spawn_zombies(), check_wave_completion() and endless waves run on it
+# unchanged; the spawns and speed changes they make become commands for the
+# shards, and the entity counts they read are the shards' totals.
+class CoordinatorState(GameState):
+    def __init__(self, skeleton, game):
+        self.__dict__.update(skeleton.__dict__)
+        self.game = game
+        self.spawned = 0  # Zombies queued since the shards last reported
+
+    def spawn_zombie(self, zombie_class, lane):
+        self.game.queue(SPAWN, zombie_class.type_id, lane)
+        self.spawned += 1
+
+    def update_zombie_speeds(self):
+        self.game.queue(SPEED, self.speed_multiplier)
+
+    def zombie_count(self):
+        return self.game.zombies + self.spawned
+
+    def bullet_count(self):
+        return self.game.bullets
+
+    def zombie_reached_house(self):
+        return self.game.reached_house
+
+
+# Sharded Game
+# Steps `state` (any engine; left untouched) in `workers` processes, one
+# shard of lanes each. state.coins, .tick, .result and the other scalars are
+# kept up to date on ShardedGame.state; gather() returns the whole game.
+class ShardedGame:
+    def __init__(self, state, workers=None):
+        self.engine = state.engine
+        self.ranges = shard_ranges(state.lane_count, min(workers or os.cpu_count(), state.lane_count))
+        count = len(self.ranges)
+        # Edge lanes: a CherryBomb there blasts into the next shard
+        self.edges = {lanes[0] for lanes in self.ranges[1:]} | {lanes[-1] for lanes in self.ranges[:-1]}
+        self.blast_ticks = set()
+        for row in state.plants:
+            for plant in row:
+                if plant and PLANT_BLAST[plant.type_id] and plant.lane in self.edges:
+                    self.blast_ticks.add(plant.ready_tick)
+
+        self.shared = SharedArrays(shared_layout(count, state.lane_count, state.columns))
+        for lane, row in enumerate(state.plants):
+            self.shared.grid[lane] = [plant_code(plant) for plant in row]
+        self.commands = 0
+        self.zombies = state.zombie_count()
+        self.bullets = state.bullet_count()
+        self.reached_house = False
+
+        blob = take_snapshot(state)
+        self.state = CoordinatorState(restore_snapshot(blob, "objects", keep_lanes=range(0)), self)
+        context = multiprocessing.get_context()
+        self.start = context.Barrier(count + 1)
+        self.finish = context.Barrier(count + 1)
+        blasts = context.Barrier(count)  # Between the shards only
+        self.connections = []
+        self.processes = []
+        for index, lanes in enumerate(self.ranges):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_shard,
+                args=(
+                    index, count, lanes, self.engine, blob, self.shared.memory.name,
+                    self.start, blasts, self.finish, sender,
+                ),
+                daemon=True,
+            )
+            process.start()
+            sender.close()
+            self.connections.append(receiver)
+            self.processes.append(process)
+
+    def queue(self, op, argument=0, lane=-1, col=0):
+        if self.commands == MAX_COMMANDS:
+            raise ValueError(f"More than {MAX_COMMANDS} commands in one tick")
+        self.shared.commands[self.commands] = (op, argument, lane, col)
+        self.commands += 1
+
+    # simulation.apply_input, checked against the shared plant grid
+    def apply_input(self, action):
+        state, grid = self.state, self.shared.grid
+        if action[0] == SHOVEL:
+            _, lane, col = action
+            if 0 <= lane < state.lane_count and 0 <= col < state.columns and grid[lane, col]:
+                grid[lane, col] = 0
+                self.queue(SHOVEL_PLANT, 0, lane, col)
+        elif action[0] == PLACE:
+            _, plant_type, lane, col = action
+            if plant_type not in state.plant_costs:
+                return
+            if state.coins >= state.plant_costs[plant_type]:
+                if 0 <= lane < state.lane_count and 0 <= col < state.columns and not grid[lane, col]:
+                    plant_class = plant_classes[plant_type]
+                    grid[lane, col] = plant_code(plant_class)
+                    self.queue(PLACE_PLANT, plant_class.type_id, lane, col)
+                    state.coins -= state.plant_costs[plant_type]
+                    if PLANT_BLAST[plant_class.type_id] and lane in self.edges:
+                        self.blast_ticks.add(state.tick + PLANT_FIRE_INTERVAL[plant_class.type_id] - 1)
+            else:
+                state.events.append(("not_enough_coins", plant_type))
+
+    # Release the workers for one operation
+    def _signal(self, op):
+        self.shared.control[:] = (op, self.commands, self.state.tick in self.blast_ticks)
+        self.start.wait(BARRIER_TIMEOUT)
+
+    # One tick, in the order of simulation.step()
+    def step(self, inputs=()):
+        state = self.state
+        state.events = []
+        if state.result:
+            return state.events
+
+        for action in inputs:
+            self.apply_input(action)
+        self._signal(RUN)
+        self.blast_ticks.discard(state.tick)
+        self.finish.wait(BARRIER_TIMEOUT)
+        self.commands = 0
+
+        earned, self.zombies, self.bullets, reached = self.shared.results.sum(axis=0).tolist()
+        self.reached_house = bool(reached)
+        state.coins += earned
+        state.coins_earned += earned
+        state.spawned = 0
+        if state.endless:
+            state.endless.update(state)
+        else:
+            spawn_zombies(state)
+            check_wave_completion(state)
+        if not state.result and state.zombie_reached_house():
+            state.result = "lose"
+        state.tick += 1
+        return state.events
+
+    def run(self, max_ticks=None):
+        state = self.state
+        while not state.result and (max_ticks is None or state.tick < max_ticks):
+            self.step()
+        return state
+
+    # The whole game, as one state of the engine it was sharded on. Commands queued at
+    # the end of the last tick (spawns, speed changes) are applied first.
+    def gather(self):
+        self._signal(GATHER)
+        self.commands = 0
+        self.state.spawned = 0
+        parts = [connection.recv_bytes() for connection in self.connections]
+        return restore_snapshot(merge_snapshots(take_snapshot(self.state), parts), self.engine)
+
+    def close(self):
+        if self.processes:
+            try:
+                self._signal(STOP)
+            except threading.BrokenBarrierError:
+                pass  # A worker already died; the others are daemons
+            for process in self.processes:
+                process.join(BARRIER_TIMEOUT)
+            self.processes = []
+            self.shared.close(unlink=True)
+
+
+# Worker: the game of one shard, stepped each time the coordinator releases it
+def run_shard(index, count, lanes, engine, blob, memory_name, start, blasts, finish, connection):
+    state = restore_snapshot(blob, engine, lanes)
+    shared = SharedArrays(shared_layout(count, state.lane_count, state.columns), memory_name)
+    state.next_uid += index  # Shard i hands out uids i, i + count, i + 2 * count, ... on top of the game's
+    state.uid_stride = count
+    # Plant assignments are copied into the shared grid, which the coordinator
+    # checks placements against
+    for lane in lanes:
+        row = state.plants[lane]
+        state.plants[lane] = PlantRow(row, *getattr(row, "mirrors", ()), shared.grid[lane])
+    low_edge = lanes[0] - 1    # Lane of the shard above, whose blasts land before this shard's plants act
+    high_edge = lanes[-1] + 1  # Lane of the shard below, whose blasts land after them
+    earned = state.coins_earned
+
+    while True:
+        start.wait()
+        op, commands, swap_blasts = shared.control.tolist()
+        if op == STOP:
+            break
+
+        for op_code, argument, lane, col in shared.commands[:commands].tolist():
+            lane, col = int(lane), int(col)
+            if op_code == SPEED:
+                state.speed_multiplier = argument
+                state.update_zombie_speeds()
+            elif lane not in lanes:
+                continue
+            elif op_code == SPAWN:
+                state.spawn_zombie(ZOMBIE_KINDS[int(argument)], lane)
+            elif op_code == PLACE_PLANT:
+                plant = state.plants[lane][col] = PLANT_KINDS[int(argument)](lane, col)
+                state.plant_scheduler.add(plant, state.tick)
+            elif op_code == SHOVEL_PLANT:
+                state.plants[lane][col] = None
+        if op == GATHER:
+            connection.send_bytes(take_snapshot(state))
+            continue
+
+        woken = state.plant_scheduler.due(state)
+        if swap_blasts:
+            bombs = [
+                (plant.lane, plant.col, plant.damage)
+                for plant in woken
+                if PLANT_BLAST[plant.type_id] and plant.lane in (lanes[0], lanes[-1])
+            ]
+            if bombs:
+                shared.blasts[index, :len(bombs)] = bombs
+            shared.blast_counts[index] = len(bombs)
+            blasts.wait()
+            landing = [
+                (lane, col, damage)
+                for other in range(count)
+                if other != index
+                for lane, col, damage in shared.blasts[other, :shared.blast_counts[other]].tolist()
+                if lane in (low_edge, high_edge)
+            ]
+            for lane, col, damage in landing:
+                if lane == low_edge:
+                    state.damage_area(lane, col, 1, damage)
+        for plant in woken:
+            plant.auto_shoot(state)
+        if swap_blasts:
+            for lane, col, damage in landing:
+                if lane == high_edge:
+                    state.damage_area(lane, col, 1, damage)
+
+        state.update_entities()
+        shared.results[index] = (
+            state.coins_earned - earned, state.zombie_count(), state.bullet_count(), state.zombie_reached_house()
+        )
+        earned = state.coins_earned
+        state.tick += 1
+        finish.wait()
+
+    connection.close()
+    shared.close()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from benchmark import SCENARIOS
+
+    # Ticks per second of a strategy-free benchmark scenario, in one process
+    # and in each number of workers given
+    name = sys.argv[1] if len(sys.argv) > 1 else "large_board"
+    engine = sys.argv[2] if len(sys.argv) > 2 else "objects"
+    ticks = int(sys.argv[3]) if len(sys.argv) > 3 else 60
+    counts = [int(arg) for arg in sys.argv[4:]] or sorted({1, 2, 4, os.cpu_count()})
+    state, strategy = SCENARIOS[name](engine)
+    if strategy:
+        sys.exit(f"{name} plays inputs from a strategy, which sharded games do not take")
+
+    from simulation import run
+
+    print(f"{name} on {engine}, {ticks} ticks, {os.cpu_count()} CPUs")
+    for count in counts:
+        game = ShardedGame(state, count)  # Leaves `state` as it was
+        start = time.perf_counter()
+        game.run(max_ticks=state.tick + ticks)
+        elapsed = time.perf_counter() - start
+        game.close()
+        print(f"{len(game.ranges):>3} workers  {ticks / elapsed:>8.1f} ticks/sec")
+    start = time.perf_counter()
+    run(state, max_ticks=state.tick + ticks)
+    print(f"  1 process  {ticks / (time.perf_counter() - start):>8.1f} ticks/sec")
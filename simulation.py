@@ -0,0 +1,917 @@
+import random
+from bisect import bisect_left, insort
+from heapq import heappop, heappush
+
+from profiler import Profiler
+from telemetry import Telemetry
+from units import (
+    BULLET_DAMAGE,
+    BULLET_FREEZES,
+    BULLET_IDS,
+    BULLET_SPEED,
+    BULLET_STATS,
+    PLANT_BLAST,
+    PLANT_COST,
+    PLANT_FIRE_INTERVAL,
+    PLANT_HEALTH,
+    PLANT_IDS,
+    PLANT_PROJECTILE,
+    PLANT_SHOTS,
+    PLANT_STATS,
+    ZOMBIE_BITE,
+    ZOMBIE_HEALTH,
+    ZOMBIE_IDS,
+    ZOMBIE_IGNORES_FREEZE,
+    ZOMBIE_REWARD,
+    ZOMBIE_SPEED,
+    ZOMBIE_STATS,
+)
+
+# Headless game simulation. Nothing in this module touches pygame, so a game
+# can be stepped as fast as the CPU allows (balance runs, CI, tools) while
+# game.py only renders whatever state it is handed.
+
+# Board dimensions. LANE_COUNT x GRID_COLUMNS is the standard board; a game
+# can be created with any number of lanes and columns (GameState.lane_count,
+# .columns, .width), cells always being CELL_WIDTH x LANE_HEIGHT.
+SCREEN_WIDTH = 1600
+LANE_COUNT = 5
+LANE_HEIGHT = 100
+CELL_WIDTH = 100  # Grid cell width
+GRID_COLUMNS = SCREEN_WIDTH // CELL_WIDTH
+
+plant_costs = dict(zip(PLANT_STATS, PLANT_COST))
+
+# Waves Configuration
+waves = [
+    {"Zombie": 5, "Zombie2": 5, "Zombie3": 10, "speed_multiplier": 1.0},  # Wave 1
+    {"Zombie": 40, "Zombie2": 20, "Zombie3": 10, "speed_multiplier": 2},  # Wave 2
+    {"Zombie": 20, "Zombie2": 50, "Zombie3": 10, "speed_multiplier": 2.5},  # Wave 3
+    {"Zombie": 50, "Zombie2": 20, "Zombie3": 10, "Gargantuar": 5, "speed_multiplier": 1},  # Boss Fight
+]
+
+# All timers below count simulation ticks; the game runs TICK_RATE ticks per
+# second of game time no matter how fast frames are rendered
+TICK_RATE = 60
+
+SPAWN_INTERVAL = 30  # Spawn a zombie every 30 ticks
+FREEZE_TICKS = 300  # An ice hit freezes a zombie for 5 seconds (not counting time spent eating)
+
+# Values of GameState.result
+RESULTS = (None, "win", "lose")
+
+# Player actions accepted by step()
+PLACE = "place"    # (PLACE, plant_type, lane, col)
+SHOVEL = "shovel"  # (SHOVEL, lane, col)
+
+
+# Shooter Plant Class
+# Plants are only called when the scheduler wakes them, fire_interval ticks
+# after they were placed or last fired (see PlantScheduler). What a plant
+# costs, fires and how often comes from its row in units.PLANT_STATS.
+class ShooterPlant:
+    __slots__ = ("lane", "col", "x", "y", "ready_tick", "health", "telemetry_id")
+    type_id = PLANT_IDS["normal_plant"]
+
+    def __init__(self, lane, col):
+        self.lane = lane
+        self.col = col
+        self.x = col * CELL_WIDTH
+        self.y = lane * LANE_HEIGHT + 5
+        self.ready_tick = 0  # Tick the next shot is due, kept by the scheduler
+        self.health = PLANT_HEALTH[self.type_id]
+        self.telemetry_id = 0  # Number in the telemetry reports, 0 until it is first reported
+
+    def auto_shoot(self, state):
+        if state.zombies_in_lane(self.lane):
+            type_id = self.type_id
+            projectile = BULLET_KINDS[PLANT_PROJECTILE[type_id]]
+            x, y = self.x + CELL_WIDTH, self.y + LANE_HEIGHT // 2 - 5
+            for offset in PLANT_SHOTS[type_id]:  # A Repeater shoots two bullets in quick succession
+                state.fire(self, state.pool.take(projectile, x + offset, y))
+            state.plant_scheduler.schedule(self, state.tick + PLANT_FIRE_INTERVAL[type_id])
+        else:
+            state.plant_scheduler.wait_for_zombies(self)  # Shot stays ready until a zombie enters the lane
+
+    def take_damage(self, state, damage):
+        alive = self.health > 0
+        self.health -= damage
+        if self.health <= 0:
+            state.plants[self.lane][self.col] = None
+            if alive:
+                state.telemetry.eaten(self)
+
+
+# Freezing Plant Class
+class FreezingPlant(ShooterPlant):
+    __slots__ = ()
+    type_id = PLANT_IDS["freezing_plant"]
+
+
+# Repeater Class
+class Repeater(ShooterPlant):
+    __slots__ = ()
+    type_id = PLANT_IDS["repeater"]
+
+
+# Wallnut Plant Class
+# No fire interval, so it is never woken
+class Wallnut(ShooterPlant):
+    __slots__ = ()
+    type_id = PLANT_IDS["wallnut"]
+
+
+# CherryBomb Plant Class
+class CherryBomb(ShooterPlant):
+    __slots__ = ("damage",)
+    type_id = PLANT_IDS["cherry_bomb"]
+
+    def __init__(self, lane, col):
+        super().__init__(lane, col)
+        self.damage = PLANT_BLAST[self.type_id]  # Amount of damage dealt by the explosion
+
+    def auto_shoot(self, state):
+        # Woken once, when the fuse runs out
+        self.explode(state)
+
+    def explode(self, state):
+        # Apply damage to all zombies in a 1-grid radius (including diagonals)
+        state.damage_area(self.lane, self.col, 1, self.damage, state.telemetry.plant_id(self))
+
+        # Remove the CherryBomb plant after explosion
+        state.plants[self.lane][self.col] = None
+
+
+# Bullet Class
+# Bullets and zombies are recycled through EntityPool, so __init__ must set
+# every slot. What a hit does is looked up by type id in the collision loop
+# (units.BULLET_FREEZES).
+class Bullet:
+    __slots__ = ("x", "y", "lane", "speed", "damage", "source", "uid", "fire_x", "fire_tick", "impact_tick")
+    type_id = BULLET_IDS["bullet"]
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.lane = int(y // LANE_HEIGHT)
+        self.speed = BULLET_SPEED[self.type_id]
+        self.damage = BULLET_DAMAGE[self.type_id]
+        self.source = 0  # Telemetry number of the plant that fired it (0 while telemetry is off)
+        self.uid = 0  # Set when the bullet enters a game
+        # Flight of the analytic engine (projectiles.py)
+        self.fire_x = x
+        self.fire_tick = self.impact_tick = 0
+
+    def move(self):
+        self.x += self.speed
+
+
+# Ice Bullet Class
+class IceBullet(Bullet):
+    __slots__ = ()
+    type_id = BULLET_IDS["ice_bullet"]
+
+
+# Small Bullet Class (used by Repeater)
+class SmallBullet(Bullet):
+    __slots__ = ()
+    type_id = BULLET_IDS["small_bullet"]
+
+
+# Zombie Class
+class Zombie:
+    __slots__ = (
+        "lane", "x", "y", "health", "base_speed", "speed", "frozen", "thaw_tick", "eating_plant", "reward", "col",
+        "uid",
+    )
+    type_id = ZOMBIE_IDS["Zombie"]
+
+    def __init__(self, lane, speed_multiplier=1.0):
+        type_id = self.type_id
+        self.lane = lane
+        self.x = SCREEN_WIDTH
+        self.y = lane * LANE_HEIGHT + 10
+        self.health = ZOMBIE_HEALTH[type_id]
+        self.base_speed = ZOMBIE_SPEED[type_id]
+        self.speed = self.base_speed * speed_multiplier
+        self.frozen = False
+        self.thaw_tick = 0  # Tick a frozen zombie thaws, kept by GameState.freeze/thaw_zombies
+        self.eating_plant = None
+        self.reward = ZOMBIE_REWARD[type_id]
+        self.col = int(self.x // CELL_WIDTH)  # Cell the zombie stands in, kept by LaneIndex
+        self.uid = 0  # Set when the zombie enters a game
+
+    # A zombie that ignores freezing (Gargantuar) is still flagged frozen by
+    # ice hits, but the flag is never cleared and it keeps walking
+    def move(self, state):
+        if self.eating_plant:  # Stop moving if eating a plant
+            if self.frozen and not ZOMBIE_IGNORES_FREEZE[self.type_id]:
+                self.thaw_tick += 1  # The freeze only wears off while not eating
+            self.eating_plant.take_damage(state, ZOMBIE_BITE[self.type_id])  # Slowly damage the plant
+            if self.eating_plant.health <= 0:  # Once the plant is destroyed
+                self.eating_plant = None  # Stop eating
+        elif not self.frozen or ZOMBIE_IGNORES_FREEZE[self.type_id]:  # If not frozen or eating, continue moving
+            self.x -= self.speed * state.speed_multiplier  # Apply speed multiplier
+            state.lane_index.moved(self)
+        # A frozen zombie stands still until GameState.thaw_zombies() releases it
+
+    def detect_plant(self, state):
+        # Check for plants in front of the zombie
+        col = self.col
+        if 0 <= col < state.columns:
+            plant = state.plants[self.lane][col]
+            if plant:  # If there's a plant in the zombie's lane and column
+                self.eating_plant = plant  # Start eating this plant
+
+
+# Zombie Type 2 Class
+class Zombie2(Zombie):
+    __slots__ = ()
+    type_id = ZOMBIE_IDS["Zombie2"]
+
+
+# Zombie Type 3 Class
+class Zombie3(Zombie):
+    __slots__ = ()
+    type_id = ZOMBIE_IDS["Zombie3"]
+
+
+# Gargantuar Zombie Class
+class Gargantuar(Zombie):
+    __slots__ = ()
+    type_id = ZOMBIE_IDS["Gargantuar"]
+
+
+# Unit name -> class, in type id order: every row of a units.py table needs
+# exactly one class
+def _by_type_id(table, classes):
+    kinds = sorted(classes, key=lambda cls: cls.type_id)
+    if [cls.type_id for cls in kinds] != list(range(len(table))):
+        raise ValueError(f"Expected one class per type in {list(table)}, got {[cls.__name__ for cls in kinds]}")
+    return dict(zip(table, kinds))
+
+
+plant_classes = _by_type_id(PLANT_STATS, (ShooterPlant, FreezingPlant, Repeater, Wallnut, CherryBomb))
+zombie_classes = _by_type_id(ZOMBIE_STATS, (Zombie, Zombie2, Zombie3, Gargantuar))
+bullet_classes = _by_type_id(BULLET_STATS, (Bullet, IceBullet, SmallBullet))
+
+ZOMBIE_TYPES = tuple(zombie_classes)  # Spawn order of the wave weights
+BULLET_KINDS = tuple(bullet_classes.values())  # Type id -> class
+
+
+# Plant grids stored as integers (observations, the network stream, shared
+# shard memory) hold 0 for an empty cell, else 1 + the plant's type id
+def plant_code(plant):
+    return plant.type_id + 1 if plant else 0
+
+
+# Row of the plant grid that also writes the plant_code of every cell it is
+# given into each array of `mirrors`, so an integer copy of the grid stays
+# current through placing, shovelling, eating and blasts
+class PlantRow(list):
+    __slots__ = ("mirrors",)
+
+    def __init__(self, cells, *mirrors):
+        super().__init__(cells)
+        self.mirrors = mirrors
+        for mirror in mirrors:
+            mirror[:] = [plant_code(plant) for plant in cells]
+
+    def __setitem__(self, col, plant):
+        super().__setitem__(col, plant)
+        code = plant_code(plant)
+        for mirror in self.mirrors:
+            mirror[col] = code
+
+
+def wave_size(wave):
+    return sum(value for key, value in wave.items() if key != "speed_multiplier")
+
+
+def _zombie_x(zombie):
+    return zombie.x
+
+
+def _uid(entity):
+    return entity.uid
+
+
+# Copy of a plant, zombie or bullet (or other object) for a forked game: a new
+# instance with the same slot and attribute values. `copies` maps
+# id(original) -> copy, so every reference to one entity (grid, eating
+# zombies, schedulers) ends up at the same copy.
+def fork_copy(entity, copies):
+    copy = copies.get(id(entity))
+    if copy is None:
+        cls = type(entity)
+        copy = copies[id(entity)] = object.__new__(cls)
+        copy_slots = _slot_copiers.get(cls)
+        if copy_slots is None:
+            copy_slots = _slot_copiers[cls] = _slot_copier(cls)
+        copy_slots(entity, copy)
+        if hasattr(entity, "__dict__"):
+            copy.__dict__.update(entity.__dict__)
+    return copy
+
+
+_slot_copiers = {}  # Class -> function(entity, copy) copying every slot
+
+
+# Built once per class as straight-line code, one "copy.x = entity.x" per
+# slot, which is faster than looping over the slot names (or over a dict)
+def _slot_copier(cls):
+    names = [name for klass in cls.__mro__ for name in klass.__dict__.get("__slots__", ())]
+    body = "".join(f"    copy.{name} = entity.{name}\n" for name in names) or "    pass\n"
+    namespace = {}
+    exec(f"def copy_slots(entity, copy):\n{body}", namespace)
+    return namespace["copy_slots"]
+
+
+# Entity Pool
+# Per-class free lists of zombies and bullets that have left the game. New
+# ones are taken from here and re-run __init__, so dense waves recycle the
+# same few thousand objects instead of allocating (and later collecting) one
+# per shot and spawn. An entity is given back once nothing in the game
+# refers to it any more, except heap entries that are checked by uid (the
+# thaw heap, and the analytic engine's impact heap) and skipped as stale.
+POOL_LIMIT = 4096  # Free entities kept per class
+
+
+class EntityPool:
+    def __init__(self, limit=POOL_LIMIT):
+        self.limit = limit
+        self.free = {}  # Class -> entities ready for reuse
+
+    def take(self, cls, *args):
+        free = self.free.get(cls)
+        if free:
+            entity = free.pop()
+            entity.__init__(*args)
+            return entity
+        return cls(*args)
+
+    def give(self, entity):
+        free = self.free.get(type(entity))
+        if free is None:
+            free = self.free[type(entity)] = []
+        if len(free) < self.limit:
+            free.append(entity)
+
+
+# Lane Index
+# Buckets live zombies per lane (sorted by x on demand) and per grid cell so
+# shooting, eating and explosions never scan the whole zombie list.
+class LaneIndex:
+    def __init__(self, lane_count):
+        self.lanes = [[] for _ in range(lane_count)]
+        self.unsorted = [False] * lane_count  # Lanes whose order went stale after movement
+        self.cells = {}  # (lane, col) -> zombies standing in that cell
+
+    def add(self, zombie):
+        lane = self.lanes[zombie.lane]
+        if self.unsorted[zombie.lane] or not lane or lane[-1].x <= zombie.x:
+            lane.append(zombie)  # Spawns enter at the right edge, so this keeps the order
+        else:
+            insort(lane, zombie, key=_zombie_x)
+        self.cells.setdefault((zombie.lane, zombie.col), []).append(zombie)
+
+    def remove(self, zombie):
+        self.lanes[zombie.lane].remove(zombie)
+        cell = self.cells[(zombie.lane, zombie.col)]
+        cell.remove(zombie)
+        if not cell:
+            del self.cells[(zombie.lane, zombie.col)]
+
+    def moved(self, zombie):
+        self.unsorted[zombie.lane] = True
+        # Zombies only walk left, so the cell changes once x drops below its left edge
+        if zombie.x < zombie.col * CELL_WIDTH:
+            key = (zombie.lane, zombie.col)
+            cell = self.cells[key]
+            cell.remove(zombie)
+            if not cell:
+                del self.cells[key]
+            zombie.col = int(zombie.x // CELL_WIDTH)
+            self.cells.setdefault((zombie.lane, zombie.col), []).append(zombie)
+
+    def count(self, lane):
+        return len(self.lanes[lane])
+
+    def in_lane(self, lane):
+        # Zombies in the lane ordered by x (leftmost first)
+        if self.unsorted[lane]:
+            self.lanes[lane].sort(key=_zombie_x)
+            self.unsorted[lane] = False
+        return self.lanes[lane]
+
+    def in_cell(self, lane, col):
+        return self.cells.get((lane, col), ())
+
+    def fork(self, copies):
+        clone = LaneIndex(0)
+        clone.lanes = [[copies[id(zombie)] for zombie in lane] for lane in self.lanes]
+        clone.unsorted = list(self.unsorted)
+        clone.cells = {key: [copies[id(zombie)] for zombie in cell] for key, cell in self.cells.items()}
+        return clone
+
+    def in_area(self, lane, col, radius):
+        found = []
+        for zombie_lane in range(lane - radius, lane + radius + 1):
+            for zombie_col in range(col - radius, col + radius + 1):
+                found.extend(self.cells.get((zombie_lane, zombie_col), ()))
+        return found
+
+
+# Plant Scheduler
+# Wakes each plant only on the tick its next shot or fuse is due instead of
+# counting timers on every plant every tick. Plants due on the same tick wake
+# in grid order, as the old per-tick loop visited them. A shooter whose lane
+# is empty when its shot comes due waits in that lane until a zombie enters.
+# Entries for plants that have left the grid are dropped when they come up.
+class PlantScheduler:
+    def __init__(self, lane_count):
+        self.heap = []  # (due tick, lane, col, sequence, plant)
+        self.waiting = [{} for _ in range(lane_count)]  # Per lane: col -> plant with a shot ready
+        self.sequence = 0  # Keeps heap entries comparable when a cell is replanted
+
+    def schedule(self, plant, tick):
+        plant.ready_tick = tick
+        heappush(self.heap, (tick, plant.lane, plant.col, self.sequence, plant))
+        self.sequence += 1
+
+    # A plant placed during `tick` acts fire_interval - 1 ticks later
+    def add(self, plant, tick):
+        fire_interval = PLANT_FIRE_INTERVAL[plant.type_id]
+        if fire_interval:
+            self.schedule(plant, tick + fire_interval - 1)
+
+    # Re-register a plant restored into a game about to run `tick`
+    def restore(self, plant, tick):
+        if not PLANT_FIRE_INTERVAL[plant.type_id]:
+            return
+        if plant.ready_tick >= tick:
+            self.schedule(plant, plant.ready_tick)
+        else:
+            self.wait_for_zombies(plant)
+
+    def fork(self, copies):
+        clone = PlantScheduler(0)
+        # Same entries in the same order, so the copy is still a valid heap
+        clone.heap = [entry[:4] + (fork_copy(entry[4], copies),) for entry in self.heap]
+        clone.waiting = [{col: fork_copy(plant, copies) for col, plant in waiting.items()} for waiting in self.waiting]
+        clone.sequence = self.sequence
+        return clone
+
+    def wait_for_zombies(self, plant):
+        self.waiting[plant.lane][plant.col] = plant
+
+    # Plants to wake during this tick, in grid order
+    def due(self, state):
+        woken = []
+        heap = self.heap
+        while heap and heap[0][0] <= state.tick:
+            _, lane, col, _, plant = heappop(heap)
+            if state.plants[lane][col] is plant:
+                woken.append((lane, col, plant))
+        for lane, waiting in enumerate(self.waiting):
+            if waiting and state.zombies_in_lane(lane):
+                woken.extend((lane, col, plant) for col, plant in waiting.items() if state.plants[lane][col] is plant)
+                waiting.clear()
+        woken.sort(key=_grid_order)
+        return [plant for _, _, plant in woken]
+
+
+def _grid_order(entry):
+    return entry[0], entry[1]
+
+
+# Game State
+# Zombies and bullets are stored as plain objects here; the methods below are
+# everything the rules need from that storage, so another engine can replace
+# it (see vector_engine.ArrayGameState).
+class GameState:
+    engine = "objects"
+    uid_stride = 1  # Lane shards hand out interleaved uids (see shards.py)
+
+    def __init__(
+        self, seed=None, wave_config=None, coins=10000, costs=None, endless=False, lanes=LANE_COUNT, columns=GRID_COLUMNS
+    ):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lane_count = lanes
+        self.columns = columns
+        self.width = columns * CELL_WIDTH  # Zombies enter here; bullets beyond it are gone
+        self.plants = [[None for _ in range(columns)] for _ in range(lanes)]
+        self.zombies = []
+        self.lane_index = LaneIndex(lanes)
+        self.bullets = []
+        self.coins = coins
+        self.coins_earned = 0  # Zombie rewards collected so far
+        self.plant_costs = dict(costs or plant_costs)  # Per game, so balance runs can try other prices
+        # spawn_zombies() counts the wave dicts down, so every game gets its own copy
+        self.waves = [dict(wave) for wave in (wave_config or waves)]
+        self.current_wave = 0
+        self.wave_zombies_remaining = wave_size(self.waves[0])
+        self.spawn_timer = 0
+        self.speed_multiplier = 1.0
+        self.tick = 0
+        self.next_uid = 1  # Zombies and bullets get a uid when they enter the game
+        self.result = None  # "win" or "lose" once the game is over
+        self.events = []  # Notable things that happened during the last step
+        self.profiler = Profiler()  # Disabled unless a front end switches it on
+        self.telemetry = Telemetry()  # Likewise
+        self.pool = EntityPool()
+        self.plant_scheduler = PlantScheduler(lanes)
+        self.thaws = []  # Heap of (thaw tick, uid, zombie), one entry per frozen zombie
+        self.endless = None  # endless.EndlessWaves streaming the waves, in endless mode
+        if endless:
+            from endless import EndlessWaves
+            self.endless = EndlessWaves(seed if seed is not None else self.rng.getrandbits(63))
+            self.endless.load(self, 0)
+
+    # Independent copy of the game, for lookahead search: stepping either one
+    # never affects the other. Every entity is copied once, flat; wave tables
+    # are copied because spawning counts them down, while prices and compiled
+    # endless schedules are never written and stay shared.
+    def fork(self):
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.rng = random.Random()
+        clone.rng.setstate(self.rng.getstate())
+        clone.waves = [dict(wave) for wave in self.waves]
+        clone.events = []
+        clone.profiler = Profiler()
+        clone.telemetry = Telemetry()
+        clone.telemetry.plants_seen = self.telemetry.plants_seen  # Copied plants keep their numbers
+        clone.pool = EntityPool()
+        if self.endless:
+            clone.endless = fork_copy(self.endless, {})
+        copies = {}
+        clone.plants = [[fork_copy(plant, copies) if plant else None for plant in row] for row in self.plants]
+        clone.plant_scheduler = self.plant_scheduler.fork(copies)
+        self._fork_entities(clone, copies)
+        return clone
+
+    # Give `clone` its own copy of the zombie and bullet storage
+    def _fork_entities(self, clone, copies):
+        self._fork_zombies(clone, copies)
+        clone.bullets = [fork_copy(bullet, copies) for bullet in self.bullets]
+
+    def _fork_zombies(self, clone, copies):
+        clone.zombies = [fork_copy(zombie, copies) for zombie in self.zombies]
+        for zombie in clone.zombies:
+            if zombie.eating_plant is not None:
+                zombie.eating_plant = fork_copy(zombie.eating_plant, copies)
+        clone.lane_index = self.lane_index.fork(copies)
+        clone.thaws = [(tick, uid, fork_copy(zombie, copies)) for tick, uid, zombie in self.thaws]
+
+    def new_uid(self):
+        uid = self.next_uid
+        self.next_uid += self.uid_stride
+        return uid
+
+    # A zombie of `zombie_class` entering `lane` at the right edge of the board
+    def spawn_zombie(self, zombie_class, lane):
+        zombie = self.pool.take(zombie_class, lane, self.speed_multiplier)
+        zombie.x = self.width
+        zombie.col = self.columns
+        self.add_zombie(zombie)
+
+    def add_zombie(self, zombie):
+        zombie.uid = self.new_uid()
+        self.zombies.append(zombie)
+        self.lane_index.add(zombie)
+
+    # A zombie that was just killed (health <= 0). It leaves the lane index
+    # at once and self.zombies at the next compact_zombies(), which whatever
+    # kills zombies calls once when it is done. Its fields stay readable until
+    # the pool hands it out again, at the next spawn.
+    def remove_zombie(self, zombie):
+        self.lane_index.remove(zombie)
+        self.pool.give(zombie)
+
+    def compact_zombies(self):
+        zombies = self.zombies
+        kept = 0
+        for zombie in zombies:
+            if zombie.health > 0:
+                zombies[kept] = zombie
+                kept += 1
+        del zombies[kept:]
+
+    # A shot from `plant`
+    def fire(self, plant, bullet):
+        bullet.source = self.telemetry.plant_id(plant)
+        self.add_bullet(bullet)
+        self.telemetry.shot(bullet.source, bullet.uid)
+
+    def add_bullet(self, bullet):
+        bullet.uid = self.new_uid()
+        self.bullets.append(bullet)
+
+    # A bullet from a snapshot, uid already set
+    def restore_bullet(self, bullet):
+        self.bullets.append(bullet)
+
+    def zombies_in_lane(self, lane):
+        return self.lane_index.count(lane)
+
+    def zombie_count(self):
+        return len(self.zombies)
+
+    def bullet_count(self):
+        return len(self.bullets)
+
+    def zombies_left(self):
+        return self.zombie_count() + self.wave_zombies_remaining
+
+    # `source`: telemetry number of the plant causing the damage
+    def damage_area(self, lane, col, radius, damage, source=0):
+        killed = False
+        for zombie in self.lane_index.in_area(lane, col, radius):
+            zombie.health -= damage  # Reduce zombie's health
+            self.telemetry.hit(source, zombie.uid, damage)
+            if zombie.health <= 0:  # Remove zombie if its health drops to 0 or below
+                self.remove_zombie(zombie)
+                self.telemetry.kill(source, zombie.uid, type(zombie), 0, self.coins)
+                killed = True
+        if killed:
+            self.compact_zombies()
+
+    # Ice hit: the zombie stands still until FREEZE_TICKS ticks it spends not
+    # eating have passed. A zombie hit again while frozen keeps its heap entry,
+    # which is re-queued at the later thaw tick when it comes up.
+    def freeze(self, zombie):
+        if not zombie.frozen and not ZOMBIE_IGNORES_FREEZE[zombie.type_id]:
+            heappush(self.thaws, (self.tick + FREEZE_TICKS, zombie.uid, zombie))
+        zombie.frozen = True
+        zombie.thaw_tick = self.tick + FREEZE_TICKS
+
+    def thaw_zombies(self):
+        thaws = self.thaws
+        while thaws and thaws[0][0] <= self.tick:
+            _, uid, zombie = heappop(thaws)
+            if zombie.uid != uid or zombie.health <= 0:
+                continue  # Killed while frozen (and maybe recycled since)
+            if zombie.thaw_tick > self.tick:
+                heappush(thaws, (zombie.thaw_tick, uid, zombie))  # Refrozen, or ate in the meantime
+            else:
+                zombie.frozen = False
+
+    # Update zombie speeds when transitioning waves
+    def update_zombie_speeds(self):
+        for zombie in self.zombies:
+            zombie.speed = zombie.base_speed * self.speed_multiplier
+
+    # (class, uid, x, y, frozen) per zombie and (class, uid, x, y) per bullet for
+    # renderers. An `area` (first lane, end lane, left x, right x), as given by
+    # camera.Camera.visible_area(), limits them to what a viewport can show.
+    def zombie_views(self, area=None):
+        for zombie in self._zombies_in(area):
+            yield type(zombie), zombie.uid, zombie.x, zombie.y, zombie.frozen
+
+    def bullet_views(self, area=None):
+        for bullet in self._bullets_in(area):
+            yield type(bullet), bullet.uid, bullet.x, bullet.y
+
+    # uid -> x of every zombie and bullet (in `area`), kept by renderers to
+    # interpolate between the last two ticks
+    def entity_positions(self, area=None):
+        positions = {zombie.uid: zombie.x for zombie in self._zombies_in(area)}
+        positions.update((bullet.uid, bullet.x) for bullet in self._bullets_in(area))
+        return positions
+
+    def _zombies_in(self, area):
+        if area is None:
+            return self.zombies
+        first, end, left, right = area
+        found = []
+        for lane in range(first, end):
+            zombies = self.lane_index.in_lane(lane)
+            found += zombies[bisect_left(zombies, left, key=_zombie_x):bisect_left(zombies, right, key=_zombie_x)]
+        found.sort(key=_uid)  # Back into spawn order, which is the order sprites overlap in
+        return found
+
+    def _bullets_in(self, area):
+        if area is None:
+            return self.bullets
+        first, end, left, right = area
+        top, bottom = first * LANE_HEIGHT, end * LANE_HEIGHT
+        return [bullet for bullet in self.bullets if top <= bullet.y < bottom and left <= bullet.x < right]
+
+    def zombie_reached_house(self):
+        for zombie in self.zombies:
+            if zombie.x <= 0:
+                return True
+        return False
+
+    # Move bullets and zombies and resolve their collisions. Nothing is copied,
+    # and nothing is removed from the bullet or zombie list one by one: the
+    # lists are compacted in place, keeping their order, once per tick in
+    # which anything left them.
+    def update_entities(self):
+        width = self.width
+
+        # Update bullets; only bullets flying in a zombie's own lane can be inside its hitbox
+        bullets = self.bullets
+        lane_bullets = [[] for _ in range(self.lane_count)]
+        expired = False
+        for bullet in bullets:
+            bullet.move()
+            if bullet.x > width:
+                expired = True
+            else:
+                lane_bullets[bullet.lane].append(bullet)
+        self.profiler.lap("bullets")
+
+        # Update zombies
+        killed = False
+        spent = None  # Bullets that hit something
+        for zombie in self.zombies:
+            zombie.detect_plant(self)  # Check if there's a plant in front
+            zombie.move(self)          # Move or eat plant
+
+            # Check for collisions with bullets, in one pass over the lane: the
+            # zombie does not move meanwhile, so a bullet that misses it once
+            # misses it for the rest of the scan. The bullets that hit leave
+            # the lane's list together afterwards.
+            in_lane = lane_bullets[zombie.lane]
+            hits = None
+            for bullet in in_lane:
+                if not (zombie.x < bullet.x < zombie.x + CELL_WIDTH - 30
+                        and zombie.y < bullet.y < zombie.y + LANE_HEIGHT - 20):
+                    continue
+                if hits is None:
+                    hits = []
+                hits.append(bullet)
+                if BULLET_FREEZES[bullet.type_id]:
+                    self.freeze(zombie)
+                    self.telemetry.freeze(bullet.source, zombie.uid)
+                else:
+                    zombie.health -= bullet.damage
+                    self.telemetry.hit(bullet.source, zombie.uid, bullet.damage)
+                if zombie.health <= 0:
+                    self.coins += zombie.reward  # Add coins based on zombie reward
+                    self.coins_earned += zombie.reward
+                    self.remove_zombie(zombie)
+                    self.telemetry.kill(bullet.source, zombie.uid, type(zombie), zombie.reward, self.coins)
+                    killed = True
+                    break
+            if hits:
+                if spent is None:
+                    spent = set()
+                spent.update(hits)
+                lane_bullets[zombie.lane] = [bullet for bullet in in_lane if bullet not in spent]
+        if killed:
+            self.compact_zombies()
+
+        if expired or spent:
+            pool = self.pool
+            kept = 0
+            for bullet in bullets:
+                if bullet.x > width or spent and bullet in spent:
+                    pool.give(bullet)
+                else:
+                    bullets[kept] = bullet
+                    kept += 1
+            del bullets[kept:]
+        self.profiler.lap("collisions")  # Zombie moves and bullet hits share one loop here
+
+        self.thaw_zombies()
+        self.profiler.lap("thaw")
+
+
+ENGINES = ("objects", "numpy", "analytic")
+EXACT_ENGINES = ("objects", "numpy")  # Play the same games tick for tick
+
+
+# Create a game on the requested engine. The numpy engine keeps zombies and
+# bullets in arrays; the analytic engine computes bullet impacts instead of
+# stepping bullets (projectiles.py). Both are only imported when asked for.
+def new_game(engine="objects", **kwargs):
+    if engine == "numpy":
+        from vector_engine import ArrayGameState
+        return ArrayGameState(**kwargs)
+    if engine == "analytic":
+        from projectiles import AnalyticGameState
+        return AnalyticGameState(**kwargs)
+    if engine != "objects":
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    return GameState(**kwargs)
+
+
+# Apply a player action (placement or shovel)
+def apply_input(state, action):
+    if action[0] == SHOVEL:
+        _, lane, col = action
+        # Remove plant if shovel is used
+        if 0 <= lane < state.lane_count and 0 <= col < state.columns and state.plants[lane][col]:
+            state.plants[lane][col] = None
+    elif action[0] == PLACE:
+        _, plant_type, lane, col = action
+        if plant_type not in state.plant_costs:
+            return
+        if state.coins >= state.plant_costs[plant_type]:  # Check if player has enough coins
+            if 0 <= lane < state.lane_count and 0 <= col < state.columns and not state.plants[lane][col]:
+                plant = state.plants[lane][col] = plant_classes[plant_type](lane, col)
+                state.plant_scheduler.add(plant, state.tick)
+                state.coins -= state.plant_costs[plant_type]  # Deduct coins
+                state.telemetry.place(plant, state.plant_costs[plant_type], state.coins)
+        else:
+            state.events.append(("not_enough_coins", plant_type))
+
+
+# Spawn zombies based on wave configuration
+def spawn_zombies(state):
+    state.spawn_timer += 1
+    if state.spawn_timer >= SPAWN_INTERVAL and state.wave_zombies_remaining > 0:
+        wave = state.waves[state.current_wave]
+        zombie_type = state.rng.choices(ZOMBIE_TYPES, weights=[wave.get(name, 0) for name in ZOMBIE_TYPES])[0]
+        if wave[zombie_type] > 0:
+            lane = state.rng.randint(0, state.lane_count - 1)
+            state.spawn_zombie(zombie_classes[zombie_type], lane)
+            wave[zombie_type] -= 1
+            state.wave_zombies_remaining -= 1
+            state.spawn_timer = 0  # Reset timer after spawning
+
+
+# Check wave completion and transition
+def check_wave_completion(state):
+    if state.wave_zombies_remaining == 0 and not state.zombie_count():
+        state.current_wave += 1
+        if state.current_wave < len(state.waves):
+            state.wave_zombies_remaining = wave_size(state.waves[state.current_wave])
+            state.speed_multiplier = state.waves[state.current_wave]["speed_multiplier"]  # Use fixed multiplier
+            state.update_zombie_speeds()
+            state.events.append(("wave", state.current_wave))
+            state.telemetry.wave(state.current_wave)
+        else:
+            state.result = "win"
+
+
+# Advance the game by one tick
+def step(state, inputs=()):
+    state.events = []
+    if state.result:
+        return state.events
+    profiler = state.profiler
+    profiler.resume()
+
+    for action in inputs:
+        apply_input(state, action)
+    profiler.lap("inputs")
+
+    # Wake the plants whose shot or fuse is due
+    for plant in state.plant_scheduler.due(state):
+        plant.auto_shoot(state)
+    profiler.lap("auto_shoot")
+
+    # Move bullets and zombies, resolve hits
+    state.update_entities()
+
+    if state.endless:
+        # Stream spawns and wave changes from the endless generator
+        state.endless.update(state)
+        profiler.lap("spawn")
+    else:
+        # Spawn new zombies
+        spawn_zombies(state)
+        profiler.lap("spawn")
+
+        # Check for wave completion
+        check_wave_completion(state)
+
+    # Check for losing condition
+    if not state.result and state.zombie_reached_house():
+        state.result = "lose"
+    profiler.lap("waves")
+
+    state.telemetry.end_tick(state.tick)
+    state.tick += 1
+    return state.events
+
+
+# Step a game until it ends or max_ticks have run. `strategy` is an optional
+# callable(state) returning the inputs for the coming tick.
+def run(state, max_ticks=None, strategy=None):
+    while not state.result and (max_ticks is None or state.tick < max_ticks):
+        step(state, strategy(state) if strategy else ())
+    return state
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # The numpy engine works on the classes of the imported module, not on
+    # this script's own copies
+    from simulation import new_game, run
+
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    engine = sys.argv[2] if len(sys.argv) > 2 else "objects"
+    state = new_game(engine, seed=seed)
+    start = time.perf_counter()
+    run(state, max_ticks=200000)
+    elapsed = time.perf_counter() - start
+    print(f"result={state.result} ticks={state.tick} coins={state.coins} "
+          f"({state.tick / elapsed:.0f} ticks/sec)")
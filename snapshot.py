@@ -0,0 +1,447 @@
+import heapq
+import random
+import struct
+import sys
+import zlib
+from array import array
+from collections import deque
+
+from simulation import (
+    CELL_WIDTH,
+    ENGINES,
+    LANE_HEIGHT,
+    RESULTS,
+    bullet_classes,
+    new_game,
+    plant_classes,
+    zombie_classes,
+)
+from units import ZOMBIE_IGNORES_FREEZE
+
+# Save-state snapshots
+#
+#   b"PVMS", u16 version, u8 engine, u8 flags (1 = zlib body)
+#   body:
+#     scalars   tick, next_uid, coins, coins_earned, current_wave,
+#               wave_zombies_remaining, spawn_timer, speed_multiplier, result, seed
+#     board     u32 lanes, u32 columns
+#     costs     i32 price per plant type, in plant_classes order
+#     waves     u16 count, then per wave: speed_multiplier, i32 count per
+#               zombie type (-1 when the type is absent from the wave)
+#     endless   u8 flag, then (endless mode only) i64 seed, i32 wave,
+#               i64 tick the wave began, i32 spawns of the wave already made
+#     rng       625 x u32 Mersenne Twister state, gauss_next flag + value
+#     plants, zombies, bullets
+#               u32 count, then one packed little-endian column per field
+#
+# Plants are written as a table that also holds plants a zombie is still
+# eating after they left the grid (shovelled), and zombies refer to it by
+# index. Plant shots and zombie thaws are stored as the tick they are due,
+# and the restored game's schedulers are rebuilt from them. Snapshots restore
+# into either engine.
+#
+# A snapshot can also be restored into a lane shard, keeping only the
+# entities of some lanes, and the snapshots of all shards merged back into one
+# game (see shards.py).
+
+MAGIC = b"PVMS"
+VERSION = 5
+COMPRESSED = 1
+
+# Type id -> class; kinds are stored as type ids
+PLANT_KINDS = tuple(plant_classes.values())
+ZOMBIE_KINDS = tuple(zombie_classes.values())
+BULLET_KINDS = tuple(bullet_classes.values())
+
+PLANT_COLUMNS = (("kind", "B"), ("lane", "i"), ("col", "i"), ("on_grid", "B"), ("health", "d"), ("ready_tick", "q"))
+ZOMBIE_COLUMNS = (
+    ("kind", "B"), ("uid", "q"), ("lane", "i"), ("x", "d"), ("y", "d"), ("health", "q"),
+    ("base_speed", "d"), ("speed", "d"), ("frozen", "B"), ("thaw_tick", "q"), ("reward", "i"),
+    ("eating", "i"),  # Index into the plant table, -1 when not eating
+)
+BULLET_COLUMNS = (("kind", "B"), ("uid", "q"), ("x", "d"), ("y", "d"), ("speed", "d"), ("damage", "i"))
+
+# Little-endian NumPy dtypes matching the array typecodes above
+NUMPY_DTYPES = {"B": "<u1", "i": "<i4", "q": "<i8", "d": "<f8"}
+
+SCALARS = struct.Struct("<qqqqiiidBBq")
+SCALAR_NAMES = (
+    "tick", "next_uid", "coins", "coins_earned", "current_wave", "wave_zombies_remaining", "spawn_timer",
+    "speed_multiplier", "result", "has_seed", "seed",
+)
+BOARD = struct.Struct("<II")
+COSTS = struct.Struct(f"<{len(plant_classes)}i")
+ENDLESS = struct.Struct("<qiqi")
+RNG_STATE = struct.Struct("<625I")
+HEADER = struct.Struct("<4sHBB")
+
+
+def _pack_columns(out, columns, values):
+    count = len(values[columns[0][0]])
+    out.append(struct.pack("<I", count))
+    for name, typecode in columns:
+        column = values[name]
+        if hasattr(column, "dtype"):  # NumPy column from the array engine
+            out.append(column.astype(NUMPY_DTYPES[typecode]).tobytes())
+            continue
+        packed = array(typecode, column)
+        if sys.byteorder == "big":
+            packed.byteswap()
+        out.append(packed.tobytes())
+
+
+def _unpack_columns(data, pos, columns):
+    (count,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    values = {}
+    for name, typecode in columns:
+        packed = array(typecode)
+        end = pos + count * packed.itemsize
+        packed.frombytes(data[pos:end])
+        if sys.byteorder == "big":
+            packed.byteswap()
+        values[name] = packed
+        pos = end
+    return count, values, pos
+
+
+# The rows of unpacked columns where `keep` is true
+def _select(values, keep):
+    return {
+        name: array(column.typecode, (value for value, kept in zip(column, keep) if kept))
+        for name, column in values.items()
+    }
+
+
+def _plant_table(state, eaten):
+    # Grid plants first, then any off-grid plants that zombies are still eating
+    table = [plant for row in state.plants for plant in row if plant]
+    index = {id(plant): i for i, plant in enumerate(table)}
+    for plant in eaten:
+        if plant is not None and id(plant) not in index:
+            index[id(plant)] = len(table)
+            table.append(plant)
+    on_grid = [state.plants[plant.lane][plant.col] is plant for plant in table]
+    columns = {
+        "kind": [plant.type_id for plant in table],
+        "lane": [plant.lane for plant in table],
+        "col": [plant.col for plant in table],
+        "on_grid": on_grid,
+        "health": [plant.health for plant in table],
+        "ready_tick": [plant.ready_tick for plant in table],
+    }
+    return columns, index
+
+
+def _object_columns(state):
+    zombies = state.zombies
+    bullets = state.in_flight() if state.engine == "analytic" else state.bullets
+    plants, index = _plant_table(state, [zombie.eating_plant for zombie in zombies])
+    zombie_columns = {
+        "kind": [zombie.type_id for zombie in zombies],
+        "uid": [zombie.uid for zombie in zombies],
+        "lane": [zombie.lane for zombie in zombies],
+        "x": [zombie.x for zombie in zombies],
+        "y": [zombie.y for zombie in zombies],
+        "health": [zombie.health for zombie in zombies],
+        "base_speed": [zombie.base_speed for zombie in zombies],
+        "speed": [zombie.speed for zombie in zombies],
+        "frozen": [zombie.frozen for zombie in zombies],
+        "thaw_tick": [zombie.thaw_tick for zombie in zombies],
+        "reward": [zombie.reward for zombie in zombies],
+        "eating": [index[id(zombie.eating_plant)] if zombie.eating_plant else -1 for zombie in zombies],
+    }
+    bullet_columns = {
+        "kind": [bullet.type_id for bullet in bullets],
+        "uid": [bullet.uid for bullet in bullets],
+        "x": [bullet.x for bullet in bullets],
+        "y": [bullet.y for bullet in bullets],
+        "speed": [bullet.speed for bullet in bullets],
+        "damage": [bullet.damage for bullet in bullets],
+    }
+    return plants, zombie_columns, bullet_columns
+
+
+def _array_columns(state):
+    z, b = state.zombie_arrays, state.bullet_arrays
+    plants, index = _plant_table(state, z.eating[:z.n])
+    zombie_columns = {name: getattr(z, name)[:z.n] for name, _ in ZOMBIE_COLUMNS if name != "eating"}
+    zombie_columns["eating"] = [index[id(plant)] if plant is not None else -1 for plant in z.eating[:z.n]]
+    bullet_columns = {name: getattr(b, name)[:b.n] for name, _ in BULLET_COLUMNS}
+    return plants, zombie_columns, bullet_columns
+
+
+def take_snapshot(state, compress=False):
+    body = [SCALARS.pack(
+        state.tick,
+        state.next_uid,
+        state.coins,
+        state.coins_earned,
+        state.current_wave,
+        state.wave_zombies_remaining,
+        state.spawn_timer,
+        state.speed_multiplier,
+        RESULTS.index(state.result),
+        state.seed is not None,
+        state.seed or 0,
+    )]
+    body.append(BOARD.pack(state.lane_count, state.columns))
+    body.append(COSTS.pack(*(state.plant_costs[name] for name in plant_classes)))
+
+    body.append(struct.pack("<H", len(state.waves)))
+    for wave in state.waves:
+        counts = [wave.get(name, -1) for name in zombie_classes]
+        body.append(struct.pack(f"<d{len(counts)}i", wave["speed_multiplier"], *counts))
+
+    endless = state.endless
+    body.append(struct.pack("<B", endless is not None))
+    if endless:
+        body.append(ENDLESS.pack(endless.seed, endless.wave, endless.wave_start, endless.position))
+
+    _, internal, gauss_next = state.rng.getstate()
+    body.append(RNG_STATE.pack(*internal))
+    body.append(struct.pack("<Bd", gauss_next is not None, gauss_next or 0.0))
+
+    if state.engine == "numpy":
+        plants, zombies, bullets = _array_columns(state)
+    else:
+        plants, zombies, bullets = _object_columns(state)
+    _pack_columns(body, PLANT_COLUMNS, plants)
+    _pack_columns(body, ZOMBIE_COLUMNS, zombies)
+    _pack_columns(body, BULLET_COLUMNS, bullets)
+
+    body = b"".join(body)
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= COMPRESSED
+    return HEADER.pack(MAGIC, VERSION, ENGINES.index(state.engine), flags) + body
+
+
+def _body(blob):
+    magic, version, engine_code, flags = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a snapshot")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    data = blob[HEADER.size:]
+    if flags & COMPRESSED:
+        data = zlib.decompress(data)
+    return engine_code, data
+
+
+# Position of the plant table in a snapshot body
+def _entities_offset(data):
+    pos = SCALARS.size + BOARD.size + COSTS.size
+    (wave_count,) = struct.unpack_from("<H", data, pos)
+    pos += 2 + wave_count * struct.calcsize(f"<d{len(zombie_classes)}i")
+    (endless,) = struct.unpack_from("<B", data, pos)
+    pos += 1 + (ENDLESS.size if endless else 0)
+    return pos + RNG_STATE.size + 9
+
+
+# The scalars (by SCALAR_NAMES) and the plant, zombie and bullet columns of a
+# snapshot, read without building a game from it
+def read_tables(blob):
+    _, data = _body(blob)
+    scalars = dict(zip(SCALAR_NAMES, SCALARS.unpack_from(data, 0)))
+    pos = _entities_offset(data)
+    _, plants, pos = _unpack_columns(data, pos, PLANT_COLUMNS)
+    _, zombies, pos = _unpack_columns(data, pos, ZOMBIE_COLUMNS)
+    _, bullets, pos = _unpack_columns(data, pos, BULLET_COLUMNS)
+    return scalars, plants, zombies, bullets
+
+
+# With `keep_lanes` (a range), only the plants, zombies and bullets in those
+# lanes are restored: the game of one lane shard
+def restore_snapshot(blob, engine=None, keep_lanes=None):
+    engine_code, data = _body(blob)
+
+    (tick, next_uid, coins, coins_earned, current_wave, wave_zombies_remaining, spawn_timer,
+     speed_multiplier, result, has_seed, seed) = SCALARS.unpack_from(data, 0)
+    pos = SCALARS.size
+    lanes, columns = BOARD.unpack_from(data, pos)
+    pos += BOARD.size
+    costs = dict(zip(plant_classes, COSTS.unpack_from(data, pos)))
+    pos += COSTS.size
+
+    (wave_count,) = struct.unpack_from("<H", data, pos)
+    pos += 2
+    wave_format = struct.Struct(f"<d{len(zombie_classes)}i")
+    waves = []
+    for _ in range(wave_count):
+        multiplier, *counts = wave_format.unpack_from(data, pos)
+        pos += wave_format.size
+        wave = {name: count for name, count in zip(zombie_classes, counts) if count >= 0}
+        wave["speed_multiplier"] = multiplier
+        waves.append(wave)
+
+    (endless,) = struct.unpack_from("<B", data, pos)
+    pos += 1
+    if endless:
+        endless = ENDLESS.unpack_from(data, pos)
+        pos += ENDLESS.size
+
+    internal = RNG_STATE.unpack_from(data, pos)
+    pos += RNG_STATE.size
+    has_gauss, gauss = struct.unpack_from("<Bd", data, pos)
+    pos += 9
+
+    _, plants, pos = _unpack_columns(data, pos, PLANT_COLUMNS)
+    _, zombies, pos = _unpack_columns(data, pos, ZOMBIE_COLUMNS)
+    _, bullets, pos = _unpack_columns(data, pos, BULLET_COLUMNS)
+    if keep_lanes is not None:
+        # Plants of other lanes stay in the table (unused) so eating indices still hold
+        on_grid = zip(plants["on_grid"], plants["lane"])
+        plants["on_grid"] = array("B", (placed and lane in keep_lanes for placed, lane in on_grid))
+        zombies = _select(zombies, [lane in keep_lanes for lane in zombies["lane"]])
+        bullets = _select(bullets, [int(y // LANE_HEIGHT) in keep_lanes for y in bullets["y"]])
+
+    state = new_game(
+        engine or ENGINES[engine_code],
+        seed=seed if has_seed else None,
+        wave_config=waves,
+        coins=coins,
+        costs=costs,
+        endless=bool(endless),
+        lanes=lanes,
+        columns=columns,
+    )
+    state.rng = random.Random()
+    state.rng.setstate((3, internal, gauss if has_gauss else None))
+    state.tick = tick
+    state.coins_earned = coins_earned
+    state.next_uid = next_uid
+    state.current_wave = current_wave
+    state.wave_zombies_remaining = wave_zombies_remaining
+    state.spawn_timer = spawn_timer
+    state.speed_multiplier = speed_multiplier
+    state.result = RESULTS[result]
+    if endless:
+        endless_seed, wave, wave_start, position = endless
+        state.endless.seed = endless_seed
+        state.endless.load(state, wave, wave_start, position)
+
+    plant_table = []
+    for kind, lane, col, on_grid, health, ready_tick in zip(*(plants[name] for name, _ in PLANT_COLUMNS)):
+        plant = PLANT_KINDS[kind](lane, col)
+        plant.health = health
+        plant.ready_tick = ready_tick
+        if on_grid:
+            state.plants[lane][col] = plant
+            state.plant_scheduler.restore(plant, tick)
+        plant_table.append(plant)
+
+    if state.engine == "numpy":
+        _restore_arrays(state, zombies, bullets, plant_table)
+    else:
+        _restore_objects(state, zombies, bullets, plant_table)
+    return state
+
+
+# One snapshot from the pieces of a game split into lane shards: everything
+# but the entities comes from `base`, and the plants, zombies and bullets of
+# all `parts` are joined, zombies and bullets back in uid order
+def merge_snapshots(base, parts):
+    engine_code, data = _body(base)
+    scalars = list(SCALARS.unpack_from(data, 0))
+    merged = [{name: [] for name, _ in columns} for columns in (PLANT_COLUMNS, ZOMBIE_COLUMNS, BULLET_COLUMNS)]
+    plants, zombies, bullets = merged
+    for part in parts:
+        _, part_data = _body(part)
+        scalars[1] = max(scalars[1], SCALARS.unpack_from(part_data, 0)[1])  # next_uid
+        pos = _entities_offset(part_data)
+        offset = len(plants["kind"])
+        for values, columns in zip(merged, (PLANT_COLUMNS, ZOMBIE_COLUMNS, BULLET_COLUMNS)):
+            _, part_values, pos = _unpack_columns(part_data, pos, columns)
+            if columns is ZOMBIE_COLUMNS:
+                part_values["eating"] = [eating + offset if eating >= 0 else -1 for eating in part_values["eating"]]
+            for name, column in part_values.items():
+                values[name].extend(column)
+    for values in (zombies, bullets):
+        order = sorted(range(len(values["uid"])), key=values["uid"].__getitem__)
+        for name, column in values.items():
+            values[name] = [column[i] for i in order]
+
+    body = [SCALARS.pack(*scalars), data[SCALARS.size:_entities_offset(data)]]
+    _pack_columns(body, PLANT_COLUMNS, plants)
+    _pack_columns(body, ZOMBIE_COLUMNS, zombies)
+    _pack_columns(body, BULLET_COLUMNS, bullets)
+    return HEADER.pack(MAGIC, VERSION, engine_code, 0) + b"".join(body)
+
+
+def _restore_objects(state, zombies, bullets, plant_table):
+    for row in zip(*(zombies[name] for name, _ in ZOMBIE_COLUMNS)):
+        kind, uid, lane, x, y, health, base_speed, speed, frozen, thaw_tick, reward, eating = row
+        zombie = ZOMBIE_KINDS[kind](lane)
+        zombie.uid = uid
+        zombie.x = x
+        zombie.y = y
+        zombie.col = int(x // CELL_WIDTH)
+        zombie.health = health
+        zombie.base_speed = base_speed
+        zombie.speed = speed
+        zombie.frozen = bool(frozen)
+        zombie.thaw_tick = thaw_tick
+        zombie.reward = reward
+        zombie.eating_plant = plant_table[eating] if eating >= 0 else None
+        state.zombies.append(zombie)
+        state.lane_index.add(zombie)
+        if zombie.frozen and not ZOMBIE_IGNORES_FREEZE[zombie.type_id]:
+            heapq.heappush(state.thaws, (thaw_tick, uid, zombie))
+
+    for kind, uid, x, y, speed, damage in zip(*(bullets[name] for name, _ in BULLET_COLUMNS)):
+        bullet = BULLET_KINDS[kind](x, y)
+        bullet.uid = uid
+        bullet.speed = speed
+        bullet.damage = damage
+        state.restore_bullet(bullet)
+
+
+def _restore_arrays(state, zombies, bullets, plant_table):
+    import numpy as np
+
+    from vector_engine import FREEZES, IGNORES_FREEZE
+
+    def fill(arrays, columns, values):
+        count = len(values[columns[0][0]])
+        if count > arrays.capacity:
+            arrays._grow(count)
+        for name, _ in columns:
+            getattr(arrays, name)[:count] = np.frombuffer(values[name], dtype=values[name].typecode)
+        arrays.n = count
+
+    z, b = state.zombie_arrays, state.bullet_arrays
+    fill(z, [column for column in ZOMBIE_COLUMNS if column[0] != "eating"], zombies)
+    z.col[:z.n] = np.floor_divide(z.x[:z.n], CELL_WIDTH)
+    for i, eating in enumerate(zombies["eating"]):
+        z.eating[i] = plant_table[eating] if eating >= 0 else None
+        z.is_eating[i] = eating >= 0
+    thawing = np.flatnonzero(z.frozen[:z.n] & ~IGNORES_FREEZE[z.kind[:z.n]])
+    state.thaws = [(int(z.thaw_tick[i]), int(z.uid[i])) for i in thawing]
+    heapq.heapify(state.thaws)
+    fill(b, BULLET_COLUMNS, bullets)
+    b.lane[:b.n] = b.y[:b.n] // LANE_HEIGHT
+    b.freezes[:b.n] = FREEZES[b.kind[:b.n]]
+    state.lane_counts = np.bincount(z.lane[:z.n], minlength=len(state.lane_counts))
+
+
+# Snapshot Ring
+# Keeps the most recent snapshots for rolling back a few ticks.
+class SnapshotRing:
+    def __init__(self, capacity=600):
+        self.snapshots = deque(maxlen=capacity)
+
+    def push(self, state):
+        self.snapshots.append((state.tick, take_snapshot(state)))
+
+    def rollback(self, tick):
+        # Restore the newest snapshot taken at or before `tick` and drop the later ones
+        while self.snapshots and self.snapshots[-1][0] > tick:
+            self.snapshots.pop()
+        if not self.snapshots:
+            raise LookupError(f"No snapshot at or before tick {tick}")
+        return restore_snapshot(self.snapshots[-1][1])
+
+    def memory_bytes(self):
+        return sum(len(blob) for _, blob in self.snapshots)
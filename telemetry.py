@@ -0,0 +1,274 @@
+import gzip
+import json
+import threading
+from collections import deque
+
+# Gameplay telemetry: structured events (shots, hits, freezes, kills with the
+# plant that made them, plants eaten, coin changes, wave changes), written
+# to gzipped JSON lines for per-plant damage and economy analysis. Like the
+# profiler, every game carries one and its hooks stay in place permanently:
+# while it is off, a hook is a single attribute check.
+#
+# The simulation only appends tuples to a list during a tick. step() hands
+# each tick's list to a bounded ring buffer, and a background thread takes
+# the buffered ticks in batches, formats and compresses them. If the writer
+# falls behind, the oldest buffered ticks are dropped (and counted) rather
+# than slowing the game down.
+
+RING_EVENTS = 250_000  # Events buffered before the oldest ticks are dropped (tens of MB)
+BATCH_EVENTS = 20_000  # The writer wakes once this many are buffered...
+FLUSH_SECONDS = 1.0    # ...or this long after it last wrote
+COMPRESS_LEVEL = 1     # gzip level: the writer shares the interpreter with the game
+
+# Event name -> fields after "tick" and "event". Plants are numbered in the
+# order they are first seen in a file ("place" names the kind and cell of
+# each, at cost 0 for plants already on the board when the file began);
+# plant 0 stands for no plant (e.g. a bullet restored from a snapshot).
+EVENTS = {
+    "place": ("plant", "kind", "lane", "col", "cost"),
+    "shot": ("plant", "bullet"),
+    "hit": ("plant", "zombie", "damage"),
+    "freeze": ("plant", "zombie"),
+    "kill": ("plant", "zombie", "kind", "reward"),  # Reward is 0 for CherryBomb kills, which pay nothing
+    "eaten": ("plant",),
+    "coins": ("delta", "balance"),
+    "wave": ("wave",),
+}
+STRING_FIELDS = {"kind"}
+
+# One %-format line per event: tick first, then the fields in EVENTS order
+LINE_FORMATS = [
+    "{" + ", ".join(
+        [f'"tick": %s, "event": "{name}"']
+        + [f'"{field}": "%s"' if field in STRING_FIELDS else f'"{field}": %s' for field in fields]
+    ) + "}\n"
+    for name, fields in EVENTS.items()
+]
+PLACE, SHOT, HIT, FREEZE, KILL, EATEN, COINS, WAVE = range(len(EVENTS))
+
+
+# Telemetry
+class Telemetry:
+    def __init__(self, capacity=RING_EVENTS, batch=BATCH_EVENTS):
+        self.enabled = False
+        self.capacity = capacity
+        self.batch = batch
+        self.pending = []  # Events of the tick being simulated
+        self.ring = deque()  # (tick, events) waiting for the writer
+        self.buffered = 0
+        self.dropped = 0  # Events lost because the ring was full
+        self.written = 0
+        self.plants_seen = 0  # Numbers handed out; each plant keeps its own in plant.telemetry_id
+        self.session_start = 0  # plants_seen when the current file (or capture) began
+        self.ready = threading.Condition()
+        self.closing = False
+        self.writer = None
+        self.out = None
+
+    # Copies (forks, deep copies of a game) start with telemetry off, numbering
+    # on from the plants the copied ones already carry
+    def __deepcopy__(self, memo):
+        copy = Telemetry(self.capacity, self.batch)
+        copy.plants_seen = self.plants_seen
+        return copy
+
+    def start(self, path):
+        self.session_start = self.plants_seen
+        self.out = gzip.open(path, "wt", compresslevel=COMPRESS_LEVEL)
+        self.closing = False
+        self.writer = threading.Thread(target=self._write_loop, name="telemetry", daemon=True)
+        self.writer.start()
+        self.enabled = True
+
+    # Keep the events in memory instead of writing them; take() hands over
+    # the ticks buffered since the last call (used by golden.py)
+    def capture(self):
+        self.session_start = self.plants_seen
+        self.enabled = True
+
+    def take(self):
+        with self.ready:
+            ticks = list(self.ring)
+            self.ring.clear()
+            self.buffered = 0
+        return ticks
+
+    # Write out everything still buffered and close the file
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.pending = []  # The unfinished tick's events
+        if self.writer is None:
+            return  # Capturing
+        with self.ready:
+            self.closing = True
+            self.ready.notify()
+        self.writer.join()
+        self.out.close()
+        self.writer = self.out = None
+
+    def plant_id(self, plant):
+        if not self.enabled:
+            return 0
+        number = plant.telemetry_id
+        if number <= self.session_start:
+            # Placed before telemetry started (or restored), or numbered in an
+            # earlier file: announced under a new number at no cost
+            number = self._register(plant, 0)
+        return number
+
+    def _register(self, plant, cost):
+        self.plants_seen += 1
+        number = plant.telemetry_id = self.plants_seen
+        self.pending.append((PLACE, number, type(plant).__name__, plant.lane, plant.col, cost))
+        return number
+
+    def place(self, plant, cost, balance):
+        if self.enabled:
+            self._register(plant, cost)
+            self.pending.append((COINS, -cost, balance))
+
+    def shot(self, source, bullet):
+        if self.enabled:
+            self.pending.append((SHOT, source, bullet))
+
+    def hit(self, source, zombie, damage):
+        if self.enabled:
+            self.pending.append((HIT, source, zombie, damage))
+
+    def freeze(self, source, zombie):
+        if self.enabled:
+            self.pending.append((FREEZE, source, zombie))
+
+    def kill(self, source, zombie, kind, reward, balance):
+        if self.enabled:
+            self.pending.append((KILL, source, zombie, kind.__name__, reward))
+            if reward:
+                self.pending.append((COINS, reward, balance))
+
+    def eaten(self, plant):
+        if self.enabled:
+            self.pending.append((EATEN, self.plant_id(plant)))
+
+    def wave(self, wave):
+        if self.enabled:
+            self.pending.append((WAVE, wave))
+
+    # Hand this tick's events to the writer
+    def end_tick(self, tick):
+        if not self.pending:
+            return
+        events, self.pending = self.pending, []
+        with self.ready:
+            self.ring.append((tick, events))
+            self.buffered += len(events)
+            while self.buffered > self.capacity:
+                _, lost = self.ring.popleft()
+                self.buffered -= len(lost)
+                self.dropped += len(lost)
+            if self.buffered >= self.batch:
+                self.ready.notify()
+
+    def _write_loop(self):
+        while True:
+            with self.ready:
+                self.ready.wait_for(lambda: self.closing or self.buffered >= self.batch, FLUSH_SECONDS)
+                ticks = list(self.ring)
+                self.ring.clear()
+                self.buffered = 0
+                closing = self.closing
+            lines = [LINE_FORMATS[event[0]] % ((tick,) + event[1:]) for tick, events in ticks for event in events]
+            self.out.write("".join(lines))
+            self.written += len(lines)
+            if closing:
+                return
+
+
+# Events of a telemetry file, as dicts
+def read_events(path):
+    with gzip.open(path, "rt") as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+# Per plant: kind, cell, cost, shots, damage dealt (overkill included),
+# freezes, kills, coins from kills, and the ticks it was placed and eaten
+def plant_report(events):
+    plants = {}
+    last_tick = 0
+    for event in events:
+        last_tick = event["tick"]
+        name = event["event"]
+        if name == "place":
+            plants[event["plant"]] = {
+                "kind": event["kind"], "lane": event["lane"], "col": event["col"], "cost": event["cost"],
+                "placed": event["tick"], "eaten": None,
+                "shots": 0, "damage": 0, "freezes": 0, "kills": 0, "earned": 0,
+            }
+            continue
+        plant = plants.get(event.get("plant"))
+        if plant is None:
+            continue
+        if name == "shot":
+            plant["shots"] += 1
+        elif name == "hit":
+            plant["damage"] += event["damage"]
+        elif name == "freeze":
+            plant["freezes"] += 1
+        elif name == "kill":
+            plant["kills"] += 1
+            plant["earned"] += event["reward"]
+        elif name == "eaten":
+            plant["eaten"] = event["tick"]
+    for plant in plants.values():
+        plant["ticks"] = (plant["eaten"] if plant["eaten"] is not None else last_tick) - plant["placed"] + 1
+    return plants
+
+
+# Per plant kind: plants placed, coins spent and earned, and damage per second alive
+def kind_report(plants, tick_rate):
+    kinds = {}
+    for plant in plants.values():
+        row = kinds.setdefault(plant["kind"], {"plants": 0, "cost": 0, "earned": 0, "damage": 0, "kills": 0, "ticks": 0})
+        row["plants"] += 1
+        for field in ("cost", "earned", "damage", "kills", "ticks"):
+            row[field] += plant[field]
+    for row in kinds.values():
+        row["dps"] = row["damage"] * tick_rate / row["ticks"] if row["ticks"] else 0.0
+    return kinds
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from balance import STRATEGIES, ScriptedStrategy
+    from simulation import ENGINES, TICK_RATE, new_game, run
+
+    parser = argparse.ArgumentParser(description="Record gameplay telemetry, or report on a recording")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="play one scripted game and record its telemetry")
+    record.add_argument("path")
+    record.add_argument("--seed", type=int, default=0)
+    record.add_argument("--engine", choices=ENGINES, default="objects")
+    record.add_argument("--strategy", choices=STRATEGIES, default="freeze_and_wall")
+    report = commands.add_parser("report", help="coins and damage per plant kind")
+    report.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        state = new_game(args.engine, seed=args.seed)
+        state.telemetry.start(args.path)
+        start = time.perf_counter()
+        run(state, max_ticks=10 * 60 * TICK_RATE, strategy=ScriptedStrategy(STRATEGIES[args.strategy]))
+        state.telemetry.stop()
+        print(f"result={state.result} ticks={state.tick}: {state.telemetry.written} events written, "
+              f"{state.telemetry.dropped} dropped ({time.perf_counter() - start:.1f} s)")
+    else:
+        kinds = kind_report(plant_report(read_events(args.path)), TICK_RATE)
+        print(f"{'kind':<16}{'plants':>7}{'spent':>8}{'earned':>8}{'return':>8}{'kills':>7}{'dps':>7}")
+        for kind, row in sorted(kinds.items()):
+            ratio = f"{row['earned'] / row['cost']:.1f}x" if row["cost"] else "-"
+            print(f"{kind:<16}{row['plants']:>7}{row['cost']:>8}{row['earned']:>8}{ratio:>8}{row['kills']:>7}"
+                  f"{row['dps']:>7.2f}")
@@ -0,0 +1,26 @@
+from balance import STRATEGIES, evaluate, make_jobs, summarize
+from simulation import plant_costs, waves, wave_size
+
+
+def _jobs():
+    strategies = {name: STRATEGIES[name] for name in ("idle", "freeze_and_wall")}
+    return make_jobs({"default": waves}, {"default": plant_costs}, strategies, seeds=range(2))
+
+
+def test_outcomes_and_summary(tmp_path):
+    jobs = _jobs()
+    outcomes, simulated = evaluate(jobs, workers=1, cache_dir=tmp_path)
+    assert simulated == len(jobs)
+    idle, build = summarize(jobs, outcomes)
+    assert (idle["strategy"], idle["win_rate"]) == ("idle", 0.0)
+    assert (build["strategy"], build["win_rate"], build["zombies_left"]) == ("freeze_and_wall", 1.0, 0.0)
+    # A lost game counts the zombies of its own wave and of every wave after it
+    assert idle["zombies_left"] > sum(map(wave_size, waves[1:]))
+
+
+def test_cached_games_are_not_replayed(tmp_path):
+    jobs = _jobs()
+    outcomes, _ = evaluate(jobs, workers=1, cache_dir=tmp_path)
+    cached, simulated = evaluate(jobs, workers=1, cache_dir=tmp_path)
+    assert simulated == 0
+    assert cached == outcomes
@@ -0,0 +1,37 @@
+from endless import WAVE_TICKS, compile_wave, wave_multiplier, wave_rate
+from simulation import LANE_COUNT, TICK_RATE, new_game, run, step
+
+
+# A wave depends only on the seed and its number, so any wave can be rebuilt
+# on its own (after a snapshot, or by skipping ahead)
+def test_compile_wave_is_seeded():
+    assert compile_wave(42, 3) == compile_wave(42, 3)
+    assert compile_wave(42, 3) != compile_wave(43, 3)
+    assert compile_wave(42, 3) != compile_wave(42, 4)
+
+
+def test_wave_schedule():
+    schedule = compile_wave(7, 2)
+    assert len(schedule) == round(wave_rate(2) * WAVE_TICKS / TICK_RATE)
+    assert [entry[0] for entry in schedule] == sorted(entry[0] for entry in schedule)
+    assert all(0 <= offset < WAVE_TICKS and 0 <= lane < LANE_COUNT for offset, lane, _ in schedule)
+    assert len(compile_wave(7, 2, lane_count=2 * LANE_COUNT)) == 2 * len(schedule)  # Bigger boards, more zombies
+
+
+def test_waves_follow_on_time():
+    state = new_game(seed=5, endless=True)
+    spawned = 0
+    while state.tick <= WAVE_TICKS:  # The tick numbered WAVE_TICKS starts wave 1
+        step(state)
+        spawned = max(spawned, state.zombie_count())
+    assert state.current_wave == 1
+    assert state.speed_multiplier == wave_multiplier(1)
+    assert spawned > 0
+
+
+def test_endless_games_repeat():
+    first = run(new_game(seed=9, endless=True), max_ticks=2 * WAVE_TICKS)
+    second = run(new_game(seed=9, endless=True), max_ticks=2 * WAVE_TICKS)
+    assert (first.tick, first.coins, first.result, sorted(view[1:] for view in first.zombie_views())) == (
+        second.tick, second.coins, second.result, sorted(view[1:] for view in second.zombie_views())
+    )
@@ -0,0 +1,62 @@
+import pytest
+
+from simulation import GRID_COLUMNS, LANE_COUNT, SHOVEL, plant_classes, plant_code
+
+np = pytest.importorskip("numpy")
+
+from env import NOOP, TOOLS, BoardEnv, VectorEnv, action_count, decode_action, encode_action  # noqa: E402
+
+
+def test_actions_round_trip():
+    assert decode_action(NOOP) is None
+    for tool in TOOLS:
+        action = encode_action(tool, 3, 7)
+        assert 0 < action < action_count()
+        expected = (SHOVEL, 3, 7) if tool == SHOVEL else ("place", tool, 3, 7)
+        assert decode_action(action) == expected
+
+
+def test_board_env_observations():
+    env = BoardEnv(seed=1)
+    observation, info = env.reset()
+    assert observation["plants"].shape == observation["zombies"].shape == (LANE_COUNT, GRID_COLUMNS)
+    assert observation["plants"].dtype == np.int8 and observation["coins"].shape == ()
+    assert isinstance(info["seed"], int)
+
+    again, reward, terminated, truncated, info = env.step(encode_action("wallnut", 2, 4))
+    assert again is observation  # Written in place every step
+    assert observation["plants"][2, 4] == plant_code(plant_classes["wallnut"])
+    assert int(observation["coins"]) == env.state.coins
+    assert (terminated, truncated) == (False, False)
+    assert info["tick"] == env.action_ticks
+
+
+def test_vector_env_shares_its_batch_arrays():
+    envs = VectorEnv(3, seed=2)
+    observation, infos = envs.reset()
+    assert observation["plants"].shape == (3, LANE_COUNT, GRID_COLUMNS)
+    assert observation["coins"].shape == (3,) and len(infos) == 3
+
+    # Each board writes straight into its row of the batch arrays
+    for i, env in enumerate(envs.envs):
+        for name, array in env.observation.items():
+            assert np.shares_memory(array, observation[name])
+
+    actions = [encode_action("normal_plant", i, 0) for i in range(3)]
+    again, rewards, terminated, truncated, _ = envs.step(actions)
+    assert again is observation and again["plants"] is observation["plants"]
+    assert rewards.shape == terminated.shape == truncated.shape == (3,)
+    for i in range(3):
+        assert observation["plants"][i, i, 0] == plant_code(plant_classes["normal_plant"])
+        assert observation["plants"][i].sum() == observation["plants"][i, i, 0]
+
+
+def test_vector_env_resets_finished_boards():
+    envs = VectorEnv(2, seed=3, max_ticks=3 * BoardEnv().action_ticks)
+    envs.reset()
+    for _ in range(2):
+        assert not envs.step([NOOP, NOOP])[3].any()
+    _, _, _, truncated, infos = envs.step([NOOP, NOOP])
+    assert truncated.all()
+    assert all("final" in info and "seed" in info for info in infos)
+    assert all(env.state.tick == 0 for env in envs.envs)
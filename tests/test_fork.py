@@ -0,0 +1,35 @@
+import pytest
+
+from balance import STRATEGIES, ScriptedStrategy
+from golden import state_view
+from simulation import ENGINES, PLACE, SHOVEL, new_game, step
+
+
+def _play(state, ticks, strategy="freeze_and_wall"):
+    decide = ScriptedStrategy(STRATEGIES[strategy])
+    for _ in range(ticks):
+        step(state, decide(state))
+    return state
+
+
+# A fork plays on by itself: stepping it with other inputs leaves the parent
+# as it was, and fed the same inputs the two play the same game
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fork_is_independent(engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    state = _play(new_game(engine, seed=6), 1500)
+    before = state_view(state)
+
+    fork = state.fork()
+    assert state_view(fork) == before
+    step(fork, [(SHOVEL, lane, col) for lane in range(5) for col in range(9)])
+    step(fork, [(PLACE, "cherry_bomb", 2, 8)])
+    _play(fork, 600, "idle")
+    assert state_view(fork) != before
+    assert state_view(state) == before
+
+    twin = state.fork()
+    _play(state, 600)
+    _play(twin, 600)
+    assert state_view(twin) == state_view(state)
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from golden import GoldenTrace, check_trace, record_trace
+from simulation import ENGINES
+
+# Stored golden traces, recorded on the reference engine. Every engine must
+# still play them tick for tick; re-record one only when a change to the
+# rules is intended:
+#   python golden.py record tests/golden/waves.trace.gz --scenario waves --ticks 2400
+#   python golden.py record tests/golden/endless.trace.gz --scenario endless --seed 1 --ticks 1500
+#   python golden.py record tests/golden/cherry_bombs.trace.gz --scenario cherry_bombs --ticks 300
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+TRACES = ("waves", "endless", "cherry_bombs")
+
+
+def _check(trace, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    return check_trace(trace, engine)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", TRACES)
+def test_stored_trace(name, engine):
+    trace = GoldenTrace.load(os.path.join(GOLDEN_DIR, f"{name}.trace.gz"))
+    assert _check(trace, engine) is None
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fresh_trace(engine):
+    trace = record_trace("waves", seed=7, strategy="repeaters", ticks=1200)
+    assert _check(trace, engine) is None
+
+
+# A divergence names the first tick that differs and what differs on it
+def test_divergence_is_pinpointed(tmp_path):
+    path = tmp_path / "trace.gz"
+    record_trace("waves", seed=7, strategy="repeaters", ticks=600).save(path)
+    trace = GoldenTrace.load(path)
+    index = next(i for i, record in enumerate(trace.ticks) if i > 200 and record["events"])
+    dropped = trace.ticks[index]["events"].pop()
+    divergence = check_trace(trace, "objects")
+    assert divergence["tick"] == trace.ticks[index]["tick"]
+    assert divergence["extra"] == [repr(dropped)]
+    assert divergence["state"] == [] and divergence["missing"] == []
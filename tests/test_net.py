@@ -0,0 +1,119 @@
+import asyncio
+import struct
+
+import pytest
+
+from balance import STRATEGIES, ScriptedStrategy
+from net import (
+    ACTION,
+    ACTION_FORMAT,
+    FRAME,
+    STATE,
+    DeltaEncoder,
+    GameServer,
+    RemoteGame,
+    decode_action,
+    encode_action,
+    frame,
+    loopback,
+    mirror_errors,
+    read_frame,
+)
+from replay import PLANT_TYPES
+from simulation import PLACE, SHOVEL, new_game, step
+
+
+@pytest.mark.parametrize("action", [(SHOVEL, 2, 7)] + [(PLACE, plant_type, 4, 0) for plant_type in PLANT_TYPES])
+def test_action_round_trip(action):
+    assert decode_action(encode_action(action)) == action
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    b"\x01",
+    ACTION_FORMAT.pack(1, 0, 0) + b"\x00",
+    ACTION_FORMAT.pack(len(PLANT_TYPES) + 1, 0, 0),
+    ACTION_FORMAT.pack(255, 0, 0),
+])
+def test_decode_action_rejects_malformed_bodies(body):
+    with pytest.raises(ValueError):
+        decode_action(body)
+
+
+def _read(data, max_length):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_frame(reader, max_length)
+    return asyncio.run(read())
+
+
+def test_read_frame_checks_the_length():
+    assert _read(frame(STATE, b"abc"), 16) == (STATE, b"abc")
+    with pytest.raises(ValueError):
+        _read(FRAME.pack(0, ACTION), 16)
+    with pytest.raises(ValueError):
+        _read(FRAME.pack(0xFFFFFFFF, ACTION), 16)
+
+
+# A client sending a malformed frame is disconnected; players' valid actions
+# are queued for the next tick
+@pytest.mark.parametrize("payload, accepted", [
+    (frame(ACTION, encode_action((PLACE, "wallnut", 0, 0))), True),
+    (FRAME.pack(0, ACTION), False),
+    (FRAME.pack(1 << 30, ACTION), False),
+    (frame(ACTION, b"\x01"), False),
+    (frame(ACTION, struct.pack("<BHH", 200, 0, 0)), False),
+    (frame(STATE, b""), False),
+])
+def test_server_handles_client_frames(payload, accepted):
+    async def serve():
+        server = GameServer(new_game(seed=0), players=1)
+        port = await server.start(port=0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(payload)
+        await writer.drain()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if server.inputs or not server.clients:
+                break
+        result = (list(server.inputs), len(server.clients))
+        writer.close()
+        await server.close()
+        return result
+
+    inputs, clients = asyncio.run(serve())
+    if accepted:
+        assert inputs == [(PLACE, "wallnut", 0, 0)] and clients == 1
+    else:
+        assert inputs == [] and clients == 0
+
+
+# A client that applies every STATE body tracks the game exactly, whether it
+# was there from the start or joined mid-game with a full state
+@pytest.mark.parametrize("engine", ["objects", "analytic"])
+def test_delta_encoder_mirrors(engine):
+    state = new_game(engine, seed=3)
+    encoder = DeltaEncoder(state)
+    early = RemoteGame(state.lane_count, state.columns)
+    early.apply(encoder.full())
+    late = None
+    decide = ScriptedStrategy(STRATEGIES["freeze_and_wall"])
+    for _ in range(1500):
+        step(state, decide(state))
+        body = encoder.encode(state)
+        early.apply(body)
+        if late:
+            late.apply(body)
+        elif state.tick == 700:
+            late = RemoteGame(state.lane_count, state.columns)
+            late.apply(encoder.full())
+        assert mirror_errors(early, state) == []
+    assert mirror_errors(late, state) == []
+
+
+def test_loopback_mirrors_match():
+    result = asyncio.run(loopback(seed=2, spectators=3, mirrors=2, seconds=1.0))
+    assert result["errors"] == []
+    assert result["dropped"] == 0
@@ -0,0 +1,45 @@
+import pytest
+
+from balance import STRATEGIES, ScriptedStrategy
+from golden import state_view
+from replay import VERSION, ReplayPlayer, ReplayRecorder
+from simulation import new_game, step
+
+
+def _record(path, ticks, strategy="repeaters", keyframe_interval=300):
+    state = new_game(seed=4)
+    recorder = ReplayRecorder(path, state, keyframe_interval=keyframe_interval)
+    decide = ScriptedStrategy(STRATEGIES[strategy])
+    for _ in range(ticks):
+        inputs = list(decide(state))
+        recorder.record(state, inputs)
+        step(state, inputs)
+    recorder.close(state)
+    return state
+
+
+def test_replay_seek(tmp_path):
+    path = tmp_path / "game.pvmr"
+    state = _record(path, 2000)
+
+    player = ReplayPlayer(path)
+    assert player.keyframe_ticks == list(range(0, 2000, 300))
+    from_start = player.advance(player.new_state(), 1234)
+    assert state_view(player.seek(1234)) == state_view(from_start)
+    assert state_view(player.seek(2000)) == state_view(state)
+
+
+def test_replay_plays_back_the_game(tmp_path):
+    path = tmp_path / "game.pvmr"
+    state = _record(path, 1500, "freeze_and_wall")
+    assert state_view(ReplayPlayer(path).play()) == state_view(state)
+
+
+def test_replay_rejects_other_versions(tmp_path):
+    path = tmp_path / "game.pvmr"
+    _record(path, 10)
+
+    data = bytearray(path.read_bytes())
+    data[4:6] = (VERSION + 1).to_bytes(2, "little")
+    with pytest.raises(ValueError, match="replay version"):
+        ReplayPlayer(bytes(data))
@@ -0,0 +1,62 @@
+import pytest
+
+from simulation import PLACE, SPAWN_INTERVAL, Gargantuar, new_game, plant_classes, step
+from telemetry import PLACE as PLACED
+from telemetry import SHOT
+from units import PLANT_FIRE_INTERVAL, PLANT_SHOTS
+
+
+# A game whose wave never spawns on its own, so the test places every zombie
+def _quiet_game():
+    state = new_game(seed=0, wave_config=[{"Zombie": 1, "speed_multiplier": 1}])
+    state.spawn_timer = -10 ** 9
+    state.telemetry.capture()
+    return state
+
+
+def _shot_ticks(state, ticks):
+    shots = []
+    for _ in range(ticks):
+        step(state)
+        shots.extend(tick for tick, events in state.telemetry.take() for event in events if event[0] == SHOT)
+    return shots
+
+
+# A shooter placed during tick t fires during t + fire_interval - 1 and then
+# every fire_interval ticks, as long as its lane has zombies
+@pytest.mark.parametrize("plant_type", ["normal_plant", "freezing_plant", "repeater"])
+def test_shooter_fire_interval(plant_type):
+    state = _quiet_game()
+    state.spawn_zombie(Gargantuar, 0)  # Outlasts every shot below
+    step(state, [(PLACE, plant_type, 0, 0)])
+    placed = state.tick - 1
+    assert [event[0] for _, events in state.telemetry.take() for event in events][0] == PLACED
+
+    type_id = plant_classes[plant_type].type_id
+    interval = PLANT_FIRE_INTERVAL[type_id]
+    shots = _shot_ticks(state, 3 * interval)
+    expected = [placed + interval - 1 + k * interval for k in range(3)]
+    assert shots == [tick for tick in expected for _ in PLANT_SHOTS[type_id]]
+
+
+# A shooter with an empty lane keeps its shot ready and fires on the tick a
+# zombie enters the lane
+def test_shooter_waits_for_zombies():
+    state = _quiet_game()
+    step(state, [(PLACE, "normal_plant", 2, 0)])
+    assert _shot_ticks(state, 3 * SPAWN_INTERVAL) == []
+
+    state.spawn_zombie(Gargantuar, 2)
+    assert _shot_ticks(state, 1) == [state.tick - 1]
+
+
+# A cherry bomb goes off once, fire_interval - 1 ticks after it is placed
+def test_cherry_bomb_fuse():
+    state = _quiet_game()
+    step(state, [(PLACE, "cherry_bomb", 1, 3)])
+    fuse = PLANT_FIRE_INTERVAL[plant_classes["cherry_bomb"].type_id]
+    for _ in range(fuse - 2):
+        step(state)
+    assert state.plants[1][3]
+    step(state)
+    assert state.plants[1][3] is None
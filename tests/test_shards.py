@@ -0,0 +1,50 @@
+import pytest
+
+from simulation import PLACE, new_game, step
+
+pytest.importorskip("numpy")
+
+from shards import ShardedGame, shard_ranges  # noqa: E402
+
+
+def _inputs(tick):
+    if tick < 200 and tick % 40 == 0:
+        return [(PLACE, "normal_plant", tick // 40, 0), (PLACE, "freezing_plant", tick // 40, 1)]
+    if tick % 90 == 0:
+        return [(PLACE, "cherry_bomb", tick // 90 % 5, 12)]
+    return []
+
+
+# Everything but the uids, which each shard hands out on its own
+def _summary(state):
+    return (
+        state.tick, state.coins, state.coins_earned, state.current_wave, state.result,
+        sorted((kind.__name__, x, y, frozen) for kind, _, x, y, frozen in state.zombie_views()),
+        sorted((kind.__name__, x, y) for kind, _, x, y in state.bullet_views()),
+        [[(type(plant), plant.health) if plant else None for plant in row] for row in state.plants],
+    )
+
+
+def test_shard_ranges():
+    assert shard_ranges(5, 2) == [range(0, 2), range(2, 5)]
+    assert [len(lanes) for lanes in shard_ranges(7, 3)] == [2, 2, 3]
+
+
+# A sharded game, cherry bombs blasting across shard edges included, plays
+# the single-process game tick for tick
+@pytest.mark.parametrize("workers", [2, 3])
+def test_gather_matches_one_process(workers):
+    state = new_game(seed=4, coins=1000)
+    alone = new_game(seed=4, coins=1000)
+    game = ShardedGame(state, workers)
+    try:
+        for tick in range(1500):
+            game.step(_inputs(tick))
+            step(alone, _inputs(tick))
+            assert (game.state.coins, game.state.zombie_count(), game.state.bullet_count()) == (
+                alone.coins, alone.zombie_count(), alone.bullet_count())
+        gathered = game.gather()
+    finally:
+        game.close()
+    assert _summary(gathered) == _summary(alone)
+    assert state.tick == 0  # The game handed over is left as it was
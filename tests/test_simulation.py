@@ -0,0 +1,68 @@
+from simulation import CELL_WIDTH, PLACE, SHOVEL, ShooterPlant, Zombie, new_game, plant_costs, run, step
+
+
+def _summary(state):
+    return (
+        state.tick, state.coins, state.current_wave, state.result,
+        list(state.zombie_views()), list(state.bullet_views()),
+        [[type(plant) if plant else None for plant in row] for row in state.plants],
+    )
+
+
+def _build(state):
+    if state.tick % 30 == 0:
+        return [(PLACE, "normal_plant", state.tick // 30 % 5, 0), (PLACE, "wallnut", state.tick // 30 % 5, 4)]
+    return []
+
+
+# The same seed and inputs always play the same game
+def test_seeded_games_repeat():
+    first, second = new_game(seed=11), new_game(seed=11)
+    for _ in range(1500):
+        step(first, _build(first))
+        step(second, _build(second))
+        assert _summary(first) == _summary(second)
+
+
+def test_place_and_shovel():
+    state = new_game(seed=0, coins=100)
+    step(state, [(PLACE, "normal_plant", 1, 2)])
+    assert isinstance(state.plants[1][2], ShooterPlant)
+    assert state.coins == 100 - plant_costs["normal_plant"]
+
+    step(state, [(PLACE, "wallnut", 1, 2)])  # Cell taken: nothing happens
+    assert isinstance(state.plants[1][2], ShooterPlant)
+    assert state.coins == 100 - plant_costs["normal_plant"]
+
+    step(state, [(SHOVEL, 1, 2)])
+    assert state.plants[1][2] is None
+
+
+def test_not_enough_coins():
+    state = new_game(seed=0, coins=plant_costs["repeater"] - 1)
+    events = step(state, [(PLACE, "repeater", 0, 0)])
+    assert ("not_enough_coins", "repeater") in events
+    assert state.plants[0][0] is None
+    assert state.coins == plant_costs["repeater"] - 1
+
+
+def test_unguarded_house_is_lost():
+    state = run(new_game(seed=2), max_ticks=20000)
+    assert state.result == "lose"
+    assert step(state) == []  # A finished game no longer steps
+    assert state.tick == run(state).tick
+
+
+def test_zombie_eats_plant_in_its_path():
+    state = new_game(seed=0, wave_config=[{"Zombie": 1, "speed_multiplier": 1}])
+    state.spawn_timer = -10 ** 9  # No spawns but the one below
+    step(state, [(PLACE, "wallnut", 3, 6)])
+    state.spawn_zombie(Zombie, 3)
+    wallnut = state.plants[3][6]
+    health = wallnut.health
+    for _ in range(1000):  # Long enough to walk up to it, not to finish it
+        step(state)
+    zombie = state.zombies[0]
+    assert zombie.eating_plant is wallnut
+    assert wallnut.health < health
+    assert 6 * CELL_WIDTH <= zombie.x < 7 * CELL_WIDTH
@@ -0,0 +1,56 @@
+import pytest
+
+from balance import STRATEGIES, ScriptedStrategy
+from golden import state_view
+from simulation import ENGINES, new_game, step
+from snapshot import SnapshotRing, restore_snapshot, take_snapshot
+
+
+def _play(state, ticks, strategy="freeze_and_wall"):
+    decide = ScriptedStrategy(STRATEGIES[strategy])
+    for _ in range(ticks):
+        step(state, decide(state))
+    return state
+
+
+def _game(engine, seed):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    return new_game(engine, seed=seed)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("engine", ENGINES)
+def test_snapshot_round_trip(engine, compress):
+    state = _play(_game(engine, 3), 1500)
+    restored = restore_snapshot(take_snapshot(state, compress=compress))
+    assert restored.engine == engine
+    assert state_view(restored) == state_view(state)
+
+    # Both copies go on to play the same game
+    _play(state, 600)
+    _play(restored, 600)
+    assert state_view(restored) == state_view(state)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_snapshot_restores_on_another_engine(engine):
+    state = _play(new_game("objects", seed=5), 1200)
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    restored = restore_snapshot(take_snapshot(state), engine)
+    assert restored.engine == engine
+    assert state_view(restored) == state_view(state)
+
+
+def test_snapshot_ring_rollback():
+    state = new_game(seed=1)
+    ring = SnapshotRing(capacity=10)
+    views = {}
+    for _ in range(20):
+        ring.push(state)
+        views[state.tick] = state_view(state)
+        _play(state, 30)
+    assert state_view(ring.rollback(455)) == views[450]
+    with pytest.raises(LookupError):
+        ring.rollback(0)  # Pushed out of the ring
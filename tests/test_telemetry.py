@@ -0,0 +1,50 @@
+from simulation import PLACE, Gargantuar, new_game, step
+from telemetry import plant_report, read_events
+
+
+def _quiet_game():
+    state = new_game(seed=0, wave_config=[{"Zombie": 1, "speed_multiplier": 1}])
+    state.spawn_timer = -10 ** 9  # Only the zombies the test spawns
+    state.spawn_zombie(Gargantuar, 0)
+    return state
+
+
+def test_plant_report(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    state = _quiet_game()
+    state.telemetry.start(path)
+    step(state, [(PLACE, "normal_plant", 0, 0), (PLACE, "wallnut", 1, 0)])
+    for _ in range(300):
+        step(state)
+    state.telemetry.stop()
+
+    report = plant_report(read_events(path))
+    shooter, wallnut = sorted(report.values(), key=lambda plant: plant["lane"])
+    assert (shooter["kind"], shooter["cost"], shooter["placed"]) == ("ShooterPlant", 10, 0)
+    assert shooter["shots"] == 3 and shooter["damage"] > 0
+    assert (wallnut["kind"], wallnut["shots"], wallnut["eaten"]) == ("Wallnut", 0, None)
+
+
+# A second file started on the same game announces the plants already on
+# the board, so their shots and hits are still credited in its report
+def test_restarted_file_reports_existing_plants(tmp_path):
+    first, second = tmp_path / "first.jsonl.gz", tmp_path / "second.jsonl.gz"
+    state = _quiet_game()
+    state.telemetry.start(first)
+    step(state, [(PLACE, "normal_plant", 0, 0)])
+    for _ in range(200):
+        step(state)
+    state.telemetry.stop()
+
+    state.telemetry.start(second)
+    step(state, [(PLACE, "repeater", 0, 1)])
+    for _ in range(300):
+        step(state)
+    state.telemetry.stop()
+
+    report = plant_report(read_events(second))
+    kinds = {plant["kind"]: plant for plant in report.values()}
+    assert set(kinds) == {"ShooterPlant", "Repeater"}
+    assert kinds["ShooterPlant"]["cost"] == 0
+    assert kinds["ShooterPlant"]["shots"] > 0 and kinds["ShooterPlant"]["damage"] > 0
+    assert kinds["Repeater"]["cost"] == 100 and kinds["Repeater"]["shots"] > 0
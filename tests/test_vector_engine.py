@@ -0,0 +1,47 @@
+import pytest
+
+from balance import STRATEGIES, ScriptedStrategy
+from simulation import new_game, step
+
+pytest.importorskip("numpy")
+
+
+def _uid(view):
+    return view[1]
+
+
+def _summary(state):
+    return (
+        state.tick, state.coins, state.current_wave, state.wave_zombies_remaining, state.result,
+        sorted(state.zombie_views(), key=_uid), sorted(state.bullet_views(), key=_uid),
+        [[(type(plant), plant.health) if plant else None for plant in row] for row in state.plants],
+    )
+
+
+# The numpy engine plays the object engine's game tick for tick: same
+# zombies and bullets at the same places, same plant health, same coins
+@pytest.mark.parametrize("seed, strategy", [(0, "freeze_and_wall"), (1, "repeaters"), (2, "shooters"), (3, "idle")])
+def test_numpy_engine_matches_objects(seed, strategy):
+    objects, arrays = new_game("objects", seed=seed), new_game("numpy", seed=seed)
+    decide = ScriptedStrategy(STRATEGIES[strategy])
+    for _ in range(3000):
+        step(objects, decide(objects))
+        step(arrays, decide(arrays))
+        assert _summary(arrays) == _summary(objects)
+        if objects.result:
+            break
+
+
+def test_numpy_engine_cherry_bombs_and_shovel():
+    objects, arrays = new_game("objects", seed=4), new_game("numpy", seed=4)
+    for tick in range(2400):
+        inputs = []
+        if tick % 120 == 0:
+            inputs.append(("place", "cherry_bomb", tick // 120 % 5, 9))
+        if tick % 200 == 100:
+            inputs.append(("place", "wallnut", tick // 200 % 5, 8))
+        if tick % 200 == 150:
+            inputs.append(("shovel", tick // 200 % 5, 8))
+        step(objects, inputs)
+        step(arrays, inputs)
+        assert _summary(arrays) == _summary(objects)
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+import pygame
+
+# Font sizes used by the game, keyed by role
+FONT_SIZES = {
+    "cost": 24,    # Plant pool prices
+    "hud": 36,     # Wave / zombies / coins line and warnings
+    "banner": 72,  # "You Lose!"
+}
+
+
+# Text Cache
+# Builds each font once and keeps a bounded LRU of rendered text surfaces
+# keyed by (font, text, color), so unchanged labels are never re-rendered.
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name):
+        font = self.fonts.get(name)
+        if font is None:
+            font = self.fonts[name] = pygame.font.Font(None, FONT_SIZES[name])
+        return font
+
+    def render(self, font_name, text, color):
+        key = (font_name, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.font(font_name).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)  # Evict the least recently used text
+        return surface
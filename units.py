@@ -0,0 +1,111 @@
+# Unit types: what every plant, zombie and projectile costs, how tough and
+# fast it is, what it fires and how often, what a hit does, and its sprite,
+# as plain data. The tables are compiled below, once at import, into flat
+# lists indexed by an integer type id (the row's position in its table);
+# each class in simulation.py carries its row's type_id and the engines read
+# stats through these lists rather than through isinstance() checks or
+# per-class constants. A unit that only differs in numbers is a new row plus
+# a class naming it; the collision and movement loops stay as they are.
+#
+# Row order is part of the snapshot and replay formats (kinds are stored by
+# type id), so new rows go at the end of a table.
+
+# Bullet effects on the zombie they hit
+ON_HIT = ("damage", "freeze")  # Subtract the bullet's damage / freeze it for FREEZE_TICKS instead
+
+# Projectile name -> stats
+BULLET_STATS = {
+    "bullet": {"damage": 1, "speed": 10, "on_hit": "damage", "sprite": "bullet"},
+    "ice_bullet": {"damage": 1, "speed": 10, "on_hit": "freeze", "sprite": "ice_bullet"},
+    "small_bullet": {"damage": 2, "speed": 10, "on_hit": "damage", "sprite": "repeater_bullet"},
+}
+
+# Plant name (as placed by the player) -> stats. A shooter fires one
+# `projectile` per entry of `shots` (x offsets from the cell's right edge)
+# every `fire_interval` ticks; a plant without a fire interval is never
+# woken. `blast` is the damage a bomb deals to the cells around it.
+PLANT_STATS = {
+    "normal_plant": {
+        "cost": 10, "health": 5, "fire_interval": 90, "projectile": "bullet", "shots": (0,), "sprite": "plant",
+    },
+    "freezing_plant": {
+        "cost": 30, "health": 5, "fire_interval": 120, "projectile": "ice_bullet", "shots": (0,),
+        "sprite": "freezing_plant",
+    },
+    "repeater": {
+        "cost": 100, "health": 5, "fire_interval": 60, "projectile": "small_bullet", "shots": (0, 20),
+        "sprite": "repeater",
+    },
+    "wallnut": {"cost": 25, "health": 100, "fire_interval": None, "sprite": "wallnut"},
+    "cherry_bomb": {"cost": 50, "health": 1, "fire_interval": 60, "blast": 30, "sprite": "cherry_bomb"},
+}
+
+# Zombie name (as used in wave configurations) -> stats. `bite` is the
+# damage dealt per tick to the plant being eaten. A zombie that ignores
+# freezing is still flagged frozen by ice hits but is not slowed by them; the
+# others are drawn with their `frozen_sprite` while frozen. `endless_weight`
+# is (weight in the first endless wave, weight gained per wave); a zombie
+# without one never spawns in endless mode.
+ZOMBIE_STATS = {
+    "Zombie": {
+        "health": 5, "speed": 1, "reward": 10, "bite": 0.1, "endless_weight": (10, 0),
+        "sprite": "zombie", "frozen_sprite": "freezed_zombie",
+    },
+    "Zombie2": {
+        "health": 10, "speed": 1, "reward": 20, "bite": 0.1, "endless_weight": (2, 1),
+        "sprite": "zombie_2", "frozen_sprite": "freezed_zombie",
+    },
+    "Zombie3": {
+        "health": 15, "speed": 1, "reward": 30, "bite": 0.1, "endless_weight": (0, 0.5),
+        "sprite": "zombie_3", "frozen_sprite": "freezed_zombie",
+    },
+    "Gargantuar": {
+        "health": 300, "speed": 0.5, "reward": 50, "bite": 0.2, "ignores_freeze": True, "endless_weight": (0, 0.1),
+        "sprite": "gargantuar",
+    },
+}
+
+
+def _column(table, field, default=None):
+    return [row.get(field, default) for row in table.values()]
+
+
+# Name -> type id
+BULLET_IDS = {name: type_id for type_id, name in enumerate(BULLET_STATS)}
+PLANT_IDS = {name: type_id for type_id, name in enumerate(PLANT_STATS)}
+ZOMBIE_IDS = {name: type_id for type_id, name in enumerate(ZOMBIE_STATS)}
+
+# Type id -> stat
+BULLET_DAMAGE = _column(BULLET_STATS, "damage")
+BULLET_SPEED = _column(BULLET_STATS, "speed")
+BULLET_FREEZES = [on_hit == "freeze" for on_hit in _column(BULLET_STATS, "on_hit")]
+BULLET_SPRITE = _column(BULLET_STATS, "sprite")
+
+PLANT_COST = _column(PLANT_STATS, "cost")
+PLANT_HEALTH = _column(PLANT_STATS, "health")
+PLANT_FIRE_INTERVAL = _column(PLANT_STATS, "fire_interval")
+PLANT_PROJECTILE = [BULLET_IDS.get(name) for name in _column(PLANT_STATS, "projectile")]  # None: fires nothing
+PLANT_SHOTS = _column(PLANT_STATS, "shots", ())
+PLANT_BLAST = _column(PLANT_STATS, "blast", 0)
+PLANT_SPRITE = _column(PLANT_STATS, "sprite")
+
+ZOMBIE_HEALTH = _column(ZOMBIE_STATS, "health")
+ZOMBIE_SPEED = _column(ZOMBIE_STATS, "speed")
+ZOMBIE_REWARD = _column(ZOMBIE_STATS, "reward")
+ZOMBIE_BITE = _column(ZOMBIE_STATS, "bite")
+ZOMBIE_IGNORES_FREEZE = _column(ZOMBIE_STATS, "ignores_freeze", False)
+ZOMBIE_ENDLESS_WEIGHT = _column(ZOMBIE_STATS, "endless_weight", (0, 0))
+ZOMBIE_SPRITE = _column(ZOMBIE_STATS, "sprite")
+ZOMBIE_FROZEN_SPRITE = [row.get("frozen_sprite", row["sprite"]) for row in ZOMBIE_STATS.values()]
+
+
+def _check():
+    for name, row in BULLET_STATS.items():
+        if row["on_hit"] not in ON_HIT:
+            raise ValueError(f"Bullet type {name!r}: unknown on_hit {row['on_hit']!r}, expected one of {ON_HIT}")
+    for name, row in PLANT_STATS.items():
+        if row.get("projectile", "bullet") not in BULLET_STATS:
+            raise ValueError(f"Plant type {name!r}: unknown projectile {row['projectile']!r}")
+
+
+_check()
@@ -0,0 +1,459 @@
+import heapq
+
+import numpy as np
+
+from simulation import (
+    CELL_WIDTH,
+    FREEZE_TICKS,
+    GRID_COLUMNS,
+    LANE_COUNT,
+    LANE_HEIGHT,
+    GameState,
+    PlantRow,
+    bullet_classes,
+    fork_copy,
+    zombie_classes,
+)
+from units import BULLET_FREEZES, ZOMBIE_BITE, ZOMBIE_IGNORES_FREEZE
+
+# Struct-of-arrays engine: zombies and bullets live in NumPy columns and are
+# moved, hit-tested, damaged, frozen and removed in batches. Plants, waves and
+# inputs are shared with the object engine, and every rule below reproduces
+# the outcome of the Zombie*/Bullet classes tick for tick.
+
+# A row's kind is its class's type id, so the per-type lists of units.py
+# index straight into the kind columns
+ZOMBIE_KINDS = tuple(zombie_classes.values())
+BULLET_KINDS = tuple(bullet_classes.values())
+
+IGNORES_FREEZE = np.array(ZOMBIE_IGNORES_FREEZE)
+BITE_DAMAGE = ZOMBIE_BITE  # Plant damage per tick while eating
+BITE_DAMAGES = np.array(BITE_DAMAGE)
+FREEZES = np.array(BULLET_FREEZES)
+
+ZOMBIE_FIELDS = {
+    "kind": np.int8,
+    "uid": np.int64,
+    "lane": np.int64,
+    "x": np.float64,
+    "y": np.float64,
+    "col": np.int64,
+    "health": np.int64,
+    "base_speed": np.float64,
+    "speed": np.float64,
+    "frozen": np.bool_,
+    "thaw_tick": np.int64,
+    "reward": np.int64,
+    "is_eating": np.bool_,
+    "eating": object,  # Plant being eaten; may already be off the grid (shovelled)
+}
+
+BULLET_FIELDS = {
+    "kind": np.int8,
+    "uid": np.int64,
+    "lane": np.int64,
+    "x": np.float64,
+    "y": np.float64,
+    "speed": np.float64,
+    "damage": np.int64,
+    "freezes": np.bool_,
+    "source": np.int64,  # Telemetry number of the plant that fired it
+}
+
+
+# Growable set of parallel columns, one per entity field. Rows stay in
+# insertion order, which the hit rules depend on.
+class EntityArrays:
+    def __init__(self, fields, capacity=64):
+        self.fields = fields
+        self.n = 0
+        self.capacity = capacity
+        for name, dtype in fields.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def append(self, **values):
+        if self.n == self.capacity:
+            self._grow(self.capacity * 2)
+        for name, value in values.items():
+            getattr(self, name)[self.n] = value
+        self.n += 1
+
+    def fork(self):
+        clone = EntityArrays(self.fields, 0)
+        clone.n, clone.capacity = self.n, self.capacity
+        for name in self.fields:
+            setattr(clone, name, getattr(self, name).copy())
+        return clone
+
+    def compact(self, keep):
+        # Drop the rows where keep is False, preserving the order of the rest
+        kept = int(np.count_nonzero(keep))
+        for name, dtype in self.fields.items():
+            column = getattr(self, name)
+            column[:kept] = column[:self.n][keep]
+            if dtype is object:
+                column[kept:self.n] = None
+        self.n = kept
+
+    def _grow(self, capacity):
+        for name, dtype in self.fields.items():
+            column = np.zeros(capacity, dtype=dtype)
+            column[:self.n] = getattr(self, name)[:self.n]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+
+# NumPy Game State
+class ArrayGameState(GameState):
+    engine = "numpy"
+
+    def __init__(
+        self, seed=None, wave_config=None, coins=10000, costs=None, endless=False, lanes=LANE_COUNT,
+        columns=GRID_COLUMNS, capacity=256,
+    ):
+        super().__init__(
+            seed=seed, wave_config=wave_config, coins=coins, costs=costs, endless=endless, lanes=lanes, columns=columns
+        )
+        # The object containers are never used by this engine
+        self.zombies = self.bullets = self.lane_index = None
+        self.thaws = []  # Heap of (thaw tick, uid); rows are found by uid since they move on compaction
+        self.zombie_arrays = EntityArrays(ZOMBIE_FIELDS, capacity)
+        self.bullet_arrays = EntityArrays(BULLET_FIELDS, capacity)
+        self.lane_counts = np.zeros(self.lane_count, dtype=np.int64)
+        self._mirror_plants()
+
+    # Keep plant_cells, the plant_code of every cell, in step with self.plants,
+    # so zombies find the plants in front of them without visiting the grid
+    def _mirror_plants(self):
+        self.plant_cells = np.zeros((self.lane_count, self.columns), dtype=np.int8)
+        self.plants = [PlantRow(row, cells) for row, cells in zip(self.plants, self.plant_cells)]
+
+    def _fork_entities(self, clone, copies):
+        clone._mirror_plants()
+        clone.zombie_arrays = self.zombie_arrays.fork()
+        clone.bullet_arrays = self.bullet_arrays.fork()
+        clone.lane_counts = self.lane_counts.copy()
+        clone.thaws = list(self.thaws)
+        eating = clone.zombie_arrays.eating
+        for row in np.flatnonzero(clone.zombie_arrays.is_eating[:clone.zombie_arrays.n]).tolist():
+            eating[row] = fork_copy(eating[row], copies)
+
+    def add_zombie(self, zombie):
+        self.zombie_arrays.append(
+            kind=zombie.type_id,
+            uid=self.new_uid(),
+            lane=zombie.lane,
+            x=zombie.x,
+            y=zombie.y,
+            col=zombie.col,
+            health=zombie.health,
+            base_speed=zombie.base_speed,
+            speed=zombie.speed,
+            frozen=zombie.frozen,
+            thaw_tick=zombie.thaw_tick,
+            reward=zombie.reward,
+            is_eating=zombie.eating_plant is not None,
+            eating=zombie.eating_plant,
+        )
+        self.lane_counts[zombie.lane] += 1
+        self.pool.give(zombie)  # Only its values are kept
+
+    def add_bullet(self, bullet):
+        bullet.uid = self.new_uid()
+        self.bullet_arrays.append(
+            kind=bullet.type_id,
+            uid=bullet.uid,
+            lane=bullet.y // LANE_HEIGHT,
+            x=bullet.x,
+            y=bullet.y,
+            speed=bullet.speed,
+            damage=bullet.damage,
+            freezes=BULLET_FREEZES[bullet.type_id],
+            source=bullet.source,
+        )
+        self.pool.give(bullet)
+
+    def zombies_in_lane(self, lane):
+        return int(self.lane_counts[lane])
+
+    def zombie_count(self):
+        return self.zombie_arrays.n
+
+    def bullet_count(self):
+        return self.bullet_arrays.n
+
+    def damage_area(self, lane, col, radius, damage, source=0):
+        z = self.zombie_arrays
+        n = z.n
+        hit = (np.abs(z.lane[:n] - lane) <= radius) & (np.abs(z.col[:n] - col) <= radius)
+        if hit.any():
+            health = z.health[:n]
+            health[hit] -= damage
+            dead = hit & (health <= 0)
+            if self.telemetry.enabled:
+                for row in np.flatnonzero(hit).tolist():
+                    self.telemetry.hit(source, int(z.uid[row]), damage)
+                    if dead[row]:
+                        self.telemetry.kill(source, int(z.uid[row]), ZOMBIE_KINDS[z.kind[row]], 0, self.coins)
+            self._remove_zombies(dead)
+
+    def update_zombie_speeds(self):
+        z = self.zombie_arrays
+        np.multiply(z.base_speed[:z.n], self.speed_multiplier, out=z.speed[:z.n])
+
+    def zombie_reached_house(self):
+        z = self.zombie_arrays
+        return bool((z.x[:z.n] <= 0).any())
+
+    def zombie_views(self, area=None):
+        z = self.zombie_arrays
+        rows = self._rows_in(z, area)
+        for kind, uid, x, y, frozen in zip(z.kind[rows], z.uid[rows].tolist(), z.x[rows].tolist(), z.y[rows].tolist(), z.frozen[rows]):
+            yield ZOMBIE_KINDS[kind], uid, x, y, frozen
+
+    def bullet_views(self, area=None):
+        b = self.bullet_arrays
+        rows = self._rows_in(b, area)
+        for kind, uid, x, y in zip(b.kind[rows], b.uid[rows].tolist(), b.x[rows].tolist(), b.y[rows].tolist()):
+            yield BULLET_KINDS[kind], uid, x, y
+
+    def entity_positions(self, area=None):
+        z, b = self.zombie_arrays, self.bullet_arrays
+        zombies, bullets = self._rows_in(z, area), self._rows_in(b, area)
+        positions = dict(zip(z.uid[zombies].tolist(), z.x[zombies].tolist()))
+        positions.update(zip(b.uid[bullets].tolist(), b.x[bullets].tolist()))
+        return positions
+
+    # Rows of `arrays` inside `area` (first lane, end lane, left, right), or all of them
+    def _rows_in(self, arrays, area):
+        if area is None:
+            return slice(0, arrays.n)
+        first, end, left, right = area
+        lane, x = arrays.lane[:arrays.n], arrays.x[:arrays.n]
+        return np.flatnonzero((lane >= first) & (lane < end) & (x >= left) & (x < right))
+
+    def update_entities(self):
+        b = self.bullet_arrays
+        if b.n:
+            b.x[:b.n] += b.speed[:b.n]
+            gone = b.x[:b.n] > self.width
+            if gone.any():
+                b.compact(~gone)
+        self.profiler.lap("bullets")
+        if self.zombie_arrays.n:
+            self._move_zombies()
+            self.profiler.lap("zombies")
+            if b.n:
+                self._resolve_hits()
+                self.profiler.lap("collisions")
+        if self.thaws:
+            self.thaw_zombies()
+            self.profiler.lap("thaw")
+
+    def thaw_zombies(self):
+        z = self.zombie_arrays
+        thaws = self.thaws
+        while thaws and thaws[0][0] <= self.tick:
+            _, uid = heapq.heappop(thaws)
+            row = int(np.searchsorted(z.uid[:z.n], uid))  # Rows stay in uid order
+            if row == z.n or z.uid[row] != uid:
+                continue  # Killed while frozen
+            if z.thaw_tick[row] > self.tick:
+                heapq.heappush(thaws, (int(z.thaw_tick[row]), uid))  # Refrozen, or ate in the meantime
+            else:
+                z.frozen[row] = False
+
+    def _remove_zombies(self, dead):
+        if dead.any():
+            z = self.zombie_arrays
+            z.compact(~dead)
+            self.lane_counts = np.bincount(z.lane[:z.n], minlength=self.lane_count)
+
+    def _move_zombies(self):
+        z = self.zombie_arrays
+        n = z.n
+        x, col, lane = z.x[:n], z.col[:n], z.lane[:n]
+
+        on_grid = (col >= 0) & (col < self.columns)
+        cell = np.where(on_grid, lane * self.columns + col, 0)
+        at_plant = on_grid & (self.plant_cells.ravel()[cell] != 0)
+        busy = z.is_eating[:n] | at_plant
+
+        free = ~busy
+        if busy.any() and not self._eat_plants(at_plant, cell, free):
+            # Zombies touching a plant go one at a time in list order: a plant one
+            # of them finishes off is already gone when the next one looks for it.
+            for i in np.flatnonzero(busy):
+                self._move_busy_zombie(i)
+
+        frozen = z.frozen[:n]
+        walking = free & (~frozen | IGNORES_FREEZE[z.kind[:n]])
+        x[walking] -= z.speed[:n][walking] * self.speed_multiplier
+        col[:] = np.floor_divide(x, CELL_WIDTH)
+
+    # Bites of a whole pile-up at once: the zombies at one plant bite it in
+    # list order, its health folded left over their bites (np.subtract.accumulate
+    # rounds exactly like repeated take_damage). Once it dies, the later ones
+    # find the cell empty: those already eating carry on with their own plant
+    # and the rest walk on (marked in `free`). Plants never share a cell, so
+    # the batches are independent unless a zombie eats a plant outside its own
+    # cell, which only a hand-edited state can produce; then this returns
+    # False without changing anything and the zombies go one by one.
+    def _eat_plants(self, at_plant, cell, free):
+        z = self.zombie_arrays
+        n = z.n
+        is_eating, eating = z.is_eating[:n], z.eating[:n]
+
+        away = np.flatnonzero(is_eating & ~at_plant)  # Still eating a plant that left the grid
+        leftovers = {}
+        for row, plant in zip(away.tolist(), eating[away]):
+            if self.plants[plant.lane][plant.col] is not None:
+                return False
+            leftovers.setdefault(id(plant), (plant, []))[1].append(row)
+
+        rows = np.flatnonzero(at_plant)
+        rows = rows[np.argsort(cell[rows], kind="stable")]
+        for group in np.split(rows, np.flatnonzero(np.diff(cell[rows])) + 1) if len(rows) else ():
+            plant_lane, plant_col = divmod(int(cell[group[0]]), self.columns)
+            plant = self.plants[plant_lane][plant_col]
+            health = np.subtract.accumulate(np.concatenate(([plant.health], BITE_DAMAGES[z.kind[group]])))
+            if health[-1] > 0:
+                self._bite(plant, group)
+                continue
+            late = int(np.flatnonzero(health <= 0)[0])  # Rows from here on find the cell empty
+            if late:
+                self._bite(plant, group[:late])
+            rest = group[late:]
+            free[rest[~is_eating[rest]]] = True
+            carried_on = {}
+            for row in rest[is_eating[rest]].tolist():
+                carried_on.setdefault(id(eating[row]), (eating[row], []))[1].append(row)
+            for eaten, group in carried_on.values():
+                self._bite(eaten, np.array(group))
+
+        for plant, group in leftovers.values():
+            self._bite(plant, np.array(group))
+        return True
+
+    # Zombies in `group` (list order) each take a bite of `plant`
+    def _bite(self, plant, group):
+        z = self.zombie_arrays
+        health = np.subtract.accumulate(np.concatenate(([plant.health], BITE_DAMAGES[z.kind[group]])))[1:]
+        alive = plant.health > 0
+        plant.health = float(health[-1])
+        if plant.health <= 0:
+            self.plants[plant.lane][plant.col] = None
+            if alive:
+                self.telemetry.eaten(plant)
+        z.eating[group] = plant
+        z.is_eating[group] = True
+        done = group[health <= 0]
+        z.eating[done] = None
+        z.is_eating[done] = False
+        frozen = group[z.frozen[group] & ~IGNORES_FREEZE[z.kind[group]]]
+        z.thaw_tick[frozen] += 1  # The freeze only wears off while not eating
+
+    def _move_busy_zombie(self, i):
+        z = self.zombie_arrays
+        # Zombie.detect_plant
+        col = z.col[i]
+        if 0 <= col < self.columns:
+            plant = self.plants[z.lane[i]][col]
+            if plant:
+                z.eating[i] = plant
+                z.is_eating[i] = True
+        # Zombie.move
+        if z.is_eating[i]:
+            if z.frozen[i] and not IGNORES_FREEZE[z.kind[i]]:
+                z.thaw_tick[i] += 1  # The freeze only wears off while not eating
+            plant = z.eating[i]
+            plant.take_damage(self, BITE_DAMAGE[z.kind[i]])
+            if plant.health <= 0:
+                z.eating[i] = None
+                z.is_eating[i] = False
+        elif not z.frozen[i] or IGNORES_FREEZE[z.kind[i]]:
+            z.x[i] -= z.speed[i] * self.speed_multiplier
+
+    def _resolve_hits(self):
+        z, b = self.zombie_arrays, self.bullet_arrays
+        n, m = z.n, b.n
+        zx, zlane = z.x[:n], z.lane[:n]
+        bx, blane = b.x[:m], b.lane[:m]
+        # Right edge of each hitbox, rounded the same way as the object engine
+        edge = (zx + CELL_WIDTH) - 30
+
+        # A bullet hits the first zombie in list order whose hitbox contains it
+        # (zombie.x < bullet.x < edge; the y test there is a same-lane test).
+        # Sorting each lane by x turns "contains" into a contiguous run.
+        target = np.full(m, -1, dtype=np.int64)
+        order = np.lexsort((zx, zlane))
+        lane_starts = np.searchsorted(zlane[order], np.arange(self.lane_count + 1))
+        for lane in np.unique(blane):
+            first, last = lane_starts[lane], lane_starts[lane + 1]
+            if first == last:
+                continue
+            rows = order[first:last]
+            in_lane = np.flatnonzero(blane == lane)
+            lo = np.searchsorted(edge[rows], bx[in_lane], side="right")
+            hi = np.searchsorted(zx[rows], bx[in_lane], side="left")
+            overlapping = lo < hi
+            if not overlapping.any():
+                continue
+            bounds = np.empty(2 * np.count_nonzero(overlapping), dtype=np.int64)
+            bounds[0::2] = lo[overlapping]
+            bounds[1::2] = hi[overlapping]
+            padded = np.append(rows, n)  # reduceat needs every bound < len
+            target[in_lane[overlapping]] = np.minimum.reduceat(padded, bounds)[0::2]
+
+        hits = np.flatnonzero(target >= 0)
+        if not len(hits):
+            return
+
+        # Resolve in zombie order, each zombie taking its bullets in list order.
+        # A zombie that dies stops absorbing, and its leftover bullets fly on
+        # to the next overlapping zombie further down the list.
+        pending = {}
+        for bullet in hits:
+            pending.setdefault(int(target[bullet]), []).append(bullet)
+        queue = list(pending)
+        heapq.heapify(queue)
+        consumed = np.zeros(m, dtype=bool)
+        dead = np.zeros(n, dtype=bool)
+        while queue:
+            zombie = heapq.heappop(queue)
+            bullets = sorted(pending.pop(zombie))
+            for k, bullet in enumerate(bullets):
+                if b.freezes[bullet]:
+                    # GameState.freeze
+                    if not z.frozen[zombie] and not IGNORES_FREEZE[z.kind[zombie]]:
+                        heapq.heappush(self.thaws, (self.tick + FREEZE_TICKS, int(z.uid[zombie])))
+                    z.frozen[zombie] = True
+                    z.thaw_tick[zombie] = self.tick + FREEZE_TICKS
+                    self.telemetry.freeze(int(b.source[bullet]), int(z.uid[zombie]))
+                else:
+                    z.health[zombie] -= b.damage[bullet]
+                    self.telemetry.hit(int(b.source[bullet]), int(z.uid[zombie]), int(b.damage[bullet]))
+                consumed[bullet] = True
+                if z.health[zombie] <= 0:
+                    self.coins += int(z.reward[zombie])  # Add coins based on zombie reward
+                    self.coins_earned += int(z.reward[zombie])
+                    dead[zombie] = True
+                    self.telemetry.kill(
+                        int(b.source[bullet]), int(z.uid[zombie]), ZOMBIE_KINDS[z.kind[zombie]], int(z.reward[zombie]),
+                        self.coins,
+                    )
+                    for leftover in bullets[k + 1:]:
+                        later = np.flatnonzero(
+                            (zlane == blane[leftover]) & (zx < bx[leftover]) & (bx[leftover] < edge)
+                        )
+                        later = later[later > zombie]
+                        if len(later):
+                            nxt = int(later[0])
+                            if nxt not in pending:
+                                pending[nxt] = []
+                                heapq.heappush(queue, nxt)
+                            pending[nxt].append(leftover)
+                    break
+
+        b.compact(~consumed)
+        self._remove_zombies(dead)